@@ -0,0 +1,159 @@
+import threading
+import time
+
+RATE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_rate(text):
+    """Parse a rate like '500K', '2.5M' or '1048576' into bytes per second (None or 0 = unlimited)"""
+    if text is None:
+        return None
+    text = str(text).strip().upper()
+    if text.endswith('/S'):
+        text = text[:-2]
+    if len(text) > 1 and text.endswith('B') and text[-2] in RATE_UNITS:
+        text = text[:-1]  # '2MB' means the same as '2M'
+    unit = text[-1] if text and text[-1] in RATE_UNITS else ''
+    number = text[:-1] if unit else text
+    if not number:
+        return None
+    return int(float(number) * RATE_UNITS[unit]) or None
+
+
+def parse_schedule(text):
+    """Parse 'HH:MM-HH:MM=RATE,...' into a list of (start, end, rate) tuples"""
+    schedule = []
+    for part in (text or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        window, rate = part.split('=', 1)
+        start, end = window.split('-', 1)
+        schedule.append((start.strip(), end.strip(), parse_rate(rate)))
+    return schedule
+
+
+def minutes_of_day(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class BandwidthLimiter:
+    """Global download rate cap shared across all active jobs by weight.
+
+    Each active job's YoutubeDL gets its share written to
+    params['ratelimit']. A plain HTTP stream re-reads it while it
+    downloads, so changing the cap, the schedule or a weight takes effect
+    on running jobs without restarting them. A fragmented (HLS/DASH)
+    stream copies the params once when it starts, and each of its
+    fragment threads throttles itself to the whole share; so while a cap
+    is active the limiter pins concurrent_fragment_downloads to 1, and a
+    running fragmented stream keeps the share it started with until the
+    job's next stream.
+    """
+
+    def __init__(self, limit=None, schedule=None, refresh_interval=5.0):
+        self.limit = limit  # bytes per second, None = unlimited
+        self.schedule = list(schedule or [])  # (start 'HH:MM', end 'HH:MM', bytes per second or None)
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.jobs = {}  # key -> [weight, ydl, fragment concurrency to use while uncapped]
+        self.applied_limit = None
+        self.last_refresh = 0
+
+    def current_limit(self, now=None):
+        """The cap in effect right now: the first matching schedule window, else the base limit"""
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end, rate in self.schedule:
+            start, end = minutes_of_day(start), minutes_of_day(end)
+            # A window like 22:00-06:00 wraps around midnight
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                return rate
+        return self.limit
+
+    def set_limit(self, limit):
+        with self.lock:
+            self.limit = limit or None
+            self._rebalance()
+
+    def set_schedule(self, schedule):
+        with self.lock:
+            self.schedule = list(schedule or [])
+            self._rebalance()
+
+    def register(self, key, ydl, weight=1.0):
+        """Start sharing the cap with a job's YoutubeDL"""
+        with self.lock:
+            self.jobs[key] = [max(weight, 0.01), ydl, ydl.params.get('concurrent_fragment_downloads') or 1]
+            self._rebalance()
+
+    def unregister(self, key):
+        with self.lock:
+            entry = self.jobs.pop(key, None)
+            if entry is not None:
+                # The YoutubeDL may be reused for another job: leave it as it was before register()
+                entry[1].params['ratelimit'] = None
+                entry[1].params['concurrent_fragment_downloads'] = entry[2]
+            self._rebalance()
+
+    def set_fragments(self, key, fragments):
+        """Fragment concurrency a job uses while no cap is active (it gets 1 while capped)"""
+        with self.lock:
+            if key in self.jobs:
+                self.jobs[key][2] = fragments
+                self._rebalance()
+
+    def set_weight(self, key, weight):
+        with self.lock:
+            if key in self.jobs:
+                self.jobs[key][0] = max(weight, 0.01)
+                self._rebalance()
+
+    def share(self, key):
+        """Bytes per second currently granted to a job (None = unlimited)"""
+        with self.lock:
+            return self._shares(self.applied_limit).get(key)
+
+    def refresh(self):
+        """Re-evaluate the schedule; cheap enough to call from progress hooks"""
+        now = time.time()
+        with self.lock:
+            if now - self.last_refresh < self.refresh_interval:
+                return
+            self.last_refresh = now
+            if self.current_limit(now) != self.applied_limit:
+                self._rebalance()
+
+    def _shares(self, limit):
+        """Weighted shares of limit by job, each at least a small floor, together never above limit"""
+        if not limit or not self.jobs:
+            return {}
+        floor = min(1024, limit // len(self.jobs))
+        weights = {key: entry[0] for key, entry in self.jobs.items()}
+        shares = {}
+        budget = limit
+        while weights:
+            total_weight = sum(weights.values())
+            # Jobs whose part falls below the floor get the floor, and the rest share what is left
+            low = [key for key, weight in weights.items() if budget * weight / total_weight < floor]
+            if not low:
+                for key, weight in weights.items():
+                    shares[key] = int(budget * weight / total_weight)
+                break
+            for key in low:
+                shares[key] = floor
+                budget -= floor
+                del weights[key]
+        return shares
+
+    def _rebalance(self):
+        limit = self.current_limit()
+        self.applied_limit = limit
+        shares = self._shares(limit)
+        for key, (_, ydl, fragments) in self.jobs.items():
+            share = shares.get(key)
+            ydl.params['ratelimit'] = share
+            # Every fragment thread would take the whole share for itself
+            ydl.params['concurrent_fragment_downloads'] = fragments if share is None else 1
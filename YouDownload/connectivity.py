@@ -0,0 +1,106 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+
+DEFAULT_ENDPOINTS = [
+    ("8.8.8.8", 53),  # Google DNS
+    ("1.1.1.1", 53),  # Cloudflare DNS
+    ("www.google.com", 80),
+    ("www.youtube.com", 80),
+]
+
+
+def parse_endpoints(text):
+    """Parse 'host:port' entries (a list, or one comma-separated string) into (host, port) pairs"""
+    if isinstance(text, str):
+        text = text.split(",")
+    endpoints = []
+    for entry in text:
+        host, _, port = entry.strip().rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid endpoint: {entry!r}")
+        endpoints.append((host.strip("[]"), int(port)))
+    return endpoints
+
+
+def probe(host, port, timeout=3):
+    """Seconds taken to open a TCP connection to host:port, or None if it failed.
+
+    The socket is closed right away; the connect time is about one round
+    trip (plus a DNS lookup for host names).
+    """
+    started = time.monotonic()
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return time.monotonic() - started
+    except OSError:
+        return None
+
+
+class ConnectivityChecker:
+    """Probes every endpoint at once and answers with the first one that connects.
+
+    A dead network costs one timeout instead of one per endpoint. The
+    result is cached for ttl seconds (offline_ttl when offline, so a
+    returning connection is noticed soon), and concurrent callers share
+    one probe round. rtts keeps the last connect time of every endpoint,
+    including the ones that answered after the result was returned.
+    """
+
+    def __init__(self, endpoints=None, timeout=3, ttl=30, offline_ttl=5):
+        self.endpoints = list(endpoints or DEFAULT_ENDPOINTS)
+        self.timeout = timeout
+        self.ttl = ttl
+        self.offline_ttl = offline_ttl
+        self.lock = threading.Lock()
+        self.rtts_lock = threading.Lock()
+        self.rtts = {}  # (host, port) -> seconds, None = unreachable
+        self.result = None
+        self.checked_at = 0
+
+    def set_endpoints(self, endpoints):
+        with self.lock:
+            self.endpoints = list(endpoints)
+            self.result = None
+
+    def check(self, force=False):
+        """Return {'online', 'endpoint', 'rtt', 'rtts', 'checked_at', 'cached'}, probing only if the cache is stale"""
+        with self.lock:
+            if not force and self.result is not None:
+                ttl = self.ttl if self.result['online'] else self.offline_ttl
+                if time.monotonic() - self.checked_at < ttl:
+                    return dict(self.result, cached=True)
+            self.result = self.probe_all()
+            self.checked_at = time.monotonic()
+            return dict(self.result, cached=False)
+
+    def probe_all(self):
+        with self.rtts_lock:
+            self.rtts = {}
+        pool = ThreadPoolExecutor(max_workers=len(self.endpoints), thread_name_prefix="probe")
+        futures = {pool.submit(self.probe_endpoint, endpoint): endpoint for endpoint in self.endpoints}
+        pool.shutdown(wait=False)  # the slower probes finish in the background and still record their RTT
+        online = None
+        try:
+            for future in as_completed(futures, timeout=self.timeout + 1):
+                if future.result() is not None:
+                    online = futures[future]
+                    break
+        except FuturesTimeout:
+            pass
+        with self.rtts_lock:
+            rtts = dict(self.rtts)
+        return {
+            'online': online is not None,
+            'endpoint': f"{online[0]}:{online[1]}" if online else None,
+            'rtt': rtts.get(online) if online else None,
+            'rtts': {f"{host}:{port}": rtt for (host, port), rtt in rtts.items()},
+            'checked_at': time.time(),
+        }
+
+    def probe_endpoint(self, endpoint):
+        rtt = probe(endpoint[0], endpoint[1], self.timeout)
+        with self.rtts_lock:
+            self.rtts[endpoint] = rtt
+        return rtt
@@ -0,0 +1,207 @@
+import errno
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl that makes a file share the blocks of another one (Btrfs, XFS, overlayfs on those)
+FICLONE = 0x40049409
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    video_id TEXT NOT NULL,
+    format_key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (video_id, format_key)
+);
+CREATE TABLE IF NOT EXISTS links (
+    path TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    format_key TEXT NOT NULL,
+    method TEXT NOT NULL,
+    linked_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS links_object ON links(video_id, format_key);
+"""
+
+
+def reflink(src, dst):
+    """Clone src into a new file dst sharing its blocks; raises OSError where unsupported"""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dst)
+            raise
+
+
+def link_file(src, dst):
+    """Make dst share the blocks of src by a hardlink or a reflink.
+
+    Returns the method that worked, or None where neither does (e.g.
+    across filesystems); dst is not created then.
+    """
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        reflink(src, dst)
+        return "reflink"
+    except OSError:
+        pass
+    return None
+
+
+def place_file(src, dst):
+    """Make dst have the content of src as cheaply as possible.
+
+    Tries a hardlink, then a reflink, then falls back to a full copy.
+    Returns the method that worked.
+    """
+    method = link_file(src, dst)
+    if method is not None:
+        return method
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+class ContentStore:
+    """Shared store of downloaded media, one object per (video id, quality).
+
+    Every file handed out to a download folder is recorded as a link of its
+    object. The object is only removed when its last link is released, so
+    deleting one copy never breaks another.
+    """
+
+    def __init__(self, root="content_store"):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def object_path(self, video_id, format_key, name):
+        key = hashlib.sha1(f"{video_id}\0{format_key}".encode("utf-8")).hexdigest()
+        ext = os.path.splitext(name)[1]
+        return os.path.join(self.root, "objects", key[:2], key + ext)
+
+    def get(self, video_id, format_key):
+        """Return the stored object of a video in this quality, or None"""
+        if not video_id:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM objects WHERE video_id = ? AND format_key = ?", (video_id, format_key)).fetchone()
+        if row is None or not os.path.exists(row['path']):
+            return None
+        return dict(row)
+
+    def put(self, video_id, format_key, path):
+        """Adopt a downloaded file into the store; the file itself becomes the first link.
+
+        The object shares the file's blocks, so adopting costs no disk
+        space. A file that cannot be linked (the store is on another
+        drive) is not adopted, and None is returned.
+        """
+        existing = self.get(video_id, format_key)
+        if existing is not None:
+            self._add_link(path, video_id, format_key, "existing")
+            return existing
+        name = os.path.basename(path)
+        object_path = self.object_path(video_id, format_key, name)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if os.path.exists(object_path):
+            os.remove(object_path)  # left over from an object whose row was lost
+        method = link_file(path, object_path)
+        if method is None:
+            return None  # A copy would double the disk use of every download
+        size = os.path.getsize(object_path)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO objects (video_id, format_key, path, name, size, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, format_key, object_path, name, size, time.time()))
+        self._add_link(path, video_id, format_key, method)
+        return self.get(video_id, format_key)
+
+    def materialize(self, video_id, format_key, target_dir):
+        """Place a stored object in target_dir under its original name.
+
+        Returns (path, method), or None if the store does not have it.
+        """
+        obj = self.get(video_id, format_key)
+        if obj is None:
+            return None
+        target = os.path.join(target_dir, obj['name'])
+        if os.path.exists(target):
+            method = "existing"
+        else:
+            os.makedirs(target_dir, exist_ok=True)
+            method = place_file(obj['path'], target)
+        self._add_link(target, video_id, format_key, method)
+        return target, method
+
+    def refcount(self, video_id, format_key):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM links WHERE video_id = ? AND format_key = ?", (video_id, format_key)).fetchone()[0]
+
+    def release(self, path):
+        """Forget a linked file (after it was deleted); drops the object once nothing links to it"""
+        with self.lock:
+            row = self.conn.execute("SELECT video_id, format_key FROM links WHERE path = ?",
+                                    (os.path.abspath(path),)).fetchone()
+            if row is None:
+                return False
+            self.conn.execute("DELETE FROM links WHERE path = ?", (os.path.abspath(path),))
+        self._collect(row['video_id'], row['format_key'])
+        return True
+
+    def prune(self):
+        """Release links whose files were deleted outside the app; returns how many"""
+        with self.lock:
+            paths = [row[0] for row in self.conn.execute("SELECT path FROM links")]
+        released = 0
+        for path in paths:
+            if not os.path.exists(path) and self.release(path):
+                released += 1
+        return released
+
+    def _add_link(self, path, video_id, format_key, method):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO links (path, video_id, format_key, method, linked_at) VALUES (?, ?, ?, ?, ?)",
+                (os.path.abspath(path), video_id, format_key, method, time.time()))
+
+    def _collect(self, video_id, format_key):
+        with self.lock:
+            remaining = self.conn.execute(
+                "SELECT COUNT(*) FROM links WHERE video_id = ? AND format_key = ?", (video_id, format_key)).fetchone()[0]
+            if remaining:
+                return
+            row = self.conn.execute(
+                "SELECT path FROM objects WHERE video_id = ? AND format_key = ?", (video_id, format_key)).fetchone()
+            self.conn.execute("DELETE FROM objects WHERE video_id = ? AND format_key = ?", (video_id, format_key))
+        if row is not None and os.path.exists(row['path']):
+            os.remove(row['path'])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
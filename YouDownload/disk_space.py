@@ -0,0 +1,111 @@
+import ctypes
+import ctypes.util
+import os
+import shutil
+import sys
+import threading
+
+# What to do when the queue does not fit on the disk
+WARN = "warn"  # report it, and fail a video that cannot fit before it starts
+TRIM = "trim"  # leave the videos that do not fit queued for a later resume
+OFF = "off"
+POLICIES = (WARN, TRIM, OFF)
+
+# Outcome of a preflight
+FITS = "fits"
+SHORT = "short"
+UNKNOWN = "unknown"  # no size of the queue is known, so nothing could be checked
+
+FALLOC_FL_KEEP_SIZE = 0x01
+
+_fallocate = None
+_fallocate_lock = threading.Lock()
+
+
+class DiskSpaceError(Exception):
+    """A video would not fit in the free space of its download folder"""
+    pass
+
+
+def free_bytes(path):
+    """Free bytes on the filesystem of path, or of its nearest existing parent folder"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
+
+def preflight(sizes, free, reserve=0):
+    """Check whether files of the expected sizes (in queue order) fit into free bytes, keeping reserve free.
+
+    Unknown sizes (None) count as the average known size. Returns a dict
+    with the status ('fits', 'short', or 'unknown' when no size is known
+    at all), the bytes needed (None if unknown), the bytes short (0 if all
+    fit), how many items from the front of the queue fit, and how many
+    sizes were estimated.
+    """
+    known = [size for size in sizes if size]
+    if not known:
+        return {'status': UNKNOWN, 'needed': None, 'free': free, 'reserve': reserve, 'short': 0,
+                'fits': len(sizes), 'total': len(sizes), 'estimated': len(sizes)}
+    average = sum(known) / len(known)
+    available = max(free - reserve, 0)
+    needed = 0
+    fits = 0
+    for size in sizes:
+        needed += size or average
+        if needed <= available:
+            fits += 1
+    short = max(round(needed - available), 0)
+    return {
+        'status': SHORT if short else FITS,
+        'needed': round(needed),
+        'free': free,
+        'reserve': reserve,
+        'short': short,
+        'fits': fits,
+        'total': len(sizes),
+        'estimated': len(sizes) - len(known),
+    }
+
+
+def load_fallocate():
+    global _fallocate
+    with _fallocate_lock:
+        if _fallocate is None:
+            _fallocate = False
+            if sys.platform.startswith('linux'):
+                try:
+                    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                    function = getattr(libc, 'fallocate64', None) or libc.fallocate
+                    function.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+                    function.restype = ctypes.c_int
+                    _fallocate = function
+                except (OSError, AttributeError):
+                    pass
+        return _fallocate or None
+
+
+def preallocate(path, size):
+    """Reserve size bytes of disk blocks for an existing file without changing its length.
+
+    Uses fallocate with FALLOC_FL_KEEP_SIZE, so a download gets its blocks
+    in one piece up front (less fragmentation on spinning disks) while the
+    .part file still reads as partial and resumes from its real length.
+    Returns False where that is not supported: other systems, and
+    filesystems such as some network shares.
+    """
+    fallocate = load_fallocate()
+    if fallocate is None or size <= 0:
+        return False
+    try:
+        fd = os.open(path, os.O_WRONLY)
+    except OSError:
+        return False
+    try:
+        return fallocate(fd, FALLOC_FL_KEEP_SIZE, 0, size) == 0
+    finally:
+        os.close(fd)
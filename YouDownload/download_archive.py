@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Format key of entries imported from yt-dlp archives, which do not record a format
+ANY_FORMAT = "*"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive (
+    video_id TEXT NOT NULL,
+    format_key TEXT NOT NULL,
+    extractor TEXT NOT NULL DEFAULT 'youtube',
+    path TEXT,
+    size INTEGER,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (video_id, format_key)
+) WITHOUT ROWID;
+"""
+
+
+class DownloadArchive:
+    """On-disk index of completed downloads, keyed by video id and quality.
+
+    Lookups are primary key probes, so they stay fast with hundreds of
+    thousands of entries and never need the network: the engine checks a
+    job here before extracting it.
+    """
+
+    def __init__(self, path="archive.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def lookup(self, video_id, format_key):
+        """Return the archive entry of a video in this quality (or any quality), or None.
+
+        Entries whose recorded file was deleted since do not count.
+        """
+        if not video_id:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM archive WHERE video_id = ? AND format_key IN (?, ?) LIMIT 1",
+                (video_id, format_key, ANY_FORMAT)).fetchone()
+        if row is None:
+            return None
+        if row['path'] and not os.path.exists(row['path']):
+            return None
+        return dict(row)
+
+    def downloaded_ids(self, video_ids, format_key, chunk_size=500):
+        """The subset of video_ids archived in this quality (or any), in a few batched queries"""
+        video_ids = [video_id for video_id in video_ids if video_id]
+        found = set()
+        for start in range(0, len(video_ids), chunk_size):
+            chunk = video_ids[start:start + chunk_size]
+            marks = ", ".join("?" * len(chunk))
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT video_id, path FROM archive WHERE format_key IN (?, ?) AND video_id IN ({marks})",
+                    [format_key, ANY_FORMAT] + chunk).fetchall()
+            found.update(row['video_id'] for row in rows if not row['path'] or os.path.exists(row['path']))
+        return found
+
+    def add(self, video_id, format_key, path=None, size=None, extractor="youtube"):
+        """Record a completed download, replacing an older entry for the same key"""
+        if size is None and path and os.path.exists(path):
+            size = os.path.getsize(path)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO archive (video_id, format_key, extractor, path, size, completed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, format_key, extractor, path, size, time.time()))
+
+    def remove(self, video_id, format_key=None):
+        """Forget a video, in one quality or in all of them"""
+        with self.lock:
+            if format_key is None:
+                self.conn.execute("DELETE FROM archive WHERE video_id = ?", (video_id,))
+            else:
+                self.conn.execute("DELETE FROM archive WHERE video_id = ? AND format_key = ?", (video_id, format_key))
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM archive").fetchone()[0]
+
+    def import_ytdlp_archive(self, archive_path, batch_size=10000):
+        """Import a yt-dlp --download-archive file ('<extractor> <id>' per line).
+
+        Imported videos count as downloaded in every quality. Returns the
+        number of new entries.
+        """
+        before = self.count()
+        now = time.time()
+        batch = []
+        with open(archive_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 2:
+                    continue
+                extractor, video_id = parts
+                batch.append((video_id, ANY_FORMAT, extractor.lower(), now))
+                if len(batch) >= batch_size:
+                    self._insert_imported(batch)
+                    batch = []
+        if batch:
+            self._insert_imported(batch)
+        return self.count() - before
+
+    def _insert_imported(self, rows):
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO archive (video_id, format_key, extractor, completed_at) VALUES (?, ?, ?, ?)",
+                rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,1226 @@
+import base64
+import copy
+import functools
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+import yt_dlp
+from yt_dlp.dependencies import mutagen
+from yt_dlp.postprocessor import PostProcessor
+
+import disk_space
+from disk_space import DiskSpaceError
+import format_planner
+from format_planner import describe_plan
+import job_store
+from job_store import JobStore
+from bandwidth import BandwidthLimiter
+from fragment_controller import FragmentController
+from metadata_cache import url_expiry
+import network_health
+from network_health import NetworkHealthMonitor
+from postprocess_pool import PostProcessPool
+import retry_policy
+from retry_policy import RetryPolicy, classify_error
+
+QUALITIES = [
+    "Best Quality",
+    "1080p",
+    "720p",
+    "480p",
+    "360p",
+    "Audio Only (MP3)",
+    "Audio Only (M4A)",
+    "Audio Only (Opus)",
+]
+
+# Audio-only qualities: (format, codec FFmpegExtractAudio writes, bitrate in kbps or None)
+# M4A and Opus pick a stream already in that codec, so it is remuxed as is instead of transcoded
+AUDIO_MODES = {
+    "Audio Only (MP3)": ('bestaudio/best', 'mp3', '192'),
+    "Audio Only (M4A)": ('bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best', 'm4a', None),
+    "Audio Only (Opus)": ('bestaudio[acodec=opus]/bestaudio/best', 'opus', None),
+}
+
+MAX_WORKERS = 16
+
+# Error classes that a stalled network explains better than the video itself
+NETWORK_ERROR_CLASSES = (retry_policy.NETWORK, retry_policy.TIMEOUT, retry_policy.DNS, retry_policy.FRAGMENT)
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+class StreamExpired(Exception):
+    """A paused job's stream URLs expired; it must be extracted again"""
+    pass
+
+
+def is_valid_youtube_url(url):
+    """Check if URL is a valid YouTube URL"""
+    try:
+        parsed = urlparse(url)
+        return 'youtube.com' in parsed.netloc or 'youtu.be' in parsed.netloc
+    except:
+        return False
+
+
+def video_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def youtube_video_id(url):
+    """Video id of a YouTube watch, short or youtu.be URL, without any network access"""
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None
+    if 'youtu.be' in parsed.netloc:
+        return parsed.path.strip('/').split('/')[0] or None
+    if 'youtube.com' in parsed.netloc:
+        video_id = parse_qs(parsed.query).get('v')
+        if video_id:
+            return video_id[0]
+        parts = parsed.path.strip('/').split('/')
+        if len(parts) >= 2 and parts[0] in ('shorts', 'live', 'embed'):
+            return parts[1]
+    return None
+
+
+def stream_expiry(info):
+    """Earliest 'expire' timestamp of the resolved stream URLs in an info dict, if any"""
+    expiries = [url_expiry(fmt.get('url')) for fmt in info.get('requested_formats') or [info]]
+    expiries = [expiry for expiry in expiries if expiry]
+    return min(expiries) if expiries else None
+
+
+class DownloadJob:
+    """State of a single video download, owned by one worker slot"""
+    def __init__(self, video, url, position=0):
+        self.video = video
+        self.url = url
+        self.position = position  # index of the item in its persisted run
+        self.title = video.get('title') or url
+        self.video_id = video.get('id') or youtube_video_id(url)
+        self.extractor = 'youtube'
+        self.skipped = False  # found in the download archive
+        self.deferred = False  # left queued because the disk is too full
+        self.link_method = None  # how a stored copy was placed: hardlink, reflink, copy or existing
+        self.cache_hit = False  # the last attempt started from cached metadata
+        self.prefetch_failed = False  # extracting it ahead failed; it is only tried again when it starts
+        self.retry_count = 0
+        self.ydl_instance = None
+        self.slot = None
+        self.status = 'queued'  # queued, downloading, processing, finished, failed
+        self.weight = 1.0  # share of the global bandwidth cap relative to other jobs
+        self.streams = {}  # format id -> [downloaded_bytes, total_bytes]
+        self.speed = None
+        self.eta = None
+        self.filename = None
+        self.error = None
+        self.error_class = None
+        self.stream_expires = None  # when the resolved stream URLs stop working (epoch seconds), None = not known yet
+        self.plan = None  # formats chosen by the format planner for the last attempt
+        self.preallocated = set()  # .part files whose disk blocks were reserved
+        self.was_paused = False  # paused during the current attempt
+
+    @property
+    def downloaded_bytes(self):
+        return sum(done for done, _ in self.streams.values())
+
+    @property
+    def total_bytes(self):
+        return sum(total for _, total in self.streams.values())
+
+    @property
+    def fraction(self):
+        """Completed fraction of this job (0..1)"""
+        if self.status in ('processing', 'finished', 'failed'):
+            return 1.0
+        total = self.total_bytes
+        if not total:
+            return 0.0
+        return min(self.downloaded_bytes / total, 1.0)
+
+
+class SessionYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that also hands its warnings to the owning session.
+
+    With defer set, the postprocessors of a downloaded file (merge, audio
+    extraction, embedding, moving into place) are not run; defer gets a
+    callable that runs them later and returns the final info dict. With
+    planner set, planner(formats, duration) picks the formats of every
+    video, and the 'format' string only applies when it returns None.
+    """
+    def __init__(self, params, on_warning, defer=None, planner=None):
+        super().__init__(params)
+        self.on_warning = on_warning
+        self.defer = defer
+        self.planner = planner
+        self.duration = None  # of the video being processed; the format selector only gets its formats
+        if planner is not None:
+            self.fallback_selector = self.format_selector
+            self.format_selector = self.select_planned_formats
+
+    def report_warning(self, message, *args, **kwargs):
+        self.on_warning(message)
+        return super().report_warning(message, *args, **kwargs)
+
+    def process_video_result(self, info_dict, download=True):
+        self.duration = info_dict.get('duration')
+        return super().process_video_result(info_dict, download)
+
+    def select_planned_formats(self, ctx):
+        plan = self.planner(ctx['formats'], self.duration)
+        if plan is not None:
+            chosen = list(self.build_format_selector(plan['format'])(ctx))
+            if chosen:
+                return chosen
+        return self.fallback_selector(ctx)
+
+    def post_process(self, filename, info, files_to_move=None):
+        if self.defer is None:
+            return super().post_process(filename, info, files_to_move)
+        # Copies, since yt-dlp keeps working on the originals once this returns
+        params = {key: value for key, value in self.params.items() if key not in SESSION_HOOKS}
+        self.defer(functools.partial(detached_post_process, params, filename, dict(info), files_to_move))
+        info['filepath'] = filename
+        return info
+
+
+# Options that call back into the session, which has moved on to the next video
+SESSION_HOOKS = ('progress_hooks', 'post_hooks')
+
+
+def detached_post_process(params, filename, info, files_to_move):
+    """Run the postprocessors of a downloaded file on a YoutubeDL of its own.
+
+    Deferred postprocessing runs on the pool while the session's YoutubeDL
+    downloads the next video, so it gets its own postprocessor instances,
+    built from a snapshot of the session's options.
+    """
+    with yt_dlp.YoutubeDL(params) as ydl:
+        # The merger and fixups yt-dlp picked for this file
+        for pp in info.get('__postprocessors') or []:
+            pp.set_downloader(ydl)
+        return ydl.post_process(filename, info, files_to_move)
+
+
+class ThumbnailCachePP(PostProcessor):
+    """Serves album art from the ThumbnailCache and keeps the thumbnails yt-dlp fetches.
+
+    Added twice: at the 'video' stage it replaces the thumbnail list with
+    the cached image as a data: URL, which yt-dlp writes without a request;
+    at 'before_dl' it stores a thumbnail that still had to be downloaded.
+    """
+    def __init__(self, cache, stage, downloader=None):
+        super().__init__(downloader)
+        self.cache = cache
+        self.stage = stage
+
+    def run(self, info):
+        video_id = info.get('id')
+        if self.stage == 'video':
+            data, ext = self.cache.get_original(video_id)
+            if data is not None:
+                url = f"data:image/{ext};base64,{base64.b64encode(data).decode('ascii')}"
+                info['thumbnails'] = [{'id': 'cached', 'url': url, 'ext': ext}]
+        elif self.cache.get_original(video_id)[0] is None:
+            for thumbnail in info.get('thumbnails') or []:
+                if thumbnail.get('filepath') and os.path.exists(thumbnail['filepath']):
+                    try:
+                        with open(thumbnail['filepath'], 'rb') as f:
+                            self.cache.put(video_id, f.read())
+                    except (OSError, ValueError) as e:
+                        self.report_warning(f"Could not cache thumbnail: {e}")
+                    break
+        return [], info
+
+
+class DownloadSession:
+    """Long-lived yt-dlp instance that one worker feeds job after job.
+
+    Keeping the same YoutubeDL keeps extractors, cookies, HTTP connections
+    and the player/signature caches warm. It is only rebuilt when the
+    download folder or quality changes. With defer_post_process, download()
+    returns the postprocessing of the job as callables instead of running it.
+    """
+    def __init__(self, options_factory, progress_hook, bandwidth=None, on_tuning=None, metadata_cache=None,
+                 thumbnail_cache=None, defer_post_process=False, format_planner=None):
+        self.options_factory = options_factory
+        self.progress_hook = progress_hook
+        self.bandwidth = bandwidth
+        self.on_tuning = on_tuning
+        self.metadata_cache = metadata_cache
+        self.thumbnail_cache = thumbnail_cache
+        self.defer_post_process = defer_post_process
+        self.format_planner = format_planner  # format_planner(job, formats, quality, duration) -> plan or None
+        self.deferred = []  # postprocessing of the current job, when deferred
+        self.fragments = FragmentController()
+        self.ydl = None
+        self.options_key = None
+        self.job = None
+
+    def get_ydl(self, download_path, quality):
+        """Return the session's YoutubeDL, rebuilding it if the options changed"""
+        options_key = (download_path, quality)
+        if self.ydl is None or options_key != self.options_key:
+            self.close()
+            ydl_opts = self.options_factory(download_path, quality, self.dispatch_progress)
+            # Start from what the fragment controller learned so far in this session
+            ydl_opts.update(self.fragments.options())
+            ydl_opts['post_hooks'] = [self.dispatch_post]
+            planner = functools.partial(self.plan_formats, quality) if self.format_planner is not None else None
+            self.ydl = SessionYoutubeDL(ydl_opts, self.handle_warning, self.defer if self.defer_post_process else None,
+                                        planner)
+            if self.thumbnail_cache is not None and ydl_opts.get('writethumbnail'):
+                for stage in ('video', 'before_dl'):
+                    self.ydl.add_post_processor(ThumbnailCachePP(self.thumbnail_cache, stage), when=stage)
+            self.options_key = options_key
+        return self.ydl
+
+    def dispatch_progress(self, d):
+        decision = self.fragments.observe(d)
+        if decision is not None and self.ydl is not None:
+            self.ydl.params.update({key: decision[key] for key in ('concurrent_fragment_downloads', 'http_chunk_size')})
+            if self.bandwidth is not None and self.job is not None:
+                # keeps it at 1 while capped
+                self.bandwidth.set_fragments(self.job, decision['concurrent_fragment_downloads'])
+            if self.on_tuning is not None:
+                self.on_tuning(self.job, decision)
+        self.progress_hook(d, self.job)
+
+    def dispatch_post(self, filename):
+        # Called with the final file once all postprocessors ran
+        if self.job is not None:
+            self.job.filename = filename
+
+    def plan_formats(self, quality, formats, duration):
+        return self.format_planner(self.job, formats, quality, duration)
+
+    def defer(self, task):
+        self.deferred.append(task)
+
+    def handle_warning(self, message):
+        # yt-dlp reports every retried fragment or chunk as a "... Retrying ..." warning
+        if 'Retrying' in str(message):
+            self.fragments.record_error()
+
+    def download(self, job, download_path, quality):
+        """Download one job on the shared YoutubeDL; returns its deferred postprocessing tasks"""
+        ydl = self.get_ydl(download_path, quality)
+        self.job = job
+        self.deferred = []
+        job.ydl_instance = ydl
+        if self.bandwidth is not None:
+            self.bandwidth.register(job, ydl, job.weight)
+        try:
+            if self.metadata_cache is None:
+                ydl.download([job.url])
+            else:
+                self.download_cached(ydl, job)
+        finally:
+            if self.bandwidth is not None:
+                self.bandwidth.unregister(job)
+            self.job = None
+            job.ydl_instance = None
+        return self.deferred
+
+    def download_cached(self, ydl, job):
+        """Download from the cached info dict of a job, extracting (and caching) only on a miss"""
+        info = self.metadata_cache.get(job.video_id)
+        job.cache_hit = info is not None
+        if info is None:
+            info = ydl.extract_info(job.url, download=False, process=False)
+            if info.get('_type', 'video') != 'video':
+                # Playlists and redirects go through the normal path
+                ydl.process_ie_result(info, download=True)
+                return
+            self.metadata_cache.put(info.get('id'), copy.deepcopy(info))
+        ydl.process_ie_result(info, download=True)
+
+    def close(self):
+        if self.ydl is not None:
+            try:
+                self.ydl.close()
+            except Exception:
+                pass
+            self.ydl = None
+
+
+class DownloadEngine:
+    """GUI-free download engine: extraction, format selection, retries and progress.
+
+    Progress is reported as plain dict events through on_event, which is
+    called from worker threads. Every event has an 'event' key naming it.
+    """
+    def __init__(self, on_event=None, store=None, max_retries=3, retry_delay=5, quiet=False, bandwidth=None,
+                 retry_policy=None, archive=None, content_store=None, metadata_cache=None, thumbnail_cache=None,
+                 post_workers=None, post_nice=10, disk_policy=disk_space.WARN, disk_reserve=256 * 1024 * 1024,
+                 preallocate=True):
+        self.on_event = on_event
+        self.quiet = quiet  # keep yt-dlp's own console output off stdout
+        self.job_store = store if store is not None else JobStore()
+        self.archive = archive  # DownloadArchive of completed videos, None = download everything
+        self.content_store = content_store  # ContentStore that hands out known videos by linking, None = off
+        self.metadata_cache = metadata_cache  # MetadataCache shared by preview and download, None = always extract
+        self.thumbnail_cache = thumbnail_cache  # ThumbnailCache that supplies album art, None = always fetch it
+        self.post_workers = post_workers  # threads running postprocessors off the download workers, None = one per CPU, 0 = inline
+        self.post_nice = post_nice  # niceness added to those threads and their ffmpeg processes
+        self.post_pool = None  # PostProcessPool of the current run
+        self.disk_policy = disk_policy  # disk_space.WARN, TRIM or OFF when the queue does not fit
+        self.disk_reserve = disk_reserve  # bytes always left free on the download disk
+        self.preallocate = preallocate  # reserve the blocks of .part files whose exact size is known
+        self.download_path = None
+        self.bandwidth = bandwidth if bandwidth is not None else BandwidthLimiter()
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=max_retries, base_delay=retry_delay)
+        self.retry_metrics = {}  # error class -> {'retries', 'wait_seconds', 'recovered'}
+        self.cancelled = False
+        self.cancel_event = threading.Event()  # wakes up retry waits on cancel
+        self.resume_event = threading.Event()  # cleared while paused
+        self.resume_event.set()
+        self.expiry_margin = 60  # re-extract paused jobs whose URLs expire within this many seconds
+        self.health = NetworkHealthMonitor(on_change=self.report_health)  # judged from all transfers' progress
+        self.max_stall_retries = 5  # retries per job not charged to its budget while the network is stalled
+        self.prefetch_ahead = 2  # jobs per worker extracted into the metadata cache before a worker takes them
+        self.preflight_sample = 5  # uncached jobs extracted before a run to measure the queue for the disk check
+        self.run_started_at = None
+        self.jobs = []
+        self.jobs_lock = threading.Lock()
+        self.run_id = None
+
+    def emit(self, event, **fields):
+        if self.on_event is not None:
+            fields['event'] = event
+            fields['time'] = time.time()
+            self.on_event(fields)
+
+    def fetch_video_info(self, url, playlist_items=None):
+        """Fetch video/playlist information without downloading.
+
+        Playlists are listed flat; playlist_items limits how many entries
+        are listed (None lists all of them).
+        """
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': True,  # Extract playlist info
+        }
+        if playlist_items:
+            ydl_opts['playlist_items'] = playlist_items
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if self.metadata_cache is None:
+                return ydl.extract_info(url, download=False)
+            info = self.metadata_cache.get(youtube_video_id(url))
+            if info is None:
+                info = ydl.extract_info(url, download=False, process=False)
+                if info.get('_type', 'video') != 'video':
+                    return ydl.process_ie_result(info, download=False)
+                # Keep the unprocessed result so the download can start from it
+                self.metadata_cache.put(info.get('id'), copy.deepcopy(info))
+            return ydl.process_ie_result(info, download=False)
+
+    def list_url(self, url, on_page=None, page_size=100, flush_interval=0.5, cancel_event=None):
+        """Extract a video, or list a playlist page by page while it is fetched.
+
+        Playlist entries are passed to on_page(playlist, entries) in pages of
+        up to page_size entries, or sooner once flush_interval seconds passed,
+        so the first entries show up while later pages are still loading.
+        Listing stops early when cancel_event is set. Returns the info dict;
+        for a playlist its 'entries' are the entries listed so far.
+        """
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': 'in_playlist',
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = self.metadata_cache.get(youtube_video_id(url)) if self.metadata_cache is not None else None
+            if info is not None:
+                return ydl.process_ie_result(info, download=False)
+
+            info = ydl.extract_info(url, download=False, process=False)
+            for _ in range(5):
+                # Follow redirects, e.g. from a channel URL to its videos tab
+                if info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+
+            if info.get('_type') != 'playlist':
+                if self.metadata_cache is not None:
+                    self.metadata_cache.put(info.get('id'), copy.deepcopy(info))
+                return ydl.process_ie_result(info, download=False)
+
+            playlist = {key: value for key, value in info.items() if key != 'entries'}
+            playlist['entries'] = self.stream_entries(playlist, info.get('entries') or [], on_page, page_size,
+                                                      flush_interval, cancel_event)
+            return playlist
+
+    def stream_entries(self, playlist, entries, on_page, page_size, flush_interval, cancel_event):
+        """Drain a lazy entries iterator on a helper thread, handing out pages as they fill or time out"""
+        done = object()
+        pending = queue.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                # Every next() may fetch another page from the site
+                for entry in entries:
+                    if stop.is_set():
+                        return
+                    if entry:
+                        pending.put(entry)
+            except Exception as e:
+                playlist['error'] = str(e)
+            finally:
+                pending.put(done)
+
+        threading.Thread(target=produce, daemon=True, name="playlist-listing").start()
+        listed = []
+        page = []
+        deadline = time.time() + flush_interval
+        finished = False
+        while not finished:
+            if cancel_event is not None and cancel_event.is_set():
+                playlist['cancelled'] = True
+                break
+            try:
+                entry = pending.get(timeout=max(min(deadline - time.time(), 0.1), 0))
+            except queue.Empty:
+                entry = None
+            if entry is done:
+                finished = True
+            elif entry is not None:
+                page.append(entry)
+            if page and (finished or len(page) >= page_size or time.time() >= deadline):
+                listed.extend(page)
+                if on_page is not None:
+                    on_page(playlist, page)
+                page = []
+            if time.time() >= deadline:
+                deadline = time.time() + flush_interval
+        stop.set()
+        return listed
+
+    def get_ydl_options(self, download_path, quality, progress_hook=None):
+        """Get yt-dlp options based on quality selection with resume support"""
+        ydl_opts = {
+            'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
+            'progress_hooks': [progress_hook or self.progress_hook],
+            'noplaylist': True,
+            'concurrent_fragment_downloads': 4,  # starting value, tuned per session by FragmentController
+            'retries': 3,  # yt-dlp internal retries
+            'fragment_retries': 3,
+            'file_access_retries': 3,
+            'extractor_retries': 3,
+            'socket_timeout': 30,  # 30 seconds timeout
+            'http_chunk_size': 10485760,  # 10MB chunks for better resume support, tuned like the fragments
+            'ratelimit': None,  # set per job by the bandwidth limiter while it downloads
+            'continue_dl': True,  # Continue partial downloads
+            'ignoreerrors': False,  # Don't ignore errors, handle them properly
+            'no_warnings': False,  # Show warnings for debugging
+        }
+        if self.quiet:
+            ydl_opts.update({'quiet': True, 'noprogress': True})
+
+        if quality in AUDIO_MODES:
+            audio_format, codec, bitrate = AUDIO_MODES[quality]
+            postprocessors = [
+                {
+                    'key': 'FFmpegExtractAudio',  # Stream copy when the source is already in this codec
+                    'preferredcodec': codec,
+                    'preferredquality': bitrate,
+                },
+                {
+                    'key': 'EmbedThumbnail',  # Embed thumbnail as album art
+                },
+                {
+                    'key': 'FFmpegMetadata',  # Ensure metadata is written
+                }
+            ]
+            if codec == 'opus' and mutagen is None:
+                # Cover art in Ogg files is written through mutagen; without it the audio is kept bare
+                postprocessors.pop(1)
+            ydl_opts.update({
+                'format': audio_format,
+                'postprocessors': postprocessors,
+                'writethumbnail': codec != 'opus' or mutagen is not None,  # Download thumbnail
+                'embedthumbnail': True,  # Explicitly request embedding
+                'addmetadata': True,     # Add metadata
+            })
+        elif quality == "Best Quality":
+            ydl_opts['format'] = 'bestvideo+bestaudio/best'
+        elif quality == "1080p":
+            ydl_opts['format'] = 'bestvideo[height<=1080]+bestaudio/best[height<=1080]/best'
+        elif quality == "720p":
+            ydl_opts['format'] = 'bestvideo[height<=720]+bestaudio/best[height<=720]/best'
+        elif quality == "480p":
+            ydl_opts['format'] = 'bestvideo[height<=480]+bestaudio/best[height<=480]/best'
+        elif quality == "360p":
+            ydl_opts['format'] = 'bestvideo[height<=360]+bestaudio/best[height<=360]/best'
+        else:
+            ydl_opts['format'] = 'bestvideo+bestaudio/best'
+
+        return ydl_opts
+
+    def create_session(self):
+        """Create a download session reporting progress to this engine"""
+        return DownloadSession(self.get_ydl_options, self.progress_hook, self.bandwidth, self.report_tuning,
+                               self.metadata_cache, self.thumbnail_cache, defer_post_process=self.post_pool is not None,
+                               format_planner=self.plan_job_formats)
+
+    def plan_formats(self, formats, quality, duration=None):
+        """Formats to download for a quality, planned from an extracted formats list; None if it cannot be planned"""
+        if quality in AUDIO_MODES:
+            return format_planner.plan_formats(formats, audio_codec=AUDIO_MODES[quality][1], duration=duration)
+        return format_planner.plan_formats(formats, height=format_planner.max_height(quality), duration=duration)
+
+    def plan_job_formats(self, job, formats, quality, duration=None):
+        """Plan the formats of a job and announce them before its download starts.
+
+        Raises DiskSpaceError if the planned size does not fit on the disk.
+        """
+        plan = self.plan_formats(formats, quality, duration)
+        if plan is not None and job is not None:
+            job.plan = plan
+            self.emit('format_plan', description=describe_plan(plan), **plan, **self.job_fields(job))
+            self.check_job_space(job, plan)
+        return plan
+
+    def check_job_space(self, job, plan):
+        """Raise DiskSpaceError if a job cannot fit next to the downloads already running"""
+        if self.disk_policy == disk_space.OFF or not plan['expected_bytes'] or self.download_path is None:
+            return
+        with self.jobs_lock:
+            running = sum(max(other.total_bytes - other.downloaded_bytes, 0) for other in self.jobs
+                          if other is not job and other.status == 'downloading')
+        needed = max(plan['expected_bytes'] - job.downloaded_bytes, 0)  # a resumed .part already holds some of it
+        available = disk_space.free_bytes(self.download_path) - self.disk_reserve - running
+        if needed > available:
+            raise DiskSpaceError(f"Not enough disk space: needs {needed / (1024 * 1024):.0f} MB, "
+                                 f"{max(available, 0) / (1024 * 1024):.0f} MB available in {self.download_path}")
+
+    def expected_job_bytes(self, job, quality, info=None):
+        """Bytes a job still has to download, planned from info or its cached metadata; None if not known"""
+        if info is None and self.metadata_cache is not None:
+            info = self.metadata_cache.peek(job.video_id)
+        if info is None:
+            return None
+        plan = self.plan_formats(info.get('formats'), quality, info.get('duration'))
+        if plan is None or not plan['expected_bytes']:
+            return None
+        return max(plan['expected_bytes'] - job.downloaded_bytes, 0)
+
+    def preflight_disk_space(self, jobs, download_path, quality):
+        """Check the expected size of the queue against the free space of download_path; None if off"""
+        if self.disk_policy == disk_space.OFF or not jobs:
+            return None
+        return disk_space.preflight(self.measure_queue(jobs, download_path, quality),
+                                    disk_space.free_bytes(download_path), self.disk_reserve)
+
+    def measure_queue(self, jobs, download_path, quality):
+        """Expected bytes of each job (None if unknown).
+
+        Playlist entries are not extracted yet when a run starts, so up to
+        preflight_sample jobs missing from the metadata cache are extracted
+        into it here; the workers then find them cached. The other unknown
+        sizes are estimated from these by the preflight. Without a metadata
+        cache nothing is extracted, since every job would be extracted twice.
+        """
+        sizes = [self.expected_job_bytes(job, quality) for job in jobs]
+        if self.metadata_cache is None:
+            return sizes
+        missing = [index for index, job in enumerate(jobs)
+                   if sizes[index] is None and job.video_id and not job.prefetch_failed
+                   and not self.metadata_cache.has(job.video_id)]
+        if not missing:
+            return sizes
+        with self.create_prefetch_ydl(download_path, quality) as ydl:
+            for index in missing[:self.preflight_sample]:
+                if self.cancelled:
+                    break
+                info = self.prefetch_job(ydl, jobs[index])
+                if info is not None:
+                    sizes[index] = self.expected_job_bytes(jobs[index], quality, info)
+        return sizes
+
+    def defer_job(self, job, reason):
+        """Leave a job queued in the job store for a later resume"""
+        job.status = 'queued'
+        job.deferred = True
+        self.job_store.set_state(self.run_id, job.position, job_store.QUEUED)
+        self.emit('job_deferred', reason=reason, **self.job_fields(job))
+
+    def report_priority_error(self, error):
+        """Called from a post-processing thread whose priority could not be lowered"""
+        self.emit('postprocess_priority_failed', error=str(error))
+
+    def report_tuning(self, job, decision):
+        """Log fragment/chunk values chosen by a session's FragmentController"""
+        fields = self.job_fields(job) if job is not None else {}
+        self.emit('fragment_tuning', **decision, **fields)
+
+    def create_run(self, url, download_path, quality, is_playlist, items):
+        """Persist a new run; items are dicts with url, and optionally id and title"""
+        return self.job_store.create_run(url, download_path, quality, is_playlist, items)
+
+    def load_run_jobs(self, run_id):
+        """Build jobs for the items of a run that still need work"""
+        jobs = []
+        for item in self.job_store.pending_items(run_id):
+            video = {'id': item['video_id'], 'title': item['title'] or item['url']}
+            job = DownloadJob(video, item['url'], item['position'])
+            if item['downloaded_bytes']:
+                # Show the checkpointed .part offset until yt-dlp reports progress
+                job.streams['checkpoint'] = [item['downloaded_bytes'], item['total_bytes']]
+            jobs.append(job)
+        return jobs
+
+    def set_job_weight(self, position, weight):
+        """Change how much of the bandwidth cap a job gets relative to the others"""
+        with self.jobs_lock:
+            jobs = [job for job in self.jobs if job.position == position]
+        for job in jobs:
+            job.weight = weight
+            self.bandwidth.set_weight(job, weight)
+
+    @property
+    def paused(self):
+        return not self.resume_event.is_set()
+
+    def pause(self):
+        """Hold every running transfer at zero throughput without closing it.
+
+        Workers block in the progress hook, so connections, resolved stream
+        URLs and partial files stay as they are and resume() continues them
+        without extracting again. Queued jobs do not start while paused.
+        """
+        if self.paused:
+            return
+        self.resume_event.clear()
+        self.emit('run_paused', run_id=self.run_id)
+
+    def resume(self):
+        """Continue transfers held by pause()"""
+        if not self.paused:
+            return
+        self.health.touch()  # nothing could move while paused
+        self.resume_event.set()
+        self.emit('run_resumed', run_id=self.run_id)
+
+    def wait_while_paused(self, job=None):
+        """Block the calling worker until resumed or cancelled"""
+        if job is not None:
+            job.was_paused = True
+            self.emit('job_paused', **self.job_fields(job))
+        while not self.resume_event.wait(0.5):
+            if self.cancelled:
+                break
+        if self.cancelled:
+            raise DownloadCancelled("Download cancelled by user.")
+        if job is not None and job.stream_expires and job.stream_expires - time.time() < self.expiry_margin:
+            # The held connection could continue, but a reconnect would fail; start over from the .part file
+            raise StreamExpired(f"Stream URLs of {job.title} expired while paused")
+
+    def cancel(self):
+        """Stop all running jobs; their state stays in the job store for resume"""
+        self.cancelled = True
+        self.cancel_event.set()
+        self.resume_event.set()
+        with self.jobs_lock:
+            running = [job.ydl_instance for job in self.jobs if job.ydl_instance]
+        for ydl in running:
+            try:
+                ydl.abort = True
+            except:
+                pass
+
+    def run(self, run_id, max_workers=1):
+        """Download the pending items of a run on a bounded pool of worker slots.
+
+        Returns a summary dict. Raises DownloadCancelled if cancel() was called.
+        """
+        run = self.job_store.get_run(run_id)
+        download_path = run['download_path']
+        quality = run['quality']
+        self.run_id = run_id
+        self.download_path = download_path
+        self.cancelled = False
+        self.cancel_event.clear()
+        self.resume_event.set()
+        self.retry_metrics = {}
+        self.health.reset()
+        self.run_started_at = time.time()
+
+        jobs = self.load_run_jobs(run_id)
+        with self.jobs_lock:
+            self.jobs = jobs
+        # Videos already in the archive are settled before any worker or network is involved
+        queued = [job for job in jobs if not self.skip_archived(job, quality, download_path)]
+        workers = max(1, min(max_workers, MAX_WORKERS, len(queued)))
+        self.post_pool = None
+        if self.post_workers != 0:
+            self.post_pool = PostProcessPool(self.post_workers, self.post_nice, self.report_priority_error)
+        self.emit('run_started', run_id=run_id, total=len(jobs), workers=workers,
+                  post_workers=self.post_pool.workers if self.post_pool is not None else 0,
+                  download_path=download_path, quality=quality)
+        for job in jobs:
+            if job.skipped:
+                self.emit('job_skipped', filename=job.filename, link_method=job.link_method, **self.job_fields(job))
+        space = self.preflight_disk_space(queued, download_path, quality)
+        if space is not None:
+            self.emit('disk_preflight', policy=self.disk_policy, path=download_path, **space)
+            if space['status'] == disk_space.SHORT and self.disk_policy == disk_space.TRIM:
+                queued, deferred = queued[:space['fits']], queued[space['fits']:]
+                for job in deferred:
+                    self.defer_job(job, "Not enough disk space for the whole queue")
+
+        # Each worker takes a free slot index for the duration of one job
+        free_slots = list(range(workers))
+        slots_lock = threading.Lock()
+        started = threading.Condition()  # counts the jobs taken by workers, for the prefetcher
+        started.count = 0
+
+        # One long-lived session per worker thread, reused for all its jobs
+        worker_state = threading.local()
+        sessions = []
+
+        def run_job(job):
+            if self.paused:
+                try:
+                    self.wait_while_paused()
+                except DownloadCancelled:
+                    pass
+            self.wait_for_network()
+            if self.cancelled:
+                return False
+            with started:
+                started.count += 1
+                started.notify_all()
+            session = getattr(worker_state, 'session', None)
+            if session is None:
+                session = worker_state.session = self.create_session()
+                with slots_lock:
+                    sessions.append(session)
+            with slots_lock:
+                slot = free_slots.pop(0)
+            try:
+                return self.download_job_with_retry(session, job, download_path, quality, slot=slot)
+            finally:
+                with slots_lock:
+                    free_slots.append(slot)
+
+        # Stalls show as the absence of progress, so the health is also checked on a timer
+        watch_done = threading.Event()
+        watcher = threading.Thread(target=self.watch_health, args=(watch_done,), daemon=True)
+        watcher.start()
+        prefetcher = None
+        if self.metadata_cache is not None and len(queued) > 1:
+            # Extract upcoming jobs while the current ones download, so a worker never waits on extraction
+            prefetcher = threading.Thread(target=self.prefetch_metadata,
+                                          args=(queued, started, watch_done, workers * self.prefetch_ahead,
+                                                download_path, quality), daemon=True)
+            prefetcher.start()
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as pool:
+                list(pool.map(run_job, queued))
+            if self.post_pool is not None:
+                self.post_pool.join()
+        finally:
+            watch_done.set()
+            with started:
+                started.notify_all()
+            if prefetcher is not None:
+                # Lets an extraction in flight finish, so nothing writes to the cache once the caller closes it
+                prefetcher.join()
+            if self.post_pool is not None:
+                # Postprocessing finishes jobs in the stores the caller closes after the run
+                self.post_pool.shutdown(cancel=self.cancelled)
+                self.post_pool = None
+            for job in jobs:
+                if job.status == 'processing':
+                    job.status = 'queued'  # dropped by cancel; its raw streams are reused on resume
+            for session in sessions:
+                session.close()
+
+        summary = {
+            'run_id': run_id,
+            'total': len(jobs),
+            'downloaded': sum(1 for job in jobs if job.status == 'finished' and not job.skipped),
+            'skipped': sum(1 for job in jobs if job.skipped),
+            'failed': [{'title': job.title, 'url': job.url, 'error': job.error, 'error_class': job.error_class}
+                       for job in jobs if job.status == 'failed'],
+            'deferred': [job.title for job in jobs if job.deferred],
+            'cancelled': self.cancelled,
+            'retry_metrics': self.retry_metrics,
+            'network_health': self.health.snapshot(),
+            'elapsed': round(time.time() - self.run_started_at, 1),
+            'items_per_minute': self.items_per_minute(),
+        }
+        if self.cancelled:
+            self.emit('run_cancelled', **summary)
+            raise DownloadCancelled("Download cancelled by user.")
+
+        if not summary['deferred']:
+            # Deferred jobs keep the run open, so it can be resumed once there is space
+            self.job_store.finish_run(run_id)
+        self.emit('run_finished', **summary)
+        return summary
+
+    def create_prefetch_ydl(self, download_path, quality):
+        """A quiet YoutubeDL for extracting jobs ahead of their download"""
+        ydl_opts = self.get_ydl_options(download_path, quality)
+        ydl_opts.update({'quiet': True, 'no_warnings': True})
+        return yt_dlp.YoutubeDL(ydl_opts)
+
+    def prefetch_job(self, ydl, job):
+        """Extract a job without downloading it and cache its info; returns the info dict, or None"""
+        try:
+            info = ydl.extract_info(job.url, download=False, process=False)
+        except Exception as e:
+            # Not fatal: the job is extracted (and its error reported) when it starts
+            job.prefetch_failed = True
+            self.emit('prefetch_failed', error=str(e), **self.job_fields(job))
+            return None
+        if info.get('_type', 'video') != 'video':
+            return None
+        if self.metadata_cache is not None and self.metadata_cache.put(job.video_id, info):
+            if job.title == job.url and info.get('title'):
+                job.title = info['title']
+            self.emit('job_prefetched', **self.job_fields(job))
+        return info
+
+    def prefetch_metadata(self, jobs, started, done, ahead, download_path, quality):
+        """Extract jobs into the metadata cache, staying up to `ahead` jobs in front of the workers"""
+        with self.create_prefetch_ydl(download_path, quality) as ydl:
+            for index, job in enumerate(jobs):
+                with started:
+                    started.wait_for(lambda: done.is_set() or index < started.count + ahead)
+                if done.is_set() or self.cancelled:
+                    return
+                if (job.status != 'queued' or not job.video_id or job.prefetch_failed
+                        or self.metadata_cache.has(job.video_id)):
+                    continue
+                self.prefetch_job(ydl, job)
+
+    def items_per_minute(self):
+        """Jobs downloaded per minute since the run started (skipped ones not counted)"""
+        if not self.run_started_at:
+            return 0.0
+        with self.jobs_lock:
+            finished = sum(1 for job in self.jobs if job.status == 'finished' and not job.skipped)
+        return round(finished * 60 / max(time.time() - self.run_started_at, 1.0), 1)
+
+    def watch_health(self, done, interval=0.5):
+        while not done.wait(interval):
+            if not self.paused:
+                self.health.evaluate(limit=self.bandwidth.current_limit())
+
+    def report_health(self, state, snapshot):
+        self.emit('network_health', **snapshot)
+
+    def wait_for_network(self):
+        """Hold a job back while the running transfers are stalled; with none running, one may try"""
+        while self.health.state == network_health.STALLED and self.health.snapshot()['active']:
+            if self.cancel_event.wait(0.5):
+                return
+
+    def wait_for_recovery(self, delay):
+        """Wait up to delay seconds, ending early once transfers move again. Returns True if cancelled."""
+        deadline = time.time() + delay
+        while time.time() < deadline:
+            if self.cancel_event.wait(min(0.5, deadline - time.time())):
+                return True
+            if self.health.state != network_health.STALLED:
+                return False
+        return self.cancelled
+
+    def skip_archived(self, job, quality, download_path=None):
+        """Mark a job finished if the archive or the content store already has it in this quality.
+
+        A stored video that lives in another folder is linked into download_path.
+        """
+        entry = self.archive.lookup(job.video_id, quality) if self.archive is not None else None
+        filename = entry['path'] if entry is not None else None
+        if self.content_store is not None and download_path is not None and not self.in_folder(filename, download_path):
+            try:
+                if self.content_store.get(job.video_id, quality) is None and filename:
+                    self.content_store.put(job.video_id, quality, filename)  # Archived before the store existed
+                placed = self.content_store.materialize(job.video_id, quality, download_path)
+            except OSError as e:
+                placed = None
+                self.emit('store_failed', error=str(e), **self.job_fields(job))
+            if placed is not None:
+                filename, job.link_method = placed
+                if self.archive is not None:
+                    self.archive.add(job.video_id, quality, filename, extractor=job.extractor)
+        if entry is None and job.link_method is None:
+            return False
+        job.skipped = True
+        job.status = 'finished'
+        job.filename = filename
+        self.job_store.set_state(self.run_id, job.position, job_store.DONE, filename=job.filename)
+        return True
+
+    def in_folder(self, path, folder):
+        return bool(path) and os.path.dirname(os.path.abspath(path)) == os.path.abspath(folder)
+
+    def download_job_with_retry(self, session, job, download_path, quality, slot=0):
+        """Download one job, retrying each class of error within its budget.
+
+        Returns True on success, False if the job failed or was cancelled.
+        """
+        job.slot = slot
+        job.retry_count = 0
+        job.status = 'downloading'
+        attempts = {}  # error class -> failed attempts
+        stall_retries = 0
+        self.emit('job_started', **self.job_fields(job))
+
+        while not self.cancelled:
+            job.was_paused = False
+            job.stream_expires = None
+            job.cache_hit = False
+            try:
+                self.job_store.set_state(self.run_id, job.position, job_store.EXTRACTING)
+                tasks = session.download(job, download_path, quality)
+                if tasks:
+                    # The raw streams are on disk: ffmpeg runs on the pool while this worker takes the next job
+                    job.status = 'processing'
+                    job.slot = None  # the slot row belongs to the next job now
+                    self.post_pool.submit(self.post_process_job, job, tasks, quality, attempts)
+                    return True
+                self.finish_job(job, quality, attempts)
+                return True
+
+            except DownloadCancelled:
+                self.health.stop(job.position)
+                job.status = 'queued'
+                return False
+
+            except DiskSpaceError as e:
+                # Raised before the download starts, so no .part file is left behind
+                self.health.stop(job.position)
+                if self.disk_policy == disk_space.TRIM:
+                    self.defer_job(job, str(e))
+                else:
+                    self.fail_job(job, str(e), retry_policy.FATAL)
+                return False
+
+            except Exception as e:
+                self.health.stop(job.position)
+                if self.cancelled:
+                    job.status = 'queued'
+                    return False
+                error_class, retry_after = classify_error(e)
+                stale = isinstance(e, StreamExpired) or error_class in (retry_policy.FORBIDDEN, retry_policy.FATAL)
+                if self.metadata_cache is not None and stale:
+                    self.metadata_cache.invalidate(job.video_id)
+                if isinstance(e, StreamExpired) or (job.was_paused and error_class == retry_policy.FORBIDDEN):
+                    # Fall back to a checkpointed resume: extract again and continue the .part file
+                    self.emit('resume_fallback', error=str(e), **self.job_fields(job))
+                    continue
+                if job.cache_hit and stale:
+                    # The cached format URLs may be what failed; try once more from a fresh extraction
+                    self.emit('cache_stale', error=str(e), **self.job_fields(job))
+                    continue
+                if (error_class in NETWORK_ERROR_CLASSES and self.health.state == network_health.STALLED
+                        and stall_retries < self.max_stall_retries):
+                    # Every transfer stopped, not just this one: wait for the network instead of using up the budget
+                    stall_retries += 1
+                    delay = self.retry_policy.delay(stall_retries)
+                    self.emit('network_wait', error_class=error_class, delay=round(delay, 1), error=str(e),
+                              **self.job_fields(job))
+                    started = time.time()
+                    cancelled = self.wait_for_recovery(delay)
+                    self.record_retry_metric(error_class, retries=1, wait_seconds=time.time() - started)
+                    if cancelled:
+                        job.status = 'queued'
+                        return False
+                    continue
+                attempts[error_class] = attempts.get(error_class, 0) + 1
+                job.retry_count += 1
+
+                if self.retry_policy.should_retry(error_class, attempts[error_class]):
+                    delay = self.retry_policy.delay(attempts[error_class], retry_after)
+                    self.emit('retry', error_class=error_class, attempt=attempts[error_class],
+                              max_retries=self.retry_policy.budget(error_class), delay=round(delay, 1),
+                              retry_after=retry_after, error=str(e), **self.job_fields(job))
+
+                    # Wait before retry; Stop ends the wait at once
+                    started = time.time()
+                    cancelled = self.cancel_event.wait(delay)
+                    self.record_retry_metric(error_class, retries=1, wait_seconds=time.time() - started)
+                    if cancelled:
+                        job.status = 'queued'
+                        return False
+                    continue
+
+                if error_class == retry_policy.FATAL:
+                    self.fail_job(job, str(e), error_class)
+                else:
+                    self.fail_job(job, f"{error_class} error after {attempts[error_class]} attempts: {e}", error_class)
+                return False
+
+        return False
+
+    def post_process_job(self, job, tasks, quality, attempts):
+        """Run the deferred postprocessors of a downloaded job on the pool, then finish it"""
+        if self.cancelled:
+            return False
+        self.emit('job_postprocessing', **self.job_fields(job))
+        try:
+            for task in tasks:
+                info = task()
+                job.filename = info.get('filepath') or job.filename
+        except Exception as e:
+            self.fail_job(job, f"Post-processing failed: {e}", retry_policy.FATAL)
+            return False
+        self.finish_job(job, quality, attempts)
+        return True
+
+    def fail_job(self, job, error, error_class):
+        """Record a job that will not be retried in this run"""
+        job.error = error
+        job.error_class = error_class
+        job.status = 'failed'
+        self.job_store.set_state(self.run_id, job.position, job_store.FAILED, error=job.error)
+        self.emit('job_failed', error=job.error, error_class=error_class, network=error_class != retry_policy.FATAL,
+                  traceback=traceback.format_exc(), **self.job_fields(job))
+
+    def finish_job(self, job, quality, attempts):
+        """Record a completed job in the job store, archive and content store"""
+        job.status = 'finished'
+        self.job_store.set_state(self.run_id, job.position, job_store.DONE, filename=job.filename)
+        if self.archive is not None and job.video_id:
+            self.archive.add(job.video_id, quality, job.filename, extractor=job.extractor)
+        if self.content_store is not None and job.video_id and job.filename and os.path.exists(job.filename):
+            try:
+                self.content_store.put(job.video_id, quality, job.filename)
+            except OSError as e:
+                self.emit('store_failed', error=str(e), **self.job_fields(job))
+        for error_class in attempts:
+            self.record_retry_metric(error_class, recovered=1)
+        self.emit('job_finished', filename=job.filename, items_per_minute=self.items_per_minute(),
+                  **self.job_fields(job))
+
+    def record_retry_metric(self, error_class, retries=0, wait_seconds=0.0, recovered=0):
+        with self.jobs_lock:
+            metric = self.retry_metrics.setdefault(error_class, {'retries': 0, 'wait_seconds': 0.0, 'recovered': 0})
+            metric['retries'] += retries
+            metric['wait_seconds'] = round(metric['wait_seconds'] + wait_seconds, 2)
+            metric['recovered'] += recovered
+
+    def job_fields(self, job):
+        """Common fields identifying a job in events"""
+        return {
+            'position': job.position,
+            'slot': job.slot,
+            'title': job.title,
+            'url': job.url,
+            'video_id': job.video_id,
+        }
+
+    def overall_fraction(self):
+        """Completed fraction of the current run, weighted by bytes per job"""
+        with self.jobs_lock:
+            jobs = list(self.jobs)
+            if not jobs:
+                return 0.0
+            known = [job.total_bytes for job in jobs if job.total_bytes]
+            # Jobs whose size is not known yet weigh as much as an average known job
+            default_weight = (sum(known) / len(known)) if known else 1
+            total_weight = 0
+            done_weight = 0
+            for job in jobs:
+                weight = job.total_bytes or default_weight
+                total_weight += weight
+                done_weight += weight * job.fraction
+        return done_weight / total_weight
+
+    def job_counts(self):
+        """Return (finished, active, total) job counts for the current run"""
+        with self.jobs_lock:
+            finished = sum(1 for job in self.jobs if job.status in ('finished', 'failed'))
+            active = sum(1 for job in self.jobs if job.status in ('downloading', 'processing'))
+            return finished, active, len(self.jobs)
+
+    def progress_hook(self, d, job=None):
+        """Progress hook for yt-dlp; turns callbacks into engine events"""
+        if self.cancelled:
+            raise DownloadCancelled("Download cancelled by user.")
+
+        if job is None:
+            return
+        self.track_job_progress(job, d)
+        if d['status'] == 'downloading' and self.preallocate:
+            self.preallocate_stream(job, d)
+        if d['status'] == 'downloading':
+            self.health.record(job.position, job.downloaded_bytes, limit=self.bandwidth.current_limit())
+        else:
+            self.health.stop(job.position)  # the stream is complete or failed; post-processing moves no bytes
+        if self.paused and d['status'] == 'downloading':
+            self.wait_while_paused(job)
+        self.bandwidth.refresh()
+
+        if d['status'] == 'downloading':
+            self.emit('progress', downloaded_bytes=job.downloaded_bytes, total_bytes=job.total_bytes,
+                      percent=job.fraction * 100, speed=d.get('speed'), eta=d.get('eta'),
+                      overall_percent=self.overall_fraction() * 100, **self.job_fields(job))
+
+        elif d['status'] == 'finished':
+            self.emit('job_processing', filename=d.get('filename'),
+                      overall_percent=self.overall_fraction() * 100, **self.job_fields(job))
+
+        elif d['status'] == 'error':
+            self.emit('job_error', error=d.get('error', 'Unknown error'), **self.job_fields(job))
+
+    def preallocate_stream(self, job, d):
+        """Reserve the disk blocks of a stream's .part file once, when its exact size is known"""
+        path = d.get('tmpfilename')
+        total = d.get('total_bytes')
+        if not path or not total or path in job.preallocated:
+            return
+        job.preallocated.add(path)
+        disk_space.preallocate(path, total)
+
+    def track_job_progress(self, job, d):
+        """Record per-stream byte counts of a job from a yt-dlp progress update"""
+        info = d.get('info_dict') or {}
+        with self.jobs_lock:
+            job.streams.pop('checkpoint', None)
+            if not job.streams:
+                # Seed every stream of a merged download so the job size is known up front
+                for fmt in info.get('requested_formats') or []:
+                    size = fmt.get('filesize') or fmt.get('filesize_approx') or 0
+                    job.streams[fmt.get('format_id')] = [0, size]
+            if info.get('id'):
+                job.video_id = info['id']
+                job.extractor = (info.get('extractor_key') or job.extractor).lower()
+            if job.stream_expires is None:
+                job.stream_expires = stream_expiry(info) or 0  # 0 = URLs do not expire
+            key = info.get('format_id') or d.get('filename')
+            stream = job.streams.setdefault(key, [0, 0])
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if total:
+                stream[1] = total
+            if d['status'] == 'downloading':
+                stream[0] = d.get('downloaded_bytes') or 0
+                job.speed = d.get('speed')
+                job.eta = d.get('eta')
+            elif d['status'] == 'finished':
+                stream[0] = stream[1] = max(stream[1], d.get('downloaded_bytes') or d.get('total_bytes') or 0)
+                job.filename = d.get('filename')
+            downloaded, total = job.downloaded_bytes, job.total_bytes
+
+        if d['status'] == 'downloading':
+            self.job_store.update_progress(self.run_id, job.position, downloaded, total)
+        elif d['status'] == 'finished':
+            self.job_store.set_state(self.run_id, job.position, job_store.POST_PROCESSING)
@@ -0,0 +1,52 @@
+import threading
+
+# Events of which only the latest one per job matters between two frames
+COALESCED_EVENTS = ('progress',)
+
+
+class EventBus:
+    """Thread-safe mailbox between worker threads and the Tk thread.
+
+    Workers post events without blocking; the Tk thread drains the bus
+    once per frame. Progress events are coalesced so that only the newest
+    one per job survives until the next drain, while every other event is
+    delivered in the order it was posted.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.coalesce_index = {}  # (event, position) -> index into pending
+        self.posted = 0
+        self.delivered = 0
+
+    def post(self, event):
+        """Queue an event dict; called from any thread"""
+        with self.lock:
+            self.posted += 1
+            kind = event.get('event')
+            if kind in COALESCED_EVENTS:
+                key = (kind, event.get('position'))
+                index = self.coalesce_index.get(key)
+                if index is not None:
+                    self.pending[index] = event
+                    return
+                self.coalesce_index[key] = len(self.pending)
+            else:
+                # Later progress of this job must not jump ahead of this event
+                for kind in COALESCED_EVENTS:
+                    self.coalesce_index.pop((kind, event.get('position')), None)
+            self.pending.append(event)
+
+    def post_call(self, fn, *args):
+        """Queue a function to be run on the Tk thread with the next frame"""
+        self.post({'event': 'call', 'fn': fn, 'args': args})
+
+    def drain(self):
+        """Take every queued event, oldest first"""
+        with self.lock:
+            events = self.pending
+            self.pending = []
+            self.coalesce_index = {}
+            self.delivered += len(events)
+        return events
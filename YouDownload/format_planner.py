@@ -0,0 +1,164 @@
+import re
+
+# Video codecs by preference: cheapest to decode and most widely playable first
+VIDEO_CODECS = ('avc1', 'vp9', 'av01')
+
+# (video ext, audio ext) pairs that merge into a common container by stream copy alone
+REMUX_CONTAINERS = {
+    ('mp4', 'm4a'): 'mp4',
+    ('mp4', 'mp4'): 'mp4',
+    ('webm', 'webm'): 'webm',
+}
+
+# Audio codec a mode keeps as is: m4a holds AAC, opus holds Opus; mp3 is transcoded from anything
+AUDIO_CODECS = {'m4a': 'mp4a', 'opus': 'opus'}
+
+
+def codec_family(codec):
+    """Short codec name ('avc1', 'vp9', 'av01', 'mp4a', 'opus', ...) from a codecs string"""
+    if not codec or codec == 'none':
+        return None
+    codec = codec.split('.')[0].lower()
+    return {'h264': 'avc1', 'avc3': 'avc1', 'vp09': 'vp9', 'aac': 'mp4a'}.get(codec, codec)
+
+
+def max_height(quality):
+    """Height limit of a quality name like '720p', None for no limit"""
+    match = re.match(r'(\d+)p', quality or '')
+    return int(match.group(1)) if match else None
+
+
+def format_bytes(f, duration=None):
+    """Exact or approximate size of a format in bytes, estimated from its bitrate if needed; None if unknown"""
+    size = f.get('filesize') or f.get('filesize_approx')
+    if not size and f.get('tbr') and duration:
+        size = round(f['tbr'] * duration * 125)  # kbit/s -> bytes
+    return size or None
+
+
+def is_video_only(f):
+    return bool(codec_family(f.get('vcodec'))) and f.get('acodec') == 'none'
+
+
+def is_audio_only(f):
+    return bool(codec_family(f.get('acodec'))) and f.get('vcodec') == 'none'
+
+
+def is_progressive(f):
+    return bool(codec_family(f.get('vcodec'))) and bool(codec_family(f.get('acodec')))
+
+
+def codec_rank(f):
+    family = codec_family(f.get('vcodec'))
+    return len(VIDEO_CODECS) - VIDEO_CODECS.index(family) if family in VIDEO_CODECS else 0
+
+
+def protocol_rank(f):
+    """Plain HTTP(S) files first, then DASH segments, then HLS (m3u8), which downloads fragment by fragment"""
+    protocol = f.get('protocol') or ''
+    if protocol.startswith('m3u8'):
+        return 0
+    if 'dash' in protocol or f.get('fragments'):
+        return 1
+    return 2
+
+
+def size_rank(f):
+    # The smaller file first; a file of unknown size only after every known one
+    size = format_bytes(f)
+    return (size is not None, -(size or 0))
+
+
+def audio_key(f, order):
+    # The extractor's preference and the original language track first, then the higher bitrate
+    return (f.get('preference') or 0, f.get('language_preference') or 0, f.get('abr') or f.get('tbr') or 0,
+            protocol_rank(f), size_rank(f), order)
+
+
+def video_key(f):
+    return (f.get('preference') or 0, f.get('height') or 0, f.get('fps') or 0,
+            (f.get('dynamic_range') or 'SDR') == 'SDR')
+
+
+def stream_key(f, order):
+    # yt-dlp lists formats from worst to best, so a later one wins what is still a tie
+    return (codec_rank(f), protocol_rank(f), size_rank(f), order)
+
+
+def make_plan(chosen, container, remux_only, duration=None):
+    sizes = [format_bytes(f, duration) for f in chosen]
+    video = next((f for f in chosen if f.get('vcodec') != 'none'), None)
+    audio = next((f for f in chosen if f.get('acodec') != 'none'), None)
+    return {
+        'format': '+'.join(f['format_id'] for f in chosen),
+        'format_ids': [f['format_id'] for f in chosen],
+        'container': container,
+        'remux_only': remux_only,
+        'expected_bytes': sum(sizes) if all(sizes) else None,
+        'exact_size': all(f.get('filesize') for f in chosen),
+        'height': video.get('height') if video else None,
+        'vcodec': codec_family(video.get('vcodec')) if video else None,
+        'acodec': codec_family(audio.get('acodec')) if audio else None,
+    }
+
+
+def plan_formats(formats, height=None, audio_codec=None, duration=None):
+    """Pick the formats to download from an extracted formats list.
+
+    Video and audio streams are preferably paired so that they share a
+    container (mp4 or webm) and merge by stream copy into it rather than
+    into mkv. Pairs are ranked by the extractor's preference, resolution
+    (up to height), frame rate, SDR over HDR, shared container, video
+    codec, protocol (HLS last) and size (unknown last), then audio
+    language and bitrate; yt-dlp's own order breaks the remaining ties.
+    DRM-protected formats cannot be downloaded and are never chosen.
+    With audio_codec set ('mp3', 'm4a' or 'opus')
+    only an audio stream is chosen, preferring one already in that codec;
+    remux_only tells whether the audio is kept as is. Returns a plan dict,
+    or None when the formats carry no codec information to plan from.
+    duration (seconds) estimates sizes the format list does not give.
+    """
+    formats = [f for f in formats or [] if f.get('format_id') and f.get('url') and not f.get('has_drm')]
+    order = {id(f): index for index, f in enumerate(formats)}
+    audio = sorted((f for f in formats if is_audio_only(f)), key=lambda f: audio_key(f, order[id(f)]), reverse=True)
+
+    if audio_codec is not None:
+        wanted = AUDIO_CODECS.get(audio_codec)
+        matching = [f for f in audio if codec_family(f.get('acodec')) == wanted]
+        if not (matching or audio):
+            return None
+        chosen = (matching or audio)[0]
+        return make_plan([chosen], audio_codec, bool(matching), duration)
+
+    def fits(f):
+        return height is None or (f.get('height') or 0) <= height
+
+    candidates = []
+    for video in (f for f in formats if is_video_only(f) and fits(f)):
+        for sound in audio:
+            container = REMUX_CONTAINERS.get((video.get('ext'), sound.get('ext')))
+            # Remux-only pairs win over mkv merges of the same resolution and frame rate
+            key = video_key(video) + (container is not None,) + stream_key(video, order[id(video)])
+            candidates.append((key + audio_key(sound, order[id(sound)]), [video, sound], container or 'mkv'))
+    for single in (f for f in formats if is_progressive(f) and fits(f)):
+        key = video_key(single) + (True,) + stream_key(single, order[id(single)])
+        candidates.append((key + audio_key(single, order[id(single)]), [single], single.get('ext')))
+    if not candidates:
+        return None
+    _, chosen, container = max(candidates, key=lambda candidate: candidate[0])
+    # yt-dlp merges by stream copy; a pair without a common container just ends up in mkv
+    return make_plan(chosen, container, True, duration)
+
+
+def describe_plan(plan):
+    """One line for the window or a log, e.g. '137+140: 1080p avc1 + mp4a, mp4, ~245.3 MB'"""
+    parts = []
+    if plan['height']:
+        parts.append(f"{plan['height']}p {plan['vcodec']}" + (f" + {plan['acodec']}" if plan['acodec'] else ""))
+    elif plan['acodec']:
+        parts.append(plan['acodec'])
+    parts.append(plan['container'] + ("" if plan['remux_only'] else " (transcoded)"))
+    if plan['expected_bytes']:
+        size = plan['expected_bytes'] / (1024 * 1024)
+        parts.append(f"{'' if plan['exact_size'] else '~'}{size:.1f} MB")
+    return f"{plan['format']}: " + ", ".join(parts)
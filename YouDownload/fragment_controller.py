@@ -0,0 +1,125 @@
+import math
+import threading
+import time
+
+MIB = 1024 * 1024
+
+
+class FragmentController:
+    """Tunes fragment parallelism and HTTP chunk size from observed transfers.
+
+    yt-dlp reads 'concurrent_fragment_downloads' and 'http_chunk_size'
+    when it starts a stream, so the controller judges every finished
+    stream and sets the values used for the next one: the audio stream
+    after the video stream, and the following videos of the same session.
+
+    - Many retried fragments or chunks halve both values, so a flaky link
+      repeats less data per retry.
+    - Clean fragmented streams double the fragment count while throughput
+      keeps improving by at least 10%, and fall back to the last count that
+      helped once it stops improving.
+    - Clean streams double the chunk size, which saves range requests.
+
+    yt-dlp reports progress and retries from its fragment threads, so
+    every method takes the controller's lock.
+    """
+
+    def __init__(self, fragments=4, chunk_size=10 * MIB, min_fragments=1, max_fragments=16,
+                 min_chunk_size=1 * MIB, max_chunk_size=64 * MIB, error_threshold=0.05):
+        self.fragments = fragments
+        self.chunk_size = chunk_size
+        self.min_fragments = min_fragments
+        self.max_fragments = max_fragments
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.error_threshold = error_threshold  # retried units per downloaded unit
+        self.fragment_ceiling = max_fragments  # lowered when more fragments stop helping
+        self.throughput_by_fragments = {}
+        self.lock = threading.RLock()  # observe() holds it while calling the other methods
+        self.reset_stream()
+
+    def reset_stream(self):
+        with self.lock:
+            self.stream_key = None
+            self.stream_start = None
+            self.start_bytes = 0
+            self.stream_bytes = 0
+            self.fragments_done = 0
+            self.fragmented = False
+            self.errors = 0
+
+    def options(self):
+        with self.lock:
+            return {'concurrent_fragment_downloads': self.fragments, 'http_chunk_size': self.chunk_size}
+
+    def record_error(self):
+        """Count a retried fragment or chunk of the current stream"""
+        with self.lock:
+            self.errors += 1
+
+    def observe(self, d):
+        """Feed a yt-dlp progress update; returns a decision dict when the values change"""
+        with self.lock:
+            key = d.get('tmpfilename') or d.get('filename')
+            if d['status'] == 'downloading':
+                if key != self.stream_key:
+                    errors = self.errors if self.stream_key is None else 0
+                    self.reset_stream()
+                    self.errors = errors  # keep errors reported before the first progress update
+                    self.stream_key = key
+                    self.stream_start = time.time()
+                    self.start_bytes = d.get('downloaded_bytes') or 0
+                self.stream_bytes = (d.get('downloaded_bytes') or 0) - self.start_bytes
+                if d.get('fragment_count'):
+                    self.fragmented = True
+                    self.fragments_done = max(self.fragments_done, d.get('fragment_index') or 0)
+            elif d['status'] == 'finished' and self.stream_key is not None:
+                decision = self.finish_stream(time.time() - self.stream_start)
+                self.reset_stream()
+                return decision
+            return None
+
+    def finish_stream(self, elapsed):
+        """Choose the values for the next stream from the one that just finished"""
+        with self.lock:
+            if elapsed < 1 or self.stream_bytes < MIB:
+                return None  # Too short to tell anything about the link
+            throughput = self.stream_bytes / elapsed
+            if self.fragmented:
+                units = max(self.fragments_done, 1)
+            else:
+                units = max(math.ceil(self.stream_bytes / self.chunk_size), 1)
+            error_rate = self.errors / units
+            old = (self.fragments, self.chunk_size)
+
+            if error_rate > self.error_threshold:
+                reason = "retries"
+                self.fragments = max(self.min_fragments, self.fragments // 2)
+                self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+                self.fragment_ceiling = self.max_fragments
+                self.throughput_by_fragments.clear()
+            else:
+                reason = "clean"
+                if self.fragmented:
+                    self.throughput_by_fragments[self.fragments] = throughput
+                    fewer = [count for count in self.throughput_by_fragments if count < self.fragments]
+                    previous = max(fewer) if fewer else None
+                    if previous is not None and throughput < self.throughput_by_fragments[previous] * 1.1:
+                        # More fragments did not pay off: go back and stop probing upwards
+                        reason = "plateau"
+                        self.fragment_ceiling = previous
+                        self.fragments = previous
+                    elif self.fragments < self.fragment_ceiling:
+                        self.fragments = min(self.fragment_ceiling, self.fragments * 2)
+                if self.errors == 0:
+                    self.chunk_size = min(self.max_chunk_size, self.chunk_size * 2)
+
+            if (self.fragments, self.chunk_size) == old:
+                return None
+            return {
+                'reason': reason,
+                'throughput': int(throughput),
+                'error_rate': round(error_rate, 3),
+                'concurrent_fragment_downloads': self.fragments,
+                'http_chunk_size': self.chunk_size,
+            }
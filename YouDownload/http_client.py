@@ -0,0 +1,56 @@
+import atexit
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (5, 15)  # (connect, read) seconds
+
+
+class PooledSession(requests.Session):
+    """requests.Session with bounded keep-alive pools and a default timeout.
+
+    Every host gets a pool of at most per_host connections that stay open
+    between requests; with pool_block a thread waits for a free connection
+    instead of opening one that would be thrown away afterwards. Idempotent
+    requests are retried once on connection errors and 502/503/504.
+    """
+
+    def __init__(self, per_host=4, hosts=16, timeout=DEFAULT_TIMEOUT, retries=1):
+        super().__init__()
+        self.timeout = timeout
+        retry = Retry(total=retries, read=0, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset(("GET", "HEAD")))
+        adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=per_host, pool_block=True, max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_session():
+    """The process-wide session for auxiliary requests (thumbnails, checks), created on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PooledSession()
+        return _shared
+
+
+def close_shared_session():
+    """Close the pooled connections of the shared session; a later call creates a new one"""
+    global _shared
+    with _shared_lock:
+        session, _shared = _shared, None
+    if session is not None:
+        session.close()
+
+
+atexit.register(close_shared_session)
@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+
+# Item states, in the order an item normally moves through them
+QUEUED = "queued"
+EXTRACTING = "extracting"
+DOWNLOADING = "downloading"
+POST_PROCESSING = "post-processing"
+DONE = "done"
+FAILED = "failed"
+
+# States an interrupted run still has to work through
+PENDING_STATES = (QUEUED, EXTRACTING, DOWNLOADING, POST_PROCESSING)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    download_path TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    is_playlist INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS items (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    video_id TEXT,
+    url TEXT NOT NULL,
+    title TEXT,
+    state TEXT NOT NULL,
+    downloaded_bytes INTEGER NOT NULL DEFAULT 0,
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    filename TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, position)
+);
+CREATE INDEX IF NOT EXISTS items_state ON items(run_id, state);
+"""
+
+
+class JobStore:
+    """Crash-safe record of download runs and the state of every item in them"""
+
+    def __init__(self, path="downloads.db", progress_interval=1.0):
+        self.path = path
+        self.progress_interval = progress_interval  # seconds between byte-offset writes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._last_progress_write = {}
+
+    def create_run(self, url, download_path, quality, is_playlist, items):
+        """Record a new run. items is a list of dicts with url, and optionally id and title."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            cur = self.conn.execute(
+                "INSERT INTO runs (url, download_path, quality, is_playlist, created_at) VALUES (?, ?, ?, ?, ?)",
+                (url, download_path, quality, int(is_playlist), now))
+            run_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO items (run_id, position, video_id, url, title, state, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, position, item.get('id'), item['url'], item.get('title'), QUEUED, now)
+                 for position, item in enumerate(items)])
+        return run_id
+
+    def get_run(self, run_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest_unfinished_run(self):
+        """Return the most recent run that still has pending items, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM runs WHERE finished = 0 AND EXISTS ("
+                " SELECT 1 FROM items WHERE items.run_id = runs.id AND state IN (?, ?, ?, ?))"
+                " ORDER BY id DESC LIMIT 1", PENDING_STATES).fetchone()
+        return dict(row) if row else None
+
+    def pending_items(self, run_id):
+        """Items of a run that are not done or failed, in queue order"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM items WHERE run_id = ? AND state IN (?, ?, ?, ?) ORDER BY position",
+                (run_id,) + PENDING_STATES).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_items(self, run_id):
+        """Return a {state: count} summary of a run"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT state, COUNT(*) FROM items WHERE run_id = ? GROUP BY state", (run_id,)).fetchall()
+        return {state: count for state, count in rows}
+
+    def set_state(self, run_id, position, state, filename=None, error=None):
+        """Move an item to a new state"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE items SET state = ?, filename = COALESCE(?, filename), error = ?, updated_at = ?"
+                " WHERE run_id = ? AND position = ?",
+                (state, filename, error, time.time(), run_id, position))
+            self._last_progress_write.pop((run_id, position), None)
+
+    def update_progress(self, run_id, position, downloaded_bytes, total_bytes, force=False):
+        """Checkpoint the byte offset of a downloading item, at most once per progress_interval"""
+        key = (run_id, position)
+        now = time.time()
+        with self.lock:
+            if not force and now - self._last_progress_write.get(key, 0) < self.progress_interval:
+                return
+            self._last_progress_write[key] = now
+            self.conn.execute(
+                "UPDATE items SET state = ?, downloaded_bytes = ?, total_bytes = ?, updated_at = ?"
+                " WHERE run_id = ? AND position = ?",
+                (DOWNLOADING, downloaded_bytes, total_bytes, now, run_id, position))
+
+    def finish_run(self, run_id):
+        """Mark a run as finished so it is no longer offered for resume"""
+        with self.lock:
+            self.conn.execute("UPDATE runs SET finished = 1 WHERE id = ?", (run_id,))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,134 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlparse, parse_qs
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    video_id TEXT PRIMARY KEY,
+    info BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+"""
+
+
+def url_expiry(url):
+    """The 'expire' timestamp of a signed stream URL (YouTube style), or None"""
+    expire = parse_qs(urlparse(url or '').query).get('expire')
+    if expire and expire[0].isdigit():
+        return int(expire[0])
+    return None
+
+
+def info_expiry(info):
+    """Earliest expiry of the format URLs in an info dict, or None if they do not expire"""
+    expiries = [url_expiry(fmt.get('url')) for fmt in info.get('formats') or [info]]
+    expiries = [expiry for expiry in expiries if expiry]
+    return min(expiries) if expiries else None
+
+
+class MetadataCache:
+    """On-disk cache of unprocessed yt-dlp info dicts, keyed by video id.
+
+    The info dicts keep their resolved format URLs, so a cached video can
+    be handed straight to YoutubeDL.process_ie_result() for download
+    without extracting it again. An entry lives for `ttl` seconds, or
+    until shortly before its format URLs expire, whichever is first; the
+    least recently used entries are evicted beyond max_entries/max_bytes.
+    """
+
+    def __init__(self, path="metadata_cache.db", ttl=3 * 3600, max_entries=500, max_bytes=100 * 1024 * 1024,
+                 expiry_margin=600):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes  # compressed size on disk
+        self.expiry_margin = expiry_margin  # stop using URLs this many seconds before they expire
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, video_id):
+        """Return a fresh copy of the cached info dict, or None if missing or expired"""
+        if not video_id:
+            return None
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT info, expires_at FROM entries WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self.conn.execute("DELETE FROM entries WHERE video_id = ?", (video_id,))
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE entries SET last_used = ? WHERE video_id = ?", (now, video_id))
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def has(self, video_id):
+        """Whether a fresh entry exists, without loading it or counting a hit"""
+        if not video_id:
+            return False
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM entries WHERE video_id = ? AND expires_at > ?",
+                                    (video_id, time.time())).fetchone()
+        return row is not None
+
+    def peek(self, video_id):
+        """Like get(), but without counting a hit or marking the entry used, e.g. for size estimates"""
+        if not video_id:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT info FROM entries WHERE video_id = ? AND expires_at > ?",
+                                    (video_id, time.time())).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row is not None else None
+
+    def put(self, video_id, info):
+        """Cache an unprocessed info dict; returns False if it cannot be stored"""
+        if not video_id or info.get('_type', 'video') != 'video' or info.get('is_live'):
+            return False
+        try:
+            data = zlib.compress(json.dumps(info).encode("utf-8"))
+        except (TypeError, ValueError):
+            return False  # holds objects that do not survive JSON
+        now = time.time()
+        expires_at = now + self.ttl
+        url_expires = info_expiry(info)
+        if url_expires:
+            expires_at = min(expires_at, url_expires - self.expiry_margin)
+        if expires_at <= now:
+            return False
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (video_id, info, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (video_id, data, len(data), expires_at, now))
+            self._evict(now)
+        return True
+
+    def invalidate(self, video_id):
+        """Drop an entry, e.g. after its URLs were refused"""
+        with self.lock:
+            self.conn.execute("DELETE FROM entries WHERE video_id = ?", (video_id,))
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        for video_id, size in self.conn.execute("SELECT video_id, size FROM entries ORDER BY last_used").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM entries WHERE video_id = ?", (video_id,))
+            count -= 1
+            total -= size
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import deque
+
+# Health states
+HEALTHY = "healthy"        # throughput close to what this network usually delivers
+DEGRADED = "degraded"      # bytes still arrive, but far slower than the baseline
+STALLED = "stalled"        # transfers are active but no bytes arrived for stall_after seconds
+RECOVERING = "recovering"  # throughput is back, not yet for recover_after seconds
+
+
+class NetworkHealthMonitor:
+    """Network health judged from the progress of live transfers.
+
+    Every progress sample of every job goes into one rolling window of
+    received bytes. The aggregate throughput is compared with a slowly
+    moving baseline of healthy throughput (capped by the bandwidth limit),
+    and the time since any transfer last moved tells a stall apart from a
+    slow link, well before a socket timeout would. on_change(state,
+    snapshot) is called whenever the state changes.
+    """
+
+    def __init__(self, window=5.0, stall_after=6.0, degraded_ratio=0.4, recover_after=4.0, warmup=3.0,
+                 baseline_period=30.0, on_change=None):
+        self.window = window  # seconds of samples the throughput is averaged over
+        self.stall_after = stall_after
+        self.degraded_ratio = degraded_ratio  # below this share of the baseline counts as degraded
+        self.recover_after = recover_after
+        self.warmup = warmup  # seconds of transfer before throughput is judged at all
+        self.baseline_period = baseline_period  # time constant of the baseline average
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all samples and the baseline, e.g. for a new run"""
+        with self.lock:
+            self.samples = deque()  # (time, bytes received) across all transfers
+            self.window_bytes = 0
+            self.last_bytes = {}  # transfer key -> downloaded bytes at its last sample
+            self.active = {}  # transfer key -> time it last moved (or started)
+            self.measuring_since = None  # start of the current stretch with active transfers
+            self.baseline = None  # bytes/s while healthy
+            self.baseline_at = None
+            self.throughput = 0.0
+            self.state = HEALTHY
+            self.state_since = time.monotonic()
+
+    def start(self, key, now=None):
+        """A transfer began (or began again after a retry)"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if not self.active:
+                self.measuring_since = now
+            self.active[key] = now
+            self.last_bytes.pop(key, None)
+
+    def stop(self, key):
+        """A transfer ended, whatever the outcome"""
+        with self.lock:
+            self.active.pop(key, None)
+            self.last_bytes.pop(key, None)
+            if not self.active:
+                self.measuring_since = None
+
+    def touch(self, now=None):
+        """Count every active transfer as just moved, e.g. after a pause during which none could"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            for key in self.active:
+                self.active[key] = now
+            if self.active:
+                self.measuring_since = now
+            self.samples.clear()
+            self.window_bytes = 0
+
+    def record(self, key, downloaded_bytes, now=None, limit=None):
+        """Add a progress sample: the bytes a transfer has downloaded so far"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if key not in self.active:
+                if not self.active:
+                    self.measuring_since = now
+                self.active[key] = now
+            previous = self.last_bytes.get(key)
+            self.last_bytes[key] = downloaded_bytes
+            # The first sample of a transfer may include a resumed .part file; later drops mean a new stream
+            delta = downloaded_bytes - previous if previous is not None and downloaded_bytes > previous else 0
+            if delta or previous is None:
+                self.active[key] = now
+            if delta:
+                self.samples.append((now, delta))
+                self.window_bytes += delta
+        self.evaluate(now, limit)
+
+    def evaluate(self, now=None, limit=None):
+        """Update the state from the samples so far; limit is the current bandwidth cap in bytes/s, if any"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            previous = self.state
+            self._update(now, limit)
+            changed = self.state != previous
+            snapshot = self._snapshot(now) if changed else None
+        if changed and self.on_change is not None:
+            self.on_change(snapshot['state'], snapshot)
+        return self.state
+
+    def _update(self, now, limit):
+        while self.samples and self.samples[0][0] <= now - self.window:
+            self.window_bytes -= self.samples.popleft()[1]
+        if not self.active:
+            return  # nothing to judge by; keep the last state
+        measured = now - self.measuring_since
+        self.throughput = self.window_bytes / max(min(measured, self.window), 1e-3)
+
+        if now - max(self.active.values()) >= self.stall_after:
+            self._set_state(STALLED, now)
+            return
+        if self.state == STALLED:
+            # Bytes move again; judge the throughput afresh rather than against the silent window
+            self.measuring_since = now
+            self._set_state(RECOVERING, now)
+            return
+        if measured < self.warmup:
+            return
+        expected = self.baseline
+        if expected is not None and limit:
+            expected = min(expected, limit)
+        slow = expected is not None and self.throughput < self.degraded_ratio * expected
+
+        if slow:
+            self._set_state(DEGRADED, now)
+        elif self.state == DEGRADED:
+            self._set_state(RECOVERING, now)
+        elif self.state == RECOVERING and now - self.state_since >= self.recover_after:
+            self._set_state(HEALTHY, now)
+
+        if self.state == HEALTHY:
+            # Rises are taken at once, drops averaged in slowly
+            if self.baseline is None or self.throughput > self.baseline:
+                self.baseline = self.throughput
+            else:
+                weight = min((now - self.baseline_at) / self.baseline_period, 1.0)
+                self.baseline += (self.throughput - self.baseline) * weight
+            self.baseline_at = now
+
+    def _set_state(self, state, now):
+        if state != self.state:
+            self.state = state
+            self.state_since = now
+
+    def _snapshot(self, now):
+        return {
+            'state': self.state,
+            'throughput': round(self.throughput),
+            'baseline': round(self.baseline) if self.baseline is not None else None,
+            'active': len(self.active),
+            'stalled_for': round(now - max(self.active.values()), 1) if self.active else 0.0,
+        }
+
+    def snapshot(self, now=None):
+        """Current state, throughput and baseline (bytes/s) as a dict"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return self._snapshot(now)
+
+    def transfers_moving(self, now=None):
+        """Number of active transfers that received bytes within stall_after"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return sum(1 for moved in self.active.values() if now - moved < self.stall_after)
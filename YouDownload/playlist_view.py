@@ -0,0 +1,165 @@
+import tkinter as tk
+from tkinter import ttk
+
+THUMB_PLACEHOLDER = "🖼️"
+
+
+class PlaylistView(ttk.Frame):
+    """Virtualized list of playlist entries.
+
+    Shows the entries of a SelectionModel (dicts with a title and
+    optionally a loaded 'photo') and their selection. Only the rows that
+    fit in the visible area have widgets; scrolling rebinds those rows to
+    other entries instead of creating new ones, so building and scrolling
+    cost the same for 50 or 50,000 entries. Shift-click selects a range.
+    """
+
+    def __init__(self, master, selection, on_thumbnail=None, on_toggle=None, on_scroll=None, row_height=52, height=220,
+                 title_length=90):
+        super().__init__(master)
+        self.selection = selection
+        self.on_thumbnail = on_thumbnail  # called with the item index when a thumbnail button is clicked
+        self.on_toggle = on_toggle  # called after the selection changed through a checkbox
+        self.on_scroll = on_scroll  # called with (first, end) item indexes in view after every redraw
+        self.row_height = row_height
+        self.title_length = title_length
+        self.top = 0  # index of the first visible item
+        self.rows = []  # pooled row widgets: (frame, var, thumb_btn, title_label)
+
+        self.columnconfigure(0, weight=1)
+        self.body = ttk.Frame(self, height=height)
+        self.body.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.body.bind("<Configure>", lambda event: self.resize_pool(event.height))
+
+    @property
+    def items(self):
+        return self.selection.items
+
+    def reset(self):
+        """Show the selection model from the top, e.g. after it was cleared"""
+        self.top = 0
+        self.refresh()
+
+    def append(self, items):
+        """Add entries at the end; only redraws if some of them are in view"""
+        start = len(self.items)
+        self.selection.add(items)
+        if start < self.top + len(self.rows):
+            self.refresh()
+        else:
+            self.update_scrollbar()
+
+    def visible_count(self):
+        return max(len(self.rows) - 1, 1)  # the last pooled row is usually cut off
+
+    def resize_pool(self, height):
+        """Create or drop pooled rows so they cover the visible height"""
+        wanted = height // self.row_height + 2
+        while len(self.rows) < wanted:
+            self.rows.append(self.create_row(len(self.rows)))
+        while len(self.rows) > wanted:
+            self.rows.pop()[0].destroy()
+        self.refresh()
+
+    def create_row(self, slot):
+        frame = ttk.Frame(self.body)
+        frame.place(x=0, y=slot * self.row_height, relwidth=1, height=self.row_height)
+        frame.columnconfigure(2, weight=1)
+        var = tk.BooleanVar(value=False)
+        checkbox = ttk.Checkbutton(frame, variable=var, command=lambda: self.toggle_slot(slot))
+        checkbox.grid(row=0, column=0, padx=(0, 8), pady=2)
+        checkbox.bind("<Shift-Button-1>", lambda event: self.range_slot(slot))
+        thumb_btn = ttk.Button(frame, text=THUMB_PLACEHOLDER, width=2, command=lambda: self.thumbnail_slot(slot))
+        thumb_btn.grid(row=0, column=1, padx=(0, 8), pady=2)
+        title_label = ttk.Label(frame, font=("Segoe UI", 10), anchor="w")
+        title_label.grid(row=0, column=2, sticky="w")
+        return frame, var, thumb_btn, title_label
+
+    def refresh(self):
+        """Bind every pooled row to the item it currently shows"""
+        self.top = max(0, min(self.top, len(self.items) - self.visible_count()))
+        for slot in range(len(self.rows)):
+            self.refresh_slot(slot)
+        self.update_scrollbar()
+        if self.on_scroll is not None:
+            self.on_scroll(self.top, min(self.top + len(self.rows), len(self.items)))
+
+    def refresh_item(self, index):
+        """Redraw one item if it is in view, e.g. after its thumbnail loaded"""
+        if self.top <= index < self.top + len(self.rows):
+            self.refresh_slot(index - self.top)
+
+    def refresh_slot(self, slot):
+        frame, var, thumb_btn, title_label = self.rows[slot]
+        index = self.top + slot
+        if index >= len(self.items):
+            frame.place_forget()
+            return
+        item = self.items[index]
+        frame.place(x=0, y=slot * self.row_height, relwidth=1, height=self.row_height)
+        var.set(self.selection.is_selected_at(index))
+        title = item.get('title') or "Unknown Title"
+        if len(title) > self.title_length:
+            title = title[:self.title_length - 1] + "…"
+        title_label.config(text=title)
+        photo = item.get('photo')
+        if photo is not None:
+            thumb_btn.config(image=photo, text="", width=0)
+        else:
+            thumb_btn.config(image="", text=THUMB_PLACEHOLDER, width=2)
+
+    def toggle_slot(self, slot):
+        index = self.top + slot
+        if index >= len(self.items):
+            return
+        self.selection.set_selected(self.selection.keys[index], self.rows[slot][1].get())
+        if self.on_toggle is not None:
+            self.on_toggle()
+
+    def range_slot(self, slot):
+        """Shift-click: give every entry from the last toggled one to this one the new state"""
+        index = self.top + slot
+        if index >= len(self.items):
+            return "break"
+        anchor = self.selection.anchor if self.selection.anchor is not None else index
+        self.selection.select_range(anchor, index, not self.selection.is_selected_at(index))
+        self.refresh()
+        if self.on_toggle is not None:
+            self.on_toggle()
+        return "break"
+
+    def thumbnail_slot(self, slot):
+        index = self.top + slot
+        if index < len(self.items) and self.on_thumbnail is not None:
+            self.on_thumbnail(index)
+
+    def update_scrollbar(self):
+        total = len(self.items)
+        if total == 0:
+            self.scrollbar.set(0, 1)
+            return
+        self.scrollbar.set(self.top / total, min((self.top + self.visible_count()) / total, 1))
+
+    def yview(self, *args):
+        """Scrollbar protocol: ('moveto', fraction) or ('scroll', n, 'units'|'pages')"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            top = int(float(args[1]) * len(self.items))
+        elif args[0] == 'scroll':
+            step = self.visible_count() if args[2] == 'pages' else 1
+            top = self.top + int(args[1]) * step
+        else:
+            return
+        self.scroll_to(top)
+
+    def scroll(self, rows):
+        self.scroll_to(self.top + rows)
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.items) - self.visible_count()))
+        if top != self.top:
+            self.top = top
+            self.refresh()
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+def lower_priority(nice, on_error=None):
+    """Raise the niceness of the calling thread by nice, and with it of the processes it starts.
+
+    Linux keeps the niceness per thread and a child process inherits it,
+    so every ffmpeg run started from this thread runs at the lower
+    priority too. Elsewhere this does nothing. If it fails, on_error gets
+    the OSError and the thread keeps its priority.
+    """
+    if nice <= 0 or not sys.platform.startswith('linux') or not hasattr(os, 'setpriority'):
+        return
+    try:
+        thread_id = threading.get_native_id()
+        current = os.getpriority(os.PRIO_PROCESS, thread_id)
+        os.setpriority(os.PRIO_PROCESS, thread_id, min(current + nice, 19))
+    except OSError as e:
+        if on_error is not None:
+            on_error(e)
+
+
+class PostProcessPool:
+    """Worker threads that run postprocessors (merges, audio extraction, embedding) off the download workers.
+
+    A download worker hands over a job as soon as its raw streams are on
+    disk and starts the next one, so the connection never idles through
+    an ffmpeg pass. The pool is sized to the CPU count and its threads run
+    at a lower priority (nice), so ffmpeg uses the spare cores without
+    starving the downloads or the window.
+    """
+
+    def __init__(self, workers=None, nice=10, on_error=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.nice = nice
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="postprocess",
+                                           initializer=lower_priority, initargs=(nice, on_error))
+        self.lock = threading.Lock()
+        self.futures = set()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); returns its Future"""
+        future = self.executor.submit(fn, *args, **kwargs)
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self.discard)
+        return future
+
+    def discard(self, future):
+        with self.lock:
+            self.futures.discard(future)
+
+    def pending(self):
+        """Number of queued or running tasks"""
+        with self.lock:
+            return len(self.futures)
+
+    def join(self):
+        """Wait until every task submitted so far has finished"""
+        while True:
+            with self.lock:
+                futures = set(self.futures)
+            if not futures:
+                return
+            wait(futures)
+
+    def shutdown(self, cancel=False):
+        """Stop the pool; with cancel, queued tasks are dropped and only running ones finish"""
+        self.executor.shutdown(wait=True, cancel_futures=cancel)
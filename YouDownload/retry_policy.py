@@ -0,0 +1,137 @@
+import random
+import re
+import socket
+import ssl
+import time
+from email.utils import parsedate_to_datetime
+
+from yt_dlp.networking.exceptions import HTTPError, TransportError
+from yt_dlp.utils import ExtractorError
+
+# Error classes, each with its own retry budget
+NETWORK = "network"        # connection refused/reset, unreachable, broken pipe
+TIMEOUT = "timeout"        # socket or read timeouts
+DNS = "dns"                # name resolution failures
+FRAGMENT = "fragment"      # fragments that could not be fetched after yt-dlp's own retries
+RATE_LIMITED = "http_429"  # too many requests
+FORBIDDEN = "http_403"     # usually an expired stream URL; a retry re-extracts it
+SERVER = "http_5xx"        # server side errors
+FATAL = "fatal"            # unavailable/private videos, 404s and everything else
+
+NETWORK_ERROR_KEYWORDS = ['connection', 'network', 'unreachable', 'refused', 'reset', 'broken pipe']
+
+HTTP_STATUS_PATTERN = re.compile(r'HTTP Error (\d{3})')
+
+
+def iter_causes(exc):
+    """Yield an exception and every exception it wraps, outermost first"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc_info = getattr(exc, 'exc_info', None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        exc = wrapped or getattr(exc, 'cause', None) or exc.__cause__ or exc.__context__
+        if not isinstance(exc, BaseException):
+            exc = None
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_status(status):
+    if status == 429:
+        return RATE_LIMITED
+    if status == 403:
+        return FORBIDDEN
+    if status is not None and 500 <= status < 600:
+        return SERVER
+    return FATAL
+
+
+def classify_error(exc):
+    """Classify a yt-dlp or network exception.
+
+    Returns (error class, seconds from Retry-After or None).
+    """
+    for cause in iter_causes(exc):
+        if isinstance(cause, HTTPError):
+            headers = getattr(cause.response, 'headers', None) or {}
+            return classify_status(cause.status), parse_retry_after(headers.get('Retry-After'))
+        if isinstance(cause, socket.gaierror):
+            return DNS, None
+        if isinstance(cause, (socket.timeout, TimeoutError)):
+            return TIMEOUT, None
+        if isinstance(cause, (ConnectionError, ssl.SSLError)):
+            return NETWORK, None
+        if isinstance(cause, ExtractorError) and cause.expected and not cause.cause:
+            return FATAL, None
+
+    # Fall back to the message, e.g. for errors yt-dlp only reports as text
+    message = str(exc)
+    lowered = message.lower()
+    status = HTTP_STATUS_PATTERN.search(message)
+    if status:
+        return classify_status(int(status.group(1))), None
+    if 'fragment' in lowered and ('unable to continue' in lowered or 'giving up' in lowered):
+        return FRAGMENT, None
+    if 'getaddrinfo' in lowered or 'name or service not known' in lowered or 'name resolution' in lowered:
+        return DNS, None
+    if 'timed out' in lowered or 'timeout' in lowered:
+        return TIMEOUT, None
+    if any(keyword in lowered for keyword in NETWORK_ERROR_KEYWORDS):
+        return NETWORK, None
+    if any(isinstance(cause, TransportError) for cause in iter_causes(exc)):
+        return NETWORK, None
+    return FATAL, None
+
+
+class RetryPolicy:
+    """Per-error-class attempt budgets and exponential backoff with jitter.
+
+    A budget is the number of attempts a job may make while failing with
+    that class of error (1 = never retried).
+    """
+
+    def __init__(self, max_attempts=3, base_delay=5.0, max_delay=120.0, max_retry_after=900.0, budgets=None, rng=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after  # never honour a Retry-After longer than this
+        self.budgets = {
+            NETWORK: max_attempts,
+            TIMEOUT: max_attempts,
+            DNS: max_attempts,
+            FRAGMENT: max_attempts,
+            SERVER: max_attempts,
+            RATE_LIMITED: max_attempts + 2,
+            FORBIDDEN: min(max_attempts, 2),
+            FATAL: 1,
+        }
+        self.budgets.update(budgets or {})
+        self.rng = rng or random.Random()
+
+    def budget(self, error_class):
+        return self.budgets.get(error_class, 1)
+
+    def should_retry(self, error_class, attempts):
+        """attempts is how many attempts already failed with this class"""
+        return attempts < self.budget(error_class)
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (1-based)"""
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        # "Equal jitter": keep half the backoff, randomise the other half
+        delay = backoff / 2 + self.rng.uniform(0, backoff / 2)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
@@ -0,0 +1,141 @@
+import bisect
+import re
+
+
+class SelectionModel:
+    """Playlist entries and their selection, keyed by video id.
+
+    Toggles and lookups are set/dict operations. Title, duration and upload
+    date are kept in columns next to the entries, with sorted indexes for
+    the numeric ones, so criteria like "shorter than 10 minutes" or a
+    title regex can be matched against thousands of entries instantly.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.items = []  # entries in playlist order
+        self.keys = []  # video id (or a placeholder) of every entry
+        self.positions = {}  # key -> position
+        self.selected = set()  # keys of the selected entries
+        self.titles = []  # case-folded titles
+        self.durations = []  # seconds or None
+        self.upload_dates = []  # 'YYYYMMDD' or None
+        self._duration_index = None  # sorted (duration, position), built on first use
+        self._date_index = None
+        self.anchor = None  # position of the last single toggle, for range selects
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, entries, selected=True):
+        """Append entries (dicts with id, title, duration, upload_date)"""
+        for entry in entries:
+            position = len(self.items)
+            key = entry.get('id') or f"#{position}"
+            if key in self.positions:
+                key = f"{key}#{position}"  # the same video twice in one playlist
+            self.items.append(entry)
+            self.keys.append(key)
+            self.positions[key] = position
+            self.titles.append((entry.get('title') or "").casefold())
+            self.durations.append(entry.get('duration'))
+            self.upload_dates.append(entry.get('upload_date'))
+            if selected:
+                self.selected.add(key)
+        self._duration_index = None
+        self._date_index = None
+
+    @property
+    def selected_count(self):
+        return len(self.selected)
+
+    def is_selected(self, key):
+        return key in self.selected
+
+    def is_selected_at(self, position):
+        return self.keys[position] in self.selected
+
+    def set_selected(self, key, selected):
+        if selected:
+            self.selected.add(key)
+        else:
+            self.selected.discard(key)
+        self.anchor = self.positions.get(key)
+
+    def toggle(self, key):
+        """Flip one entry; returns its new state"""
+        self.set_selected(key, key not in self.selected)
+        return key in self.selected
+
+    def select_range(self, start, end, selected=True):
+        """Select or deselect every entry between two positions, both included"""
+        start, end = sorted((start, end))
+        keys = self.keys[max(start, 0):end + 1]
+        if selected:
+            self.selected.update(keys)
+        else:
+            self.selected.difference_update(keys)
+        self.anchor = end
+
+    def select_all(self):
+        self.selected = set(self.keys)
+
+    def deselect_all(self):
+        self.selected = set()
+
+    def selected_items(self):
+        """Selected entries in playlist order"""
+        return [item for key, item in zip(self.keys, self.items) if key in self.selected]
+
+    def match(self, title=None, min_duration=None, max_duration=None, uploaded_after=None, uploaded_before=None,
+              exclude_ids=None):
+        """Positions of the entries matching every given criterion.
+
+        title is a case-insensitive regex; durations are in seconds and
+        dates are 'YYYYMMDD' strings, all bounds inclusive. Entries without
+        a duration or date never match a bound on it. exclude_ids is a set
+        of video ids to leave out, e.g. the ones already downloaded.
+        """
+        candidates = None
+        if min_duration is not None or max_duration is not None:
+            if self._duration_index is None:
+                self._duration_index = self.build_index(self.durations)
+            candidates = self.range_positions(self._duration_index, min_duration, max_duration)
+        if uploaded_after is not None or uploaded_before is not None:
+            if self._date_index is None:
+                self._date_index = self.build_index(self.upload_dates)
+            dated = self.range_positions(self._date_index, uploaded_after, uploaded_before)
+            candidates = dated if candidates is None else candidates & dated
+
+        positions = range(len(self.items)) if candidates is None else sorted(candidates)
+        if title:
+            pattern = re.compile(title, re.IGNORECASE)
+            positions = [position for position in positions if pattern.search(self.titles[position])]
+        if exclude_ids:
+            positions = [position for position in positions if self.items[position].get('id') not in exclude_ids]
+        return list(positions)
+
+    def select_matching(self, mode="replace", **criteria):
+        """Apply match() to the selection: 'replace' it, 'add' to it or 'remove' from it. Returns the match count."""
+        keys = [self.keys[position] for position in self.match(**criteria)]
+        if mode == "replace":
+            self.selected = set(keys)
+        elif mode == "add":
+            self.selected.update(keys)
+        elif mode == "remove":
+            self.selected.difference_update(keys)
+        else:
+            raise ValueError(f"Unknown selection mode: {mode}")
+        return len(keys)
+
+    def build_index(self, column):
+        pairs = sorted((value, position) for position, value in enumerate(column) if value is not None)
+        return [value for value, _ in pairs], [position for _, position in pairs]
+
+    def range_positions(self, index, low, high):
+        values, positions = index
+        start = 0 if low is None else bisect.bisect_left(values, low)
+        end = len(values) if high is None else bisect.bisect_right(values, high)
+        return set(positions[start:end])
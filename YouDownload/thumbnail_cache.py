@@ -0,0 +1,210 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from thumbnail_loader import THUMB_SIZE, decode_thumbnail
+
+# File extensions by leading magic bytes of the original image
+IMAGE_SIGNATURES = ((b"\xff\xd8", "jpg"), (b"\x89PNG", "png"), (b"GIF8", "gif"))
+
+
+def image_ext(data):
+    """File extension matching the bytes of an image"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    for signature, ext in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    return "jpg"
+
+
+class ThumbnailCache:
+    """Two-tier cache of video thumbnails, keyed by video id.
+
+    Decoded 80x45 images stay in a memory LRU capped at memory_bytes. On
+    disk, the original bytes (for album art) and the shrunk version (for
+    the playlist list) survive restarts. A running total of their size is
+    kept, and once it passes disk_bytes the least recently used files are
+    pruned down to PRUNE_TARGET of the cap, so pruning does not run on
+    every write.
+
+    on_error(video_id, error) is called when a cached thumbnail turns out
+    to be unreadable and is dropped.
+    """
+
+    PRUNE_TARGET = 0.9
+
+    def __init__(self, root="thumbnail_cache", memory_bytes=8 * 1024 * 1024, disk_bytes=200 * 1024 * 1024,
+                 size=THUMB_SIZE, on_error=None):
+        self.root = root
+        self.size = size
+        self.on_error = on_error
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()  # video id -> decoded image, least recently used first
+        self.memory_used = 0
+        self.disk_lock = threading.Lock()
+        self.disk_used = 0
+        self.original_dir = os.path.join(root, "original")
+        self.small_dir = os.path.join(root, "small")
+        os.makedirs(self.original_dir, exist_ok=True)
+        os.makedirs(self.small_dir, exist_ok=True)
+        self.prune()
+
+    def file_key(self, video_id):
+        # Video ids are usually safe file names; anything else is hashed
+        if re.fullmatch(r"[\w-]{1,64}", video_id):
+            return video_id
+        return hashlib.sha1(video_id.encode("utf-8")).hexdigest()
+
+    def small_path(self, video_id):
+        return os.path.join(self.small_dir, self.file_key(video_id) + ".png")
+
+    def original_path(self, video_id):
+        # Stored without an extension; image_ext() tells the format from the bytes
+        return os.path.join(self.original_dir, self.file_key(video_id))
+
+    def memory_get(self, video_id):
+        """The decoded image if it is in memory; never touches the disk"""
+        with self.lock:
+            image = self.memory.get(video_id)
+            if image is not None:
+                self.memory.move_to_end(video_id)
+            return image
+
+    def get(self, video_id):
+        """The decoded image from memory or disk, or None"""
+        if not video_id:
+            return None
+        image = self.memory_get(video_id)
+        if image is not None:
+            return image
+        try:
+            with Image.open(self.small_path(video_id)) as small:
+                image = small.convert("RGB")
+        except (OSError, ValueError):
+            data, _ = self.get_original(video_id)
+            if data is None:
+                return None
+            try:
+                image = decode_thumbnail(data, self.size)
+            except (OSError, ValueError) as e:
+                self.remove_file(self.original_path(video_id))
+                if self.on_error:
+                    self.on_error(video_id, e)
+                return None
+            self.save_small(video_id, image)
+        self.remember(video_id, image)
+        return image
+
+    def get_original(self, video_id):
+        """The original image bytes and their extension, or (None, None)"""
+        if not video_id:
+            return None, None
+        path = self.original_path(video_id)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None, None
+        os.utime(path)  # keep recently used files through pruning
+        return data, image_ext(data)
+
+    def put(self, video_id, data, image=None):
+        """Store the original bytes of a thumbnail and its decoded small version"""
+        if not video_id:
+            return
+        self.write_file(self.original_path(video_id), data)
+        if image is None:
+            image = decode_thumbnail(data, self.size)
+        self.save_small(video_id, image)
+        self.remember(video_id, image)
+
+    def write_file(self, path, data):
+        self.replace_file(path, lambda f: f.write(data))
+
+    def save_small(self, video_id, image):
+        self.replace_file(self.small_path(video_id), lambda f: image.save(f, format="PNG"))
+
+    def replace_file(self, path, write):
+        """Write a file aside and rename it into place, so readers never see half a file.
+
+        Every call gets its own temporary file, since the thumbnail loader
+        and the download workers may store the same video at once.
+        """
+        fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                size = f.tell()
+            with self.disk_lock:
+                previous = file_size(path)
+                os.replace(partial, path)
+                self.disk_used += size - previous
+                over = self.disk_used > self.disk_bytes
+        except BaseException:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            raise
+        if over:
+            self.prune(int(self.disk_bytes * self.PRUNE_TARGET))
+
+    def remove_file(self, path):
+        with self.disk_lock:
+            previous = file_size(path)
+            try:
+                os.remove(path)
+            except OSError:
+                return
+            self.disk_used -= previous
+
+    def remember(self, video_id, image):
+        cost = image.width * image.height * len(image.getbands())
+        with self.lock:
+            previous = self.memory.pop(video_id, None)
+            if previous is not None:
+                self.memory_used -= previous.width * previous.height * len(previous.getbands())
+            self.memory[video_id] = image
+            self.memory_used += cost
+            while self.memory_used > self.memory_bytes and len(self.memory) > 1:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_used -= evicted.width * evicted.height * len(evicted.getbands())
+
+    def prune(self, target=None):
+        """Delete the least recently used files until at most target bytes (default disk_bytes) remain"""
+        if target is None:
+            target = self.disk_bytes
+        with self.disk_lock:
+            files = []
+            for folder in (self.original_dir, self.small_dir):
+                for entry in os.scandir(folder):
+                    # Partial files belong to writes still in progress
+                    if entry.is_file() and not entry.name.endswith(".part"):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self.disk_used = total
+
+
+def file_size(path):
+    """Size of a file, or 0 if it does not exist"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+import http_client
+
+THUMB_SIZE = (80, 45)
+
+
+def decode_thumbnail(data, size=THUMB_SIZE):
+    """Decode image bytes into a size x size RGB image.
+
+    JPEGs are decoded in draft mode, which lets libjpeg scale by 1/2, 1/4
+    or 1/8 while decoding, so a 1280x720 thumbnail never gets fully
+    decoded just to be shrunk to 80x45.
+    """
+    img = Image.open(BytesIO(data))
+    if img.format == "JPEG":
+        img.draft("RGB", size)
+    return img.convert("RGB").resize(size, Image.Resampling.LANCZOS)
+
+
+class ThumbnailLoader:
+    """Fetches and decodes thumbnails on a small thread pool.
+
+    deliver(key, image) is called with a finished PIL image, from a worker
+    thread (or right away for images held in memory by the cache); the
+    caller turns it into a PhotoImage on the Tk thread. Requests that have
+    not started yet can be cancelled, and the result of one that was
+    cancelled while running is dropped. With a ThumbnailCache, images are
+    looked up by video id before anything is fetched. on_error(key, error)
+    is called from a worker thread when a thumbnail cannot be loaded.
+    """
+
+    def __init__(self, deliver, workers=4, size=THUMB_SIZE, timeout=5, session=None, cache=None, on_error=None):
+        self.deliver = deliver
+        self.on_error = on_error
+        self.size = size
+        self.timeout = timeout
+        self.session = session or http_client.shared_session()
+        self.cache = cache
+        self.fetched = 0  # thumbnails downloaded, i.e. not found in the cache
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self.lock = threading.Lock()
+        self.pending = {}  # key -> Future
+
+    def request(self, key, url, video_id=None):
+        """Queue a thumbnail unless it is already queued or loading"""
+        if self.cache is not None and video_id:
+            image = self.cache.memory_get(video_id)
+            if image is not None:
+                self.deliver(key, image)
+                return
+        if not url:
+            return
+        with self.lock:
+            if key in self.pending:
+                return
+            future = self.pool.submit(self.load, key, url, video_id)
+            self.pending[key] = future
+        future.add_done_callback(lambda f, key=key: self.finished(key, f))
+
+    def cancel(self, key):
+        with self.lock:
+            future = self.pending.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def cancel_except(self, keys):
+        """Cancel every request whose key is not in keys, e.g. rows scrolled out of view"""
+        keys = set(keys)
+        with self.lock:
+            stale = [key for key in self.pending if key not in keys]
+        for key in stale:
+            self.cancel(key)
+
+    def cancel_all(self):
+        self.cancel_except(())
+
+    def load(self, key, url, video_id=None):
+        image = self.cache.get(video_id) if self.cache is not None else None
+        if image is None:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            with self.lock:
+                self.fetched += 1
+            image = decode_thumbnail(response.content, self.size)
+            if self.cache is not None:
+                self.cache.put(video_id, response.content, image)
+        with self.lock:
+            wanted = key in self.pending
+        if wanted:
+            self.deliver(key, image)
+        return image
+
+    def finished(self, key, future):
+        with self.lock:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+        if not future.cancelled() and future.exception() is not None and self.on_error:
+            self.on_error(key, future.exception())
+
+    def shutdown(self):
+        self.cancel_all()
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,48 @@
+import csv
+import io
+import re
+
+URL_PATTERN = re.compile(r"https?://[^\s,;\"'<>]+")
+
+
+def parse_urls(text):
+    """Every http(s) URL in a block of text, in order and without duplicates.
+
+    Works for one URL per line, comma or space separated lists, and text
+    copied from a spreadsheet or a web page; lines starting with # are
+    comments.
+    """
+    urls = []
+    seen = set()
+    for line in text.splitlines():
+        if line.lstrip().startswith("#"):
+            continue
+        for url in URL_PATTERN.findall(line):
+            url = url.rstrip(").]")
+            if url not in seen:
+                seen.add(url)
+                urls.append(url)
+    return urls
+
+
+def parse_csv(text):
+    """URLs from CSV text: the 'url' column if there is one, else any cell holding a URL"""
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "url" in header:
+        column = header.index("url")
+        cells = [row[column] for row in rows[1:] if len(row) > column]
+    else:
+        cells = [cell for row in rows for cell in row]
+    return parse_urls("\n".join(cells))
+
+
+def read_url_file(path):
+    """Read the URLs of a text file (one or more per line) or a CSV file"""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        text = f.read()
+    if path.lower().endswith(".csv"):
+        return parse_csv(text)
+    return parse_urls(text)
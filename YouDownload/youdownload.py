@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+youdownload - headless command line front end for the YouDownload engine.
+
+Downloads videos and playlists without a display and writes one JSON
+progress event per line (NDJSON) to stdout. Send SIGUSR1 to pause the
+running transfers and SIGUSR2 to resume them.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from download_engine import DownloadEngine, DownloadCancelled, QUALITIES, MAX_WORKERS, is_valid_youtube_url, video_url, youtube_video_id
+from job_store import JobStore
+from download_archive import DownloadArchive
+from content_store import ContentStore
+from metadata_cache import MetadataCache
+from thumbnail_cache import ThumbnailCache
+from url_batch import read_url_file
+from bandwidth import BandwidthLimiter, parse_rate, parse_schedule
+from disk_space import POLICIES as DISK_POLICIES
+
+# Short command line names for the GUI quality choices
+QUALITY_ALIASES = {
+    'best': "Best Quality",
+    '1080p': "1080p",
+    '720p': "720p",
+    '480p': "480p",
+    '360p': "360p",
+    'audio': "Audio Only (MP3)",
+    'mp3': "Audio Only (MP3)",
+    'm4a': "Audio Only (M4A)",
+    'opus': "Audio Only (Opus)",
+}
+
+
+class EventWriter:
+    """Thread-safe NDJSON writer that rate-limits progress events per job"""
+    def __init__(self, stream, progress_interval=0.5):
+        self.stream = stream
+        self.progress_interval = progress_interval
+        self.lock = threading.Lock()
+        self.last_progress = {}
+
+    def __call__(self, event):
+        with self.lock:
+            if event['event'] == 'progress':
+                now = time.time()
+                key = event.get('position')
+                if now - self.last_progress.get(key, 0) < self.progress_interval:
+                    return
+                self.last_progress[key] = now
+            self.stream.write(json.dumps(event, default=str) + "\n")
+            self.stream.flush()
+
+
+def expand_urls(engine, urls, emit):
+    """Turn video and playlist URLs into a flat list of run items.
+
+    Video URLs become items as they are; the engine extracts them while
+    earlier items download. Only playlists are listed up front.
+    """
+    items = []
+    for url in urls:
+        if not is_valid_youtube_url(url):
+            emit({'event': 'invalid_url', 'url': url, 'time': time.time()})
+            continue
+        video_id = youtube_video_id(url)
+        if video_id:
+            items.append({'id': video_id, 'title': url, 'url': url})
+            continue
+        def on_page(playlist, entries, url=url):
+            emit({'event': 'playlist_page', 'url': url, 'title': playlist.get('title'), 'count': len(entries), 'time': time.time()})
+
+        try:
+            info = engine.list_url(url, on_page=on_page)
+        except Exception as e:
+            emit({'event': 'extract_failed', 'url': url, 'error': str(e), 'time': time.time()})
+            continue
+        if info.get('_type') == 'playlist':
+            entries = [entry for entry in info.get('entries') or [] if entry]
+            for entry in entries:
+                items.append({'id': entry.get('id'), 'title': entry.get('title'), 'url': video_url(entry.get('id'))})
+            emit({'event': 'playlist_listed', 'url': url, 'title': info.get('title'), 'count': len(entries),
+                  'error': info.get('error'), 'time': time.time()})
+        else:
+            items.append({'id': info.get('id'), 'title': info.get('title'), 'url': url})
+    return items
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="youdownload", description="Download YouTube videos and playlists without the GUI.")
+    parser.add_argument("urls", nargs="*", help="video or playlist URLs")
+    parser.add_argument("-f", "--url-file", help="text file with URLs (one or more per line) or a CSV file with a url column")
+    parser.add_argument("-o", "--output", default=os.path.expanduser("~/Downloads"), help="download folder (default: ~/Downloads)")
+    parser.add_argument("-q", "--quality", default="best", help=f"one of {', '.join(QUALITY_ALIASES)} (default: best)")
+    parser.add_argument("-j", "--concurrency", type=int, default=3, help=f"parallel downloads, 1-{MAX_WORKERS} (default: 3)")
+    parser.add_argument("-r", "--limit-rate", help="total download rate cap shared by all jobs, e.g. 500K or 4M")
+    parser.add_argument("--rate-schedule", help="time-of-day caps overriding --limit-rate, e.g. 09:00-18:00=1M,18:00-23:00=8M")
+    parser.add_argument("--post-workers", type=int, help="threads running merges and conversions while the next videos download, 0 = after each download (default: one per CPU)")
+    parser.add_argument("--disk-space", choices=DISK_POLICIES, default="warn", help="when the queue may not fit on the disk: warn and fail videos that cannot fit, trim the queue (the rest stays for --resume), or off (default: warn)")
+    parser.add_argument("--no-preallocate", action="store_true", help="do not reserve disk space for downloads of known size up front")
+    parser.add_argument("--retries", type=int, default=3, help="attempts per video for each class of transient error (default: 3)")
+    parser.add_argument("--retry-delay", type=float, default=5, help="base backoff delay in seconds, doubled per retry (default: 5)")
+    parser.add_argument("--db", default="downloads.db", help="job store database (default: downloads.db)")
+    parser.add_argument("--archive", default="archive.db", help="archive of completed downloads, which are skipped (default: archive.db)")
+    parser.add_argument("--no-archive", action="store_true", help="download videos even if the archive has them")
+    parser.add_argument("--store", default="content_store", help="content store shared by all runs; known videos are linked from it (default: content_store)")
+    parser.add_argument("--no-store", action="store_true", help="do not keep or link videos through the content store")
+    parser.add_argument("--metadata-cache", default="metadata_cache.db", help="cache of extracted video info and stream URLs (default: metadata_cache.db)")
+    parser.add_argument("--no-metadata-cache", action="store_true", help="extract every video again before downloading it")
+    parser.add_argument("--thumbnail-cache", default="thumbnail_cache", help="folder of cached thumbnails, used as album art (default: thumbnail_cache)")
+    parser.add_argument("--import-archive", metavar="FILE", help="add the videos of a yt-dlp --download-archive file to the archive")
+    parser.add_argument("--resume", action="store_true", help="continue the most recent unfinished run")
+    parser.add_argument("--progress-interval", type=float, default=0.5, help="seconds between progress events per job")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    quality = QUALITY_ALIASES.get(args.quality.lower(), args.quality)
+    if quality not in QUALITIES:
+        print(f"Unknown quality: {args.quality}", file=sys.stderr)
+        return 2
+    if not 1 <= args.concurrency <= MAX_WORKERS:
+        print(f"Concurrency must be between 1 and {MAX_WORKERS}", file=sys.stderr)
+        return 2
+
+    try:
+        bandwidth = BandwidthLimiter(parse_rate(args.limit_rate), parse_schedule(args.rate_schedule))
+    except ValueError:
+        print("Invalid --limit-rate or --rate-schedule", file=sys.stderr)
+        return 2
+
+    emit = EventWriter(sys.stdout, args.progress_interval)
+    archive = None if args.no_archive else DownloadArchive(args.archive)
+    if args.import_archive:
+        if archive is None:
+            print("--import-archive cannot be used with --no-archive", file=sys.stderr)
+            return 2
+        added = archive.import_ytdlp_archive(args.import_archive)
+        emit({'event': 'archive_imported', 'path': args.import_archive, 'added': added, 'time': time.time()})
+        if not args.urls and not args.url_file and not args.resume:
+            return 0
+
+    def thumbnail_error(video_id, error):
+        emit({'event': 'thumbnail_cache_error', 'video_id': video_id, 'error': str(error), 'time': time.time()})
+
+    engine = DownloadEngine(on_event=emit, store=JobStore(args.db), max_retries=args.retries, retry_delay=args.retry_delay, quiet=True,
+                            bandwidth=bandwidth, archive=archive, content_store=None if args.no_store else ContentStore(args.store),
+                            metadata_cache=None if args.no_metadata_cache else MetadataCache(args.metadata_cache),
+                            thumbnail_cache=ThumbnailCache(args.thumbnail_cache, on_error=thumbnail_error), post_workers=args.post_workers,
+                            disk_policy=args.disk_space, preallocate=not args.no_preallocate)
+
+    if args.resume:
+        run = engine.job_store.latest_unfinished_run()
+        if not run:
+            print("No unfinished run to resume", file=sys.stderr)
+            return 1
+        run_id = run['id']
+    else:
+        urls = list(args.urls)
+        if args.url_file:
+            urls.extend(read_url_file(args.url_file))
+        if not urls:
+            print("No URLs given", file=sys.stderr)
+            return 2
+        os.makedirs(args.output, exist_ok=True)
+        items = expand_urls(engine, urls, emit)
+        if not items:
+            return 1
+        run_id = engine.create_run(urls[0], args.output, quality, len(items) > 1, items)
+
+    # Run the engine off the main thread so Ctrl+C can cancel it cleanly
+    result = {}
+
+    def run():
+        try:
+            result['summary'] = engine.run(run_id, args.concurrency)
+        except DownloadCancelled:
+            pass
+
+    # SIGUSR1 pauses the transfers in place, SIGUSR2 resumes them
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: engine.pause())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: engine.resume())
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(0.5)
+    except KeyboardInterrupt:
+        engine.cancel()
+        worker.join()
+        return 130
+    summary = result.get('summary')
+    return 1 if summary is None or summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,23 +2,58 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
 import os
-import yt_dlp
-from urllib.parse import urlparse
+import sys
 import traceback
 import shutil
 from PIL import Image, ImageTk
-import requests
-from io import BytesIO
-import time
-import signal
-import socket
 import sv_ttk
 import json
+import re
+from collections import OrderedDict
+import job_store
+from job_store import JobStore
+from download_archive import DownloadArchive
+from content_store import ContentStore
+from metadata_cache import MetadataCache
+from event_bus import EventBus
+from playlist_view import PlaylistView
+from selection_model import SelectionModel
+from thumbnail_loader import ThumbnailLoader
+from thumbnail_cache import ThumbnailCache
+from connectivity import ConnectivityChecker, parse_endpoints
+from url_batch import parse_urls, read_url_file
+from bandwidth import parse_rate, parse_schedule
+import retry_policy
+import network_health
+import disk_space
+from download_engine import DownloadEngine, DownloadCancelled, QUALITIES, MAX_WORKERS, is_valid_youtube_url, video_url, youtube_video_id
+from format_planner import describe_plan
 
 APP_VERSION = "v2.1"  # Update as needed
 
-class DownloadCancelled(Exception):
-    pass
+# How retry events describe each class of error
+ERROR_CLASS_LABELS = {
+    retry_policy.NETWORK: "Network error",
+    retry_policy.TIMEOUT: "Connection timed out",
+    retry_policy.DNS: "DNS lookup failed",
+    retry_policy.FRAGMENT: "Fragment download failed",
+    retry_policy.RATE_LIMITED: "Rate limited by YouTube (HTTP 429)",
+    retry_policy.FORBIDDEN: "Access denied (HTTP 403)",
+    retry_policy.SERVER: "YouTube server error",
+    retry_policy.FATAL: "Error",
+}
+UI_FRAME_RATE = 25  # worker events are applied to the window this many times per second
+MAX_THUMBNAIL_PHOTOS = 200  # PhotoImages kept for the playlist list; older rows show the placeholder again
+
+def user_data_dir():
+    """Per-user folder for the job store, archive and caches, so the app runs from any working directory"""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(r"~\AppData\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "YouDownload")
 
 class YouTubeDownloaderGUI:
     def __init__(self, root):
@@ -29,13 +64,27 @@ class YouTubeDownloaderGUI:
         
         # Download control variables
         self.download_thread = None
-        self.ydl_instance = None
         self.is_downloading = False
         self.is_paused = False
         self.download_cancelled = False
-        self.retry_count = 0
-        self.max_retries = 3
-        self.retry_delay = 5  # seconds
+        data_dir = user_data_dir()
+        os.makedirs(data_dir, exist_ok=True)
+        self.job_store = JobStore(os.path.join(data_dir, "downloads.db"))
+        self.archive = DownloadArchive(os.path.join(data_dir, "archive.db"))
+        self.content_store = ContentStore(os.path.join(data_dir, "content_store"))
+        self.metadata_cache = MetadataCache(os.path.join(data_dir, "metadata_cache.db"))
+        self.event_bus = EventBus()
+        self.thumbnail_cache = ThumbnailCache(os.path.join(data_dir, "thumbnail_cache"), on_error=self.thumbnail_cache_error)
+        self.connectivity = ConnectivityChecker()
+        self.thumbnail_loader = ThumbnailLoader(self.thumbnail_ready, cache=self.thumbnail_cache,
+                                                on_error=self.thumbnail_failed)
+        self.thumbnail_photos = OrderedDict()  # key -> PhotoImage shown in the list, least recently shown first
+        self.engine = DownloadEngine(on_event=self.handle_engine_event, store=self.job_store,
+                                     max_retries=3, retry_delay=5, archive=self.archive,
+                                     content_store=self.content_store, metadata_cache=self.metadata_cache,
+                                     thumbnail_cache=self.thumbnail_cache)
+        self.current_run_id = None
+        self.last_summary = None
         self.theme_is_dark = False
         self.last_downloaded_file = None
         
@@ -62,27 +111,35 @@ class YouTubeDownloaderGUI:
         self.overall_progress = tk.DoubleVar()
         self.status_text = tk.StringVar(value="Ready to download")
         self.overall_status = tk.StringVar(value="")
+        self.max_workers = tk.IntVar(value=3)
+        self.speed_limit = tk.DoubleVar(value=0)  # MB/s shared by all downloads, 0 = unlimited
+        self.filter_title = tk.StringVar()  # regex
+        self.filter_max_minutes = tk.StringVar()
+        self.filter_after = tk.StringVar()  # YYYY-MM-DD
+        self.filter_not_downloaded = tk.BooleanVar(value=False)
+        self.auto_thumbnails = tk.BooleanVar(value=False)  # load thumbnails of the rows near the viewport
+        self.slot_rows = []
         
         # Playlist variables
-        self.playlist_videos = []
+        self.selection = SelectionModel()  # listed playlist entries and which of them are selected
         self.selected_videos = []
         self.is_playlist = False
-        self.video_checkboxes = []
+        self.playlist_meta = {}
+        self.video_formats = []  # formats of the single video shown, for the format plan
+        self.video_duration = None  # its length in seconds, to estimate sizes the formats do not give
+        self.video_info_text = ""
+        self.playlist_header_shown = False
+        self.listing_cancel = threading.Event()  # set to stop the running playlist listing
         
         # Available qualities
-        self.qualities = [
-            "Best Quality",
-            "1080p",
-            "720p", 
-            "480p",
-            "360p",
-            "Audio Only (MP3)"
-        ]
+        self.qualities = list(QUALITIES)
         
         self.setup_ui()
         self.check_dependencies()
-        self.check_network_connectivity()
         self.load_last_location()
+        self.check_network_connectivity()
+        self.root.after(500, self.check_unfinished_run)
+        self.pump_events()
         
     def check_dependencies(self):
         """Check for yt-dlp and ffmpeg, disable download if missing."""
@@ -193,6 +250,9 @@ class YouTubeDownloaderGUI:
         test_btn = ttk.Button(url_frame, text="Test URL", command=self.test_url, style="Accent.TButton")
         test_btn.grid(row=1, column=1, padx=(10, 0))
         
+        batch_btn = ttk.Button(url_frame, text="Batch...", command=self.open_batch_dialog)
+        batch_btn.grid(row=1, column=2, padx=(10, 0))
+        
         # Download Location Section
         location_frame = ttk.Labelframe(main_frame, text="Download Location", padding="14 10 14 10")
         location_frame.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 15))
@@ -220,38 +280,42 @@ class YouTubeDownloaderGUI:
         quality_combo.grid(row=1, column=0, sticky=tk.W, pady=(0, 5))
         quality_combo.set("Best Quality")  # Default selection
         
+        ttk.Label(quality_frame, text="Parallel downloads:").grid(row=0, column=1, sticky=tk.W, padx=(20, 0), pady=(0, 5))
+        workers_spin = ttk.Spinbox(quality_frame, from_=1, to=MAX_WORKERS, textvariable=self.max_workers, width=5, state="readonly")
+        workers_spin.grid(row=1, column=1, sticky=tk.W, padx=(20, 0), pady=(0, 5))
+        
+        ttk.Label(quality_frame, text="Speed limit (MB/s, 0 = none):").grid(row=0, column=2, sticky=tk.W, padx=(20, 0), pady=(0, 5))
+        limit_spin = ttk.Spinbox(quality_frame, from_=0, to=1000, increment=0.5, textvariable=self.speed_limit, width=7)
+        limit_spin.grid(row=1, column=2, sticky=tk.W, padx=(20, 0), pady=(0, 5))
+        self.speed_limit.trace_add("write", lambda *args: self.apply_speed_limit())
+        self.selected_quality.trace_add("write", lambda *args: self.show_format_plan())
+        
         # Video/Playlist Info Section
         self.info_frame = ttk.Labelframe(main_frame, text="Video/Playlist Information", padding="14 10 14 10")
         self.info_frame.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 15))
         self.info_frame.columnconfigure(0, weight=1)
         
-        # Create a frame for info with scrollbar
-        info_canvas = tk.Canvas(self.info_frame, height=220, highlightthickness=0)
-        info_scrollbar = ttk.Scrollbar(self.info_frame, orient="vertical", command=info_canvas.yview)
-        self.info_scrollable_frame = ttk.Frame(info_canvas)
+        # Video details or playlist header
+        self.info_label = ttk.Label(self.info_frame, text="", justify="left")
+        self.info_label.grid(row=0, column=0, sticky=tk.W)
         
-        self.info_scrollable_frame.bind(
-            "<Configure>",
-            lambda e: info_canvas.configure(scrollregion=info_canvas.bbox("all"))
-        )
-        
-        info_canvas.create_window((0, 0), window=self.info_scrollable_frame, anchor="nw")
-        info_canvas.configure(yscrollcommand=info_scrollbar.set)
-        
-        info_canvas.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        info_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        # Playlist entries; only the visible rows have widgets
+        self.playlist_view = PlaylistView(self.info_frame, self.selection, on_thumbnail=self.load_single_thumbnail,
+                                          on_toggle=self.selection_changed, on_scroll=self.prefetch_thumbnails, height=220)
+        self.playlist_view.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
+        self.playlist_view.grid_remove()
         
         def on_mouse_wheel(event):
-            # Determine which canvas to scroll based on mouse position
+            # Determine which list to scroll based on mouse position
             widget = self.root.winfo_containing(event.x_root, event.y_root)
             if widget is None:
                 return
 
-            # Walk up the widget hierarchy to see if it's inside info_canvas
+            # Walk up the widget hierarchy to see if it's inside the playlist view
             parent = widget
             while parent != self.root:
-                if parent == info_canvas:
-                    info_canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+                if parent == self.playlist_view:
+                    self.playlist_view.scroll(int(-1 * (event.delta / 120)) or (-1 if event.delta > 0 else 1))
                     return
                 # Check if parent is None, to avoid infinite loop
                 if parent is None:
@@ -263,17 +327,32 @@ class YouTubeDownloaderGUI:
 
         self.root.bind_all("<MouseWheel>", on_mouse_wheel)
 
-        self.info_frame.rowconfigure(0, weight=1)
+        self.info_frame.rowconfigure(1, weight=1)
         self.info_frame.columnconfigure(0, weight=1)
         
         # Playlist controls
         self.playlist_controls_frame = ttk.Frame(self.info_frame)
-        self.playlist_controls_frame.grid(row=1, column=0, sticky="ew", pady=5)
+        self.playlist_controls_frame.grid(row=2, column=0, sticky="ew", pady=5)
         self.playlist_controls_frame.grid_remove() # Hide by default
+        self.stop_listing_btn = ttk.Button(self.playlist_controls_frame, text="Stop Listing", command=self.stop_listing)
+        
+        # Select entries by criteria
+        self.filter_frame = ttk.Frame(self.info_frame)
+        self.filter_frame.grid(row=3, column=0, sticky="ew", pady=(0, 5))
+        self.filter_frame.grid_remove() # Hide by default
+        ttk.Label(self.filter_frame, text="Title:").pack(side="left")
+        ttk.Entry(self.filter_frame, textvariable=self.filter_title, width=18).pack(side="left", padx=(4, 8))
+        ttk.Label(self.filter_frame, text="Max minutes:").pack(side="left")
+        ttk.Entry(self.filter_frame, textvariable=self.filter_max_minutes, width=5).pack(side="left", padx=(4, 8))
+        ttk.Label(self.filter_frame, text="Uploaded after:").pack(side="left")
+        ttk.Entry(self.filter_frame, textvariable=self.filter_after, width=10).pack(side="left", padx=(4, 8))
+        ttk.Checkbutton(self.filter_frame, text="Not downloaded", variable=self.filter_not_downloaded).pack(side="left", padx=(0, 8))
+        ttk.Button(self.filter_frame, text="Select Matching", command=self.select_matching).pack(side="left", padx=(0, 5))
+        ttk.Button(self.filter_frame, text="Add Matching", command=lambda: self.select_matching("add")).pack(side="left")
         
         # Loading indicator
         self.loading_label = ttk.Label(self.info_frame, text="", font=("Segoe UI", 10, "italic"))
-        self.loading_label.grid(row=2, column=0, pady=(5, 0))
+        self.loading_label.grid(row=4, column=0, pady=(5, 0))
         
         # Overall Progress Section
         overall_frame = ttk.Labelframe(main_frame, text="Overall Progress", padding="14 10 14 10")
@@ -299,6 +378,11 @@ class YouTubeDownloaderGUI:
         self.status_label = ttk.Label(progress_frame, textvariable=self.status_text)
         self.status_label.grid(row=1, column=0, sticky=tk.W)
         
+        # One progress row per worker slot, built when a download starts
+        self.slots_frame = ttk.Frame(progress_frame)
+        self.slots_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(8, 0))
+        self.slots_frame.columnconfigure(1, weight=1)
+        
         # Control Buttons Section
         control_frame = ttk.Frame(main_frame)
         control_frame.grid(row=8, column=0, columnspan=3, pady=(0, 15))
@@ -353,6 +437,10 @@ class YouTubeDownloaderGUI:
             self.stop_btn = ttk.Button(control_frame, text=f"⏹ {stop_text}", command=self.stop_download, style="Stop.TButton", state="disabled")
         self.stop_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        # Pause button (initially disabled); holds transfers open instead of stopping them
+        self.pause_btn = ttk.Button(control_frame, text="⏸ Pause Download", command=self.pause_download, state="disabled")
+        self.pause_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         # Resume button (initially disabled)
         resume_text = "Resume Download"
         if 'resume' in self.button_icons:
@@ -413,164 +501,308 @@ class YouTubeDownloaderGUI:
         self.status_text.set("Fetching video/playlist information...")
         self.download_btn.config(state="disabled")
         
+        # A new listing replaces one that may still be running
+        self.listing_cancel.set()
+        self.listing_cancel = threading.Event()
+        
         # Run in separate thread to avoid blocking GUI
         thread = threading.Thread(target=self.fetch_video_info, args=(url,))
         thread.daemon = True
         thread.start()
         
+    def open_batch_dialog(self):
+        """Let the user paste many URLs or load them from a text or CSV file"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Batch Download")
+        dialog.transient(self.root)
+        ttk.Label(dialog, text="Paste video or playlist URLs (one per line, or separated by spaces or commas):").pack(
+            anchor="w", padx=10, pady=(10, 5))
+        text = tk.Text(dialog, width=80, height=15)
+        text.pack(fill="both", expand=True, padx=10)
+        
+        def load_file():
+            path = filedialog.askopenfilename(parent=dialog, title="Load URLs",
+                                              filetypes=[("URL lists", "*.txt *.csv"), ("All files", "*.*")])
+            if not path:
+                return
+            try:
+                urls = read_url_file(path)
+            except (OSError, UnicodeDecodeError) as e:
+                messagebox.showerror("Error", f"Cannot read {path}: {e}", parent=dialog)
+                return
+            text.insert("end", "\n".join(urls) + "\n")
+        
+        def add():
+            urls = parse_urls(text.get("1.0", "end"))
+            if not urls:
+                messagebox.showerror("Error", "No URLs found", parent=dialog)
+                return
+            dialog.destroy()
+            self.add_batch(urls)
+        
+        buttons = ttk.Frame(dialog)
+        buttons.pack(fill="x", padx=10, pady=10)
+        ttk.Button(buttons, text="Load File...", command=load_file).pack(side="left")
+        ttk.Button(buttons, text="Add to List", command=add, style="Accent.TButton").pack(side="right")
+        ttk.Button(buttons, text="Cancel", command=dialog.destroy).pack(side="right", padx=(0, 5))
+    
+    def add_batch(self, urls):
+        """List a batch of URLs like one playlist: videos at once, playlists page by page"""
+        valid = [url for url in urls if self.is_valid_youtube_url(url)]
+        if len(valid) < len(urls):
+            self.show_error(f"Skipped {len(urls) - len(valid)} URL(s) that are not YouTube URLs", log_only=True)
+        if not valid:
+            messagebox.showerror("Error", "Please enter valid YouTube URLs")
+            return
+        self.youtube_url.set("")
+        self.status_text.set(f"Adding {len(valid)} URLs...")
+        self.listing_cancel.set()
+        self.listing_cancel = threading.Event()
+        thread = threading.Thread(target=self.fetch_batch, args=(valid,))
+        thread.daemon = True
+        thread.start()
+    
+    def fetch_batch(self, urls):
+        """Add the videos of a batch without extracting them; the engine does that while downloading"""
+        cancel = self.listing_cancel
+        batch = {'title': f"Batch of {len(urls)} URLs", 'uploader': "Various", 'batch': True}
+        videos = [{'id': youtube_video_id(url), 'title': url} for url in urls if youtube_video_id(url)]
+        if videos:
+            self.event_bus.post_call(self.add_playlist_page, cancel, batch, videos)
+        for url in urls:
+            if cancel.is_set():
+                break
+            if youtube_video_id(url):
+                continue
+            def on_page(playlist, entries):
+                self.event_bus.post_call(self.add_playlist_page, cancel, batch, entries)
+            try:
+                self.engine.list_url(url, on_page=on_page, cancel_event=cancel)
+            except Exception as e:
+                self.event_bus.post_call(self.show_error, f"Error listing {url}: {e}", True)
+        self.event_bus.post_call(self.playlist_listed, cancel, batch)
+        self.event_bus.post_call(self.stop_listing_btn.pack_forget)
+    
     def is_valid_youtube_url(self, url):
         """Check if URL is a valid YouTube URL"""
-        try:
-            parsed = urlparse(url)
-            return 'youtube.com' in parsed.netloc or 'youtu.be' in parsed.netloc
-        except:
-            return False
+        return is_valid_youtube_url(url)
             
     def fetch_video_info(self, url):
-        """Fetch video/playlist information from YouTube"""
+        """Fetch video/playlist information from YouTube, showing playlist entries page by page"""
+        cancel = self.listing_cancel
         try:
             # Show loading message
-            self.root.after(0, lambda: self.loading_label.config(text="Fetching information... Please wait..."))
+            self.event_bus.post_call(self.loading_label.config, {'text': "Fetching information... Please wait..."})
             
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': True,  # Extract playlist info
-                'playlist_items': '1-50',  # Limit to first 50 videos for speed
-            }
+            def on_page(playlist, entries):
+                self.event_bus.post_call(self.add_playlist_page, cancel, playlist, entries)
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                # Update GUI in main thread
-                self.root.after(0, self.update_video_info, info)
+            info = self.engine.list_url(url, on_page=on_page, cancel_event=cancel)
+            
+            # Update GUI in main thread
+            if info.get('_type') == 'playlist':
+                self.event_bus.post_call(self.playlist_listed, cancel, info)
+            elif not cancel.is_set():
+                self.event_bus.post_call(self.update_video_info, info)
                 
         except Exception as e:
             tb = traceback.format_exc()
-            self.root.after(0, lambda: self.show_error(f"Error fetching video info: {str(e)}\n\n{tb}"))
+            self.event_bus.post_call(self.show_error, f"Error fetching video info: {str(e)}\n\n{tb}")
         finally:
-            self.root.after(0, lambda: self.download_btn.config(state="normal"))
-            self.root.after(0, lambda: self.loading_label.config(text=""))
+            self.event_bus.post_call(self.download_btn.config, {'state': "normal"})
+            self.event_bus.post_call(self.loading_label.config, {'text': ""})
+            self.event_bus.post_call(self.stop_listing_btn.pack_forget)
+    
+    def stop_listing(self):
+        """Stop listing the current playlist; the entries listed so far stay"""
+        self.listing_cancel.set()
+        self.status_text.set(f"Listing stopped: {len(self.selection)} videos")
             
-    def update_video_info(self, info):
-        """Update the video/playlist information display"""
-        for widget in self.info_scrollable_frame.winfo_children():
-            widget.destroy()
-        
-        self.playlist_videos = []
+    def clear_video_info(self):
+        self.info_label.config(text="", font=("Segoe UI", 10))
+        self.thumbnail_loader.cancel_all()
+        self.thumbnail_photos.clear()
+        self.video_formats = []
+        self.video_duration = None
+        self.selection.clear()
         self.selected_videos = []
-        self.video_checkboxes = []
-        
-        if info.get('_type') == 'playlist':
-            self.is_playlist = True
-            self.download_btn.config(text="Download Selected Videos")
-            
-            playlist_info = f"Playlist: {info.get('title', 'Unknown')}\n"
-            playlist_info += f"Videos: {len(info.get('entries', []))}\n"
-            playlist_info += f"Uploader: {info.get('uploader', 'Unknown')}\n\n"
-            playlist_info += "Select videos to download:"
-            
-            info_label = ttk.Label(self.info_scrollable_frame, text=playlist_info, font=("Segoe UI", 10, "bold"))
-            info_label.grid(row=0, column=0, columnspan=3, sticky=tk.W, pady=(0, 10))
-            
-            self.playlist_controls_frame.grid() # Show controls
-            
-            select_all_btn = ttk.Button(self.playlist_controls_frame, text="Select All", command=self.select_all)
-            select_all_btn.pack(side="left", padx=(0, 5))
-            
-            deselect_all_btn = ttk.Button(self.playlist_controls_frame, text="Deselect All", command=self.deselect_all)
-            deselect_all_btn.pack(side="left")
-            
-            # Add a separator
-            ttk.Separator(self.playlist_controls_frame, orient="horizontal").pack(fill="x", pady=5, expand=True)
-            
-            row = 1
-            for i, entry in enumerate(info.get('entries', [])):
-                if entry:
-                    video_frame = ttk.Frame(self.info_scrollable_frame)
-                    video_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=2, padx=2)
-                    video_frame.columnconfigure(2, weight=1)
-                    
-                    var = tk.BooleanVar(value=True)
-                    video_info = {
-                        'id': entry.get('id'),
-                        'title': entry.get('title', 'Unknown Title'),
-                        'duration': entry.get('duration'),
-                        'thumbnail': entry.get('thumbnail'),
-                        'checkbox_var': var,
-                        'thumb_btn': None, # Will be created below
-                        'video_frame': video_frame,
-                        'thumbnail_loaded': False,
-                        'thumbnail_label': None
-                    }
-                    checkbox = ttk.Checkbutton(video_frame, variable=var, command=lambda v=video_info, v_var=var: self.toggle_video_selection(v, v_var))
-                    checkbox.grid(row=0, column=0, padx=(0, 8))
-                    self.video_checkboxes.append(var)
-                    
-                    # Thumbnail icon (clickable)
-                    thumb_btn = ttk.Button(video_frame, text="🖼️", width=2, style="TButton")
-                    thumb_btn.grid(row=0, column=1, padx=(0, 8))
-                    video_info['thumb_btn'] = thumb_btn
-                    
-                    # Video title
-                    title = entry.get('title', 'Unknown Title')
-                    title_label = ttk.Label(video_frame, text=title, wraplength=400, font=("Segoe UI", 10))
-                    title_label.grid(row=0, column=2, sticky=tk.W)
-                    
-                    self.playlist_videos.append(video_info)
-                    self.selected_videos.append(video_info) # Initially select all
-                    
-                    # Bind click to load thumbnail for this video
-                    def make_thumb_loader(vidx):
-                        return lambda: self.load_single_thumbnail(vidx)
-                    thumb_btn.config(command=make_thumb_loader(i))
-                    
-                    row += 1
-            
-            self.status_text.set(f"Playlist loaded: {len(self.playlist_videos)} videos")
-            
+        self.playlist_view.reset()
+        self.playlist_header_shown = False
+    
+    def show_playlist_header(self, playlist):
+        """Reset the info panel for a playlist whose entries are about to arrive"""
+        self.clear_video_info()
+        self.is_playlist = True
+        self.download_btn.config(text="Download Selected Videos")
+        self.playlist_view.grid()
+        
+        self.info_label.config(font=("Segoe UI", 10, "bold"))
+        self.playlist_meta = playlist
+        self.playlist_header_shown = True
+        
+        self.playlist_controls_frame.grid() # Show controls
+        self.filter_frame.grid()
+        for widget in self.playlist_controls_frame.winfo_children():
+            if widget is not self.stop_listing_btn:
+                widget.destroy()
+        
+        select_all_btn = ttk.Button(self.playlist_controls_frame, text="Select All", command=self.select_all)
+        select_all_btn.pack(side="left", padx=(0, 5))
+        
+        deselect_all_btn = ttk.Button(self.playlist_controls_frame, text="Deselect All", command=self.deselect_all)
+        deselect_all_btn.pack(side="left")
+        
+        self.selection_label = ttk.Label(self.playlist_controls_frame, text="")
+        self.selection_label.pack(side="left", padx=(10, 0))
+        
+        auto_thumbs = ttk.Checkbutton(self.playlist_controls_frame, text="Load visible thumbnails", variable=self.auto_thumbnails,
+                                      command=self.playlist_view.refresh)
+        auto_thumbs.pack(side="left", padx=(10, 0))
+        self.update_playlist_header()
+    
+    def update_playlist_header(self, listing=True):
+        playlist = self.playlist_meta
+        playlist_info = f"Playlist: {playlist.get('title', 'Unknown')}\n"
+        count = len(self.selection)
+        if listing and playlist.get('playlist_count'):
+            playlist_info += f"Videos: {count} of {playlist['playlist_count']}\n"
         else:
-            # This is a single video
-            self.is_playlist = False
-            self.download_btn.config(text="Download Video")
-            
-            self.playlist_controls_frame.grid_remove() # Hide controls
-            
-            info_text = f"Title: {info.get('title', 'Unknown')}\n"
-            info_text += f"Duration: {self.format_duration(info.get('duration', 0))}\n"
-            info_text += f"Uploader: {info.get('uploader', 'Unknown')}\n"
-            info_text += f"Views: {info.get('view_count', 'Unknown'):,}\n"
-            info_text += f"Upload Date: {info.get('upload_date', 'Unknown')}\n"
-            
-            # Get available formats
-            formats = info.get('formats', [])
-            if formats:
-                info_text += f"\nAvailable formats: {len(formats)}"
-            
-            info_label = ttk.Label(self.info_scrollable_frame, text=info_text)
-            info_label.grid(row=0, column=0, sticky=tk.W)
+            playlist_info += f"Videos: {count}\n"
+        playlist_info += f"Uploader: {playlist.get('uploader', 'Unknown')}\n\n"
+        playlist_info += "Select videos to download:"
+        self.info_label.config(text=playlist_info)
+        self.selection_label.config(text=f"{self.selection.selected_count} of {count} selected")
+    
+    def add_playlist_page(self, cancel, playlist, entries):
+        """Append a page of listed playlist entries"""
+        if cancel is not self.listing_cancel:
+            return  # A page of a listing that was replaced by a newer one
+        if not self.playlist_header_shown:
+            self.show_playlist_header(playlist)
+            self.stop_listing_btn.pack(side="right")
+            if not self.is_downloading:
+                self.download_btn.config(state="normal")  # Listed entries can be downloaded already
+        self.playlist_view.append([self.make_playlist_item(entry) for entry in entries])
+        self.update_playlist_header()
+        self.loading_label.config(text=f"Listing playlist... {len(self.selection)} videos so far")
+    
+    def playlist_listed(self, cancel, playlist):
+        """Called once a playlist listing finished, was stopped or failed"""
+        if cancel is not self.listing_cancel:
+            return
+        if not self.playlist_header_shown:
+            self.show_playlist_header(playlist)  # An empty playlist
+        self.playlist_meta = playlist
+        self.update_playlist_header(listing=False)
+        if playlist.get('error'):
+            self.show_error(f"Listing stopped early: {playlist['error']}", log_only=True)
+            self.status_text.set(f"Playlist partly loaded: {len(self.selection)} videos")
+        elif not playlist.get('cancelled'):
+            self.status_text.set(f"Playlist loaded: {len(self.selection)} videos")
+    
+    def make_playlist_item(self, entry):
+        """Plain data for one playlist entry; the list view draws it when it scrolls into view"""
+        thumbnail = entry.get('thumbnail')
+        if not thumbnail and entry.get('thumbnails'):
+            thumbnail = entry['thumbnails'][-1].get('url')
+        return {
+            'id': entry.get('id'),
+            'title': entry.get('title', 'Unknown Title'),
+            'duration': entry.get('duration'),
+            'thumbnail': thumbnail,
+            'upload_date': entry.get('upload_date'),
+            'photo': None,
+            'thumbnail_loaded': False,
+        }
             
-            self.status_text.set("Video information loaded successfully")
+    def update_video_info(self, info):
+        """Update the video/playlist information display"""
+        if info.get('_type') == 'playlist':
+            self.show_playlist_header(info)
+            self.playlist_view.append([self.make_playlist_item(entry) for entry in info.get('entries', []) if entry])
+            self.update_playlist_header(listing=False)
+            self.status_text.set(f"Playlist loaded: {len(self.selection)} videos")
+            return
         
-        self.info_scrollable_frame.update_idletasks()
-        self.root.update_idletasks()
-        main_canvas.yview_moveto(0)
+        # This is a single video
+        self.clear_video_info()
+        self.is_playlist = False
+        self.download_btn.config(text="Download Video")
+        
+        self.playlist_view.grid_remove()
+        self.playlist_controls_frame.grid_remove() # Hide controls
+        self.filter_frame.grid_remove()
+        
+        info_text = f"Title: {info.get('title', 'Unknown')}\n"
+        info_text += f"Duration: {self.format_duration(info.get('duration', 0))}\n"
+        info_text += f"Uploader: {info.get('uploader', 'Unknown')}\n"
+        info_text += f"Views: {info.get('view_count', 'Unknown'):,}\n"
+        info_text += f"Upload Date: {info.get('upload_date', 'Unknown')}\n"
+        
+        # Get available formats
+        formats = info.get('formats', [])
+        if formats:
+            info_text += f"\nAvailable formats: {len(formats)}"
+        
+        self.video_formats = formats
+        self.video_duration = info.get('duration')
+        self.video_info_text = info_text
+        self.info_label.config(text=info_text)
+        self.show_format_plan()
+        
+        self.status_text.set("Video information loaded successfully")
+    
+    def show_format_plan(self):
+        """Show the formats the selected quality downloads for the current video, and their size"""
+        if self.is_playlist or not self.video_formats:
+            return
+        plan = self.engine.plan_formats(self.video_formats, self.selected_quality.get(), self.video_duration)
+        text = self.video_info_text
+        if plan is not None:
+            text += f"\nWill download: {describe_plan(plan)}"
+        self.info_label.config(text=text)
 
     def select_all(self):
-        for var in self.video_checkboxes:
-            var.set(True)
-        self.selected_videos = list(self.playlist_videos)
+        self.selection.select_all()
+        self.selection_changed()
 
     def deselect_all(self):
-        for var in self.video_checkboxes:
-            var.set(False)
-        self.selected_videos = []
-        
-    def toggle_video_selection(self, video, var):
-        if var.get():
-            self.selected_videos.append(video)
-        else:
-            self.selected_videos = [v for v in self.selected_videos if v['id'] != video['id']]
+        self.selection.deselect_all()
+        self.selection_changed()
+    
+    def select_matching(self, mode="replace"):
+        """Select the playlist entries matching the filter fields"""
+        criteria = {}
+        title = self.filter_title.get().strip()
+        if title:
+            criteria['title'] = title
+        try:
+            max_minutes = float(self.filter_max_minutes.get() or 0)
+        except ValueError:
+            messagebox.showerror("Error", "Maximum length must be a number of minutes")
+            return
+        if max_minutes > 0:
+            criteria['max_duration'] = max_minutes * 60
+        after = self.filter_after.get().strip().replace("-", "")
+        if after:
+            if not (len(after) == 8 and after.isdigit()):
+                messagebox.showerror("Error", "Upload date must look like YYYY-MM-DD")
+                return
+            criteria['uploaded_after'] = after
+        if self.filter_not_downloaded.get():
+            ids = [item.get('id') for item in self.selection.items]
+            criteria['exclude_ids'] = self.archive.downloaded_ids(ids, self.selected_quality.get())
+        try:
+            matched = self.selection.select_matching(mode, **criteria)
+        except re.error as e:
+            messagebox.showerror("Error", f"Invalid title pattern: {e}")
+            return
+        self.selection_changed()
+        self.status_text.set(f"{matched} videos match the filter")
+    
+    def selection_changed(self):
+        self.playlist_view.refresh()
+        self.selection_label.config(text=f"{self.selection.selected_count} of {len(self.selection)} selected")
 
     def format_duration(self, seconds):
         """Format duration in seconds to HH:MM:SS"""
@@ -590,8 +822,10 @@ class YouTubeDownloaderGUI:
         download_path = self.download_path.get().strip()
         quality = self.selected_quality.get()
         
+        batch = self.is_playlist and self.playlist_meta.get('batch')
+        
         # Validation
-        if not url:
+        if not url and not batch:
             messagebox.showerror("Error", "Please enter a YouTube URL")
             return
             
@@ -606,33 +840,43 @@ class YouTubeDownloaderGUI:
                 messagebox.showerror("Error", f"Cannot create download directory: {str(e)}")
                 return
                 
-        if not self.is_valid_youtube_url(url):
+        if not batch and not self.is_valid_youtube_url(url):
             messagebox.showerror("Error", "Please enter a valid YouTube URL")
             return
         
         if self.is_playlist:
             # Get selected videos
-            self.selected_videos = [video for video in self.playlist_videos if video['checkbox_var'].get()]
+            self.selected_videos = self.selection.selected_items()
             if not self.selected_videos:
                 messagebox.showerror("Error", "Please select at least one video to download")
                 return
         
+        # Persist the queue before anything is downloaded
+        if self.is_playlist:
+            items = [{'id': video['id'], 'title': video['title'], 'url': video_url(video['id'])}
+                     for video in self.selected_videos]
+        else:
+            items = [{'title': url, 'url': url}]
+        self.current_run_id = self.engine.create_run(url or self.playlist_meta['title'], download_path, quality,
+                                                     self.is_playlist, items)
+        
         # Reset download state
         self.is_downloading = True
         self.is_paused = False
         self.download_cancelled = False
-        self.retry_count = 0
         
         # Update UI
         self.download_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
+        self.pause_btn.config(state="normal")
         self.resume_btn.config(state="disabled")
         self.status_text.set("Starting download...")
         self.download_progress.set(0)
         self.overall_progress.set(0)
         
         # Run download in separate thread
-        self.download_thread = threading.Thread(target=self.download_video, args=(url, download_path, quality))
+        workers = self.max_workers.get() if self.is_playlist else 1
+        self.download_thread = threading.Thread(target=self.download_video, args=(workers,))
         self.download_thread.daemon = True
         self.download_thread.start()
         
@@ -643,12 +887,8 @@ class YouTubeDownloaderGUI:
             self.is_downloading = False
             self.is_paused = True
             
-            # Signal yt-dlp to stop
-            if self.ydl_instance:
-                try:
-                    self.ydl_instance.abort = True
-                except:
-                    pass
+            # Signal every running yt-dlp instance to stop
+            self.engine.cancel()
             
             self.status_text.set("Download stopped by user")
             self.overall_status.set("Download stopped")
@@ -656,11 +896,26 @@ class YouTubeDownloaderGUI:
             # Update UI
             self.download_btn.config(state="normal")
             self.stop_btn.config(state="disabled")
+            self.pause_btn.config(state="disabled")
+            self.resume_btn.config(state="normal")
+    
+    def pause_download(self):
+        """Pause the running downloads, keeping their connections open"""
+        if self.is_downloading and not self.engine.paused:
+            self.engine.pause()
+            self.status_text.set("Download paused")
+            self.pause_btn.config(state="disabled")
             self.resume_btn.config(state="normal")
     
     def resume_download(self):
-        """Resume the current download"""
-        if self.is_paused and not self.is_downloading:
+        """Resume paused downloads, or restart the current run from the first item that is not done yet"""
+        if self.is_downloading and self.engine.paused:
+            self.engine.resume()
+            self.status_text.set("Resuming download...")
+            self.pause_btn.config(state="normal")
+            self.resume_btn.config(state="disabled")
+            return
+        if self.is_paused and not self.is_downloading and self.current_run_id is not None:
             self.is_downloading = True
             self.is_paused = False
             self.download_cancelled = False
@@ -668,26 +923,49 @@ class YouTubeDownloaderGUI:
             # Update UI
             self.download_btn.config(state="disabled")
             self.stop_btn.config(state="normal")
+            self.pause_btn.config(state="normal")
             self.resume_btn.config(state="disabled")
             self.status_text.set("Resuming download...")
             
-            # Restart download thread
-            url = self.youtube_url.get().strip()
-            download_path = self.download_path.get().strip()
-            quality = self.selected_quality.get()
+            # Restart download thread; the engine uses the settings the run was started with
+            run = self.job_store.get_run(self.current_run_id)
+            self.is_playlist = bool(run['is_playlist'])
+            workers = self.max_workers.get() if self.is_playlist else 1
             
-            self.download_thread = threading.Thread(target=self.download_video, args=(url, download_path, quality))
+            self.download_thread = threading.Thread(target=self.download_video, args=(workers,))
             self.download_thread.daemon = True
             self.download_thread.start()
-        
-    def download_video(self, url, download_path, quality):
-        """Download the video(s) in a separate thread with error handling and retry logic"""
+    
+    def check_unfinished_run(self):
+        """Offer to continue a run that was interrupted by a crash or restart"""
+        run = self.job_store.latest_unfinished_run()
+        if not run or self.is_downloading:
+            return
+        counts = self.job_store.count_items(run['id'])
+        remaining = sum(counts.get(state, 0) for state in job_store.PENDING_STATES)
+        done = counts.get(job_store.DONE, 0)
+        resume = messagebox.askyesno(
+            "Resume Downloads",
+            f"An unfinished download was found:\n\n{run['url']}\n\n"
+            f"{done} item(s) done, {remaining} item(s) remaining.\n\n"
+            f"Do you want to continue it?"
+        )
+        if not resume:
+            self.job_store.finish_run(run['id'])
+            return
+        self.youtube_url.set(run['url'])
+        self.download_path.set(run['download_path'])
+        self.selected_quality.set(run['quality'])
+        self.current_run_id = run['id']
+        self.is_paused = True
+        self.resume_download()
+    
+    def download_video(self, workers):
+        """Run the current job store run on the engine in a separate thread"""
+        self.last_summary = None
         try:
-            if self.is_playlist:
-                self.download_playlist_with_retry(url, download_path, quality)
-            else:
-                self.download_single_video_with_retry(url, download_path, quality)
-                
+            self.last_summary = self.engine.run(self.current_run_id, workers)
+            self.event_bus.post_call(self.show_run_summary, self.last_summary)
         except DownloadCancelled:
             # User cancelled, do nothing. download_finished will be called.
             pass
@@ -696,274 +974,331 @@ class YouTubeDownloaderGUI:
             error_msg = f"Download failed: {str(e)}"
             if "Connection" in str(e) or "timeout" in str(e).lower():
                 error_msg += "\n\nNetwork error detected. Please check your internet connection and try again."
-            self.root.after(0, lambda: self.show_error(f"{error_msg}\n\n{tb}"))
+            self.event_bus.post_call(self.show_error, f"{error_msg}\n\n{tb}")
         finally:
-            self.root.after(0, self.download_finished)
+            self.event_bus.post_call(self.download_finished)
+    
+    def handle_engine_event(self, event):
+        """Receive an engine event on a worker thread; it is applied with the next frame"""
+        self.event_bus.post(event)
     
-    def download_single_video_with_retry(self, url, download_path, quality):
-        """Download a single video with retry logic for network errors"""
-        while self.retry_count < self.max_retries and not self.download_cancelled:
+    def pump_events(self):
+        """Apply everything workers posted since the last frame, then schedule the next frame"""
+        progressed = False
+        for event in self.event_bus.drain():
             try:
-                ydl_opts = self.get_ydl_options(download_path, quality)
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    self.ydl_instance = ydl
-                    ydl.download([url])
-                    break  # Success, exit retry loop
-            
-            except DownloadCancelled:
-                raise  # Re-raise to be caught by download_video
-
-            except Exception as e:
-                self.retry_count += 1
-                error_msg = str(e).lower()
-                
-                # Check if it's a network-related error
-                if any(keyword in error_msg for keyword in ['connection', 'timeout', 'network', 'unreachable', 'refused', 'reset', 'broken pipe']):
-                    if self.retry_count < self.max_retries and not self.download_cancelled:
-                        retry_msg = f"Network error. Retrying in {self.retry_delay} seconds... (Attempt {self.retry_count}/{self.max_retries})"
-                        self.root.after(0, lambda: self.status_text.set(retry_msg))
-                        self.root.after(0, lambda: self.overall_status.set(f"Network error detected. Retrying... ({self.retry_count}/{self.max_retries})"))
-                        
-                        # Wait before retry
-                        time.sleep(self.retry_delay)
-                        continue
-                    else:
-                        raise Exception(f"Network error after {self.max_retries} retries. Please check your internet connection and try again.")
+                if event['event'] == 'call':
+                    event['fn'](*event['args'])
                 else:
-                    # Non-network error, don't retry
-                    raise e
+                    progressed = self.apply_engine_event(event) or progressed
+            except Exception as e:
+                print(f"Failed to apply {event['event']} event: {e}")
+        if progressed and self.is_playlist:
+            self.update_overall_status()
+        self.root.after(1000 // UI_FRAME_RATE, self.pump_events)
     
-    def download_playlist_with_retry(self, url, download_path, quality):
-        """Download selected videos from playlist with retry logic"""
-        total_videos = len(self.selected_videos)
-        downloaded_videos = 0
-        failed_videos = []
-        
-        for i, video in enumerate(self.selected_videos):
-            if self.download_cancelled:
-                break
+    def apply_engine_event(self, event):
+        """Update the window from a download engine event.
+        
+        Returns True if the overall playlist status needs refreshing.
+        """
+        kind = event['event']
+        if kind == 'run_started':
+            self.build_slot_rows(event['workers'])
+            
+        elif kind == 'job_started':
+            self.update_slot_row(event, "Starting...", 0)
+            
+        elif kind == 'progress':
+            status = self.format_progress(event)
+            self.update_slot_row(event, status, event['percent'])
+            self.overall_progress.set(event['overall_percent'])
+            if not self.is_playlist:
+                self.download_progress.set(event['percent'])
+                self.status_text.set(f"Downloading: {status}")
+            return True
                 
-            # Update overall progress
-            overall_percent = (i / total_videos) * 100
-            self.root.after(0, lambda p=overall_percent: self.overall_progress.set(p))
-            self.root.after(0, lambda v=video: self.overall_status.set(f"Downloading: {v['title'][:50]}... ({i+1}/{total_videos})"))
+        elif kind == 'job_processing':
+            self.update_slot_row(event, "Processing...", 100)
+            self.overall_progress.set(event['overall_percent'])
+            if event.get('filename'):
+                self.last_downloaded_file = event['filename']
+            if not self.is_playlist:
+                self.status_text.set("Processing video...")
+                
+        elif kind == 'format_plan':
+            self.update_slot_row(event, f"Formats {event['description']}")
+            if not self.is_playlist:
+                self.status_text.set(f"Downloading {event['description']}")
             
-            # Download individual video with retry
-            video_url = f"https://www.youtube.com/watch?v={video['id']}"
-            self.retry_count = 0  # Reset retry count for each video
+        elif kind == 'disk_preflight':
+            if event['status'] == disk_space.SHORT:
+                self.show_disk_space_warning(event)
+            elif event['status'] == disk_space.UNKNOWN:
+                print("Size of the queue unknown; each video's disk space is checked when it starts")
+            
+        elif kind == 'job_deferred':
+            self.update_slot_row(event, "Left queued: not enough disk space")
+            self.show_error(f"{event['title']} left queued: {event['reason']}", log_only=True)
+            return True
+            
+        elif kind == 'job_postprocessing':
+            if not self.is_playlist:
+                self.status_text.set("Merging and converting...")
+            return True
             
-            video_success = False
-            while self.retry_count < self.max_retries and not self.download_cancelled:
-                try:
-                    ydl_opts = self.get_ydl_options(download_path, quality)
-                    
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        self.ydl_instance = ydl
-                        ydl.download([video_url])
-                        downloaded_videos += 1
-                        video_success = True
-                        break  # Success, move to next video
+        elif kind == 'retry':
+            label = ERROR_CLASS_LABELS.get(event['error_class'], "Error")
+            retry_msg = f"{label}. Retrying in {event['delay']:.0f} seconds... (Attempt {event['attempt']}/{event['max_retries']})"
+            self.update_slot_row(event, retry_msg)
+            if not self.is_playlist:
+                self.status_text.set(retry_msg)
+                self.overall_status.set(f"{label}. Retrying... ({event['attempt']}/{event['max_retries']})")
                 
-                except DownloadCancelled:
-                    raise # Re-raise to be caught by download_video
-
-                except Exception as e:
-                    self.retry_count += 1
-                    error_msg = str(e).lower()
-                    
-                    # Check if it's a network-related error
-                    if any(keyword in error_msg for keyword in ['connection', 'timeout', 'network', 'unreachable', 'refused', 'reset', 'broken pipe']):
-                        if self.retry_count < self.max_retries and not self.download_cancelled:
-                            retry_msg = f"Network error downloading {video['title'][:30]}... Retrying in {self.retry_delay} seconds... (Attempt {self.retry_count}/{self.max_retries})"
-                            self.root.after(0, lambda: self.status_text.set(retry_msg))
-                            time.sleep(self.retry_delay)
-                            continue
-                        else:
-                            failed_msg = f"Failed to download {video['title']} after {self.max_retries} retries due to network issues."
-                            self.root.after(0, lambda: self.show_error(failed_msg, log_only=True))
-                            failed_videos.append(video['title'])
-                            break
-                    else:
-                        # Non-network error, don't retry
-                        failed_msg = f"Failed to download {video['title']}: {str(e)}"
-                        self.root.after(0, lambda: self.show_error(failed_msg, log_only=True))
-                        failed_videos.append(video['title'])
-                        break
+        elif kind == 'network_wait':
+            self.update_slot_row(event, f"Network stalled. Waiting up to {event['delay']:.0f} seconds for it to recover...")
             
-            # If video failed and we're not cancelled, continue with next video
-            if not video_success and not self.download_cancelled:
-                continue
+        elif kind == 'network_health':
+            self.overall_status.set(self.format_network_health(event))
+            
+        elif kind == 'job_skipped':
+            if event.get('filename'):
+                self.last_downloaded_file = event['filename']
+            if not self.is_playlist:
+                self.download_progress.set(100)
+                self.status_text.set("Already downloaded, skipped")
+            return True
+            
+        elif kind == 'job_paused':
+            self.update_slot_row(event, "Paused")
+            
+        elif kind == 'run_paused':
+            self.overall_status.set("Paused")
+            
+        elif kind == 'run_resumed':
+            self.overall_status.set("Resumed")
+            return True
+            
+        elif kind == 'resume_fallback':
+            self.update_slot_row(event, "Link expired while paused, reconnecting...")
+                
+        elif kind == 'job_finished':
+            self.update_slot_row(event, "Done", 100)
+            if event.get('filename'):
+                self.last_downloaded_file = event['filename']
+            return True
+                
+        elif kind == 'job_failed':
+            self.update_slot_row(event, "Failed", 100)
+            if self.is_playlist:
+                self.show_error(f"Failed to download {event['title']}: {event['error']}", log_only=True)
+            return True
+                
+        elif kind == 'job_error':
+            self.status_text.set(f"Error: {event['error']}")
+            
+        elif kind == 'fragment_tuning':
+            print(f"{event.get('title', 'Download')}: using {event['concurrent_fragment_downloads']} fragments, "
+                  f"{event['http_chunk_size'] // (1024 * 1024)} MB chunks ({event['reason']})")
+            
+        elif kind == 'postprocess_priority_failed':
+            print(f"Could not lower post-processing priority: {event['error']}")
+            
+        elif kind == 'prefetch_failed':
+            print(f"Prefetch of {event['title']} failed, it is extracted when it starts: {event['error']}")
+        return False
+    
+    def show_disk_space_warning(self, event):
+        """Warn that the queue needs more space than the download folder has"""
+        gigabyte = 1024 ** 3
+        message = (f"These downloads need about {event['needed'] / gigabyte:.1f} GB, but only "
+                   f"{max(event['free'] - event['reserve'], 0) / gigabyte:.1f} GB are free in {event['path']}.\n\n")
+        if event['policy'] == disk_space.TRIM:
+            message += (f"Only the first {event['fits']} of {event['total']} videos will be downloaded now; the rest "
+                        f"stay queued and can be resumed once there is space.")
+        else:
+            message += "Videos that do not fit will be skipped as failed before they start."
+        if event['estimated']:
+            message += f"\n\nThe size of {event['estimated']} videos is estimated."
+        self.status_text.set("Not enough disk space for the whole queue")
+        messagebox.showwarning("Low Disk Space", message)
+    
+    def format_network_health(self, event):
+        """Describe a network_health event for the status line"""
+        state = event['state']
+        if state == network_health.STALLED:
+            return f"Network stalled: no data for {event['stalled_for']:.0f} seconds"
+        if state == network_health.DEGRADED:
+            usual = f" (usually {event['baseline'] / (1024 * 1024):.2f} MB/s)" if event.get('baseline') else ""
+            return f"Network slow: {event['throughput'] / (1024 * 1024):.2f} MB/s{usual}"
+        if state == network_health.RECOVERING:
+            return "Network recovering..."
+        return "Network OK"
+    
+    def format_progress(self, event):
+        """Format a progress event as 'percent (MB / MB) - speed'"""
+        mb_downloaded = event['downloaded_bytes'] / (1024 * 1024)
+        mb_total = event['total_bytes'] / (1024 * 1024)
+        status = f"{event['percent']:.1f}% ({mb_downloaded:.2f} MB / {mb_total:.2f} MB)"
+        if event.get('speed'):
+            status += f" - {event['speed'] / (1024 * 1024):.2f} MB/s"
+        return status
+    
+    def show_run_summary(self, summary):
+        """Report the outcome of a finished run"""
+        failed_videos = summary['failed']
+        if not self.is_playlist:
+            if failed_videos:
+                error_msg = f"Download failed: {failed_videos[0]['error']}"
+                if failed_videos[0]['error_class'] in (retry_policy.NETWORK, retry_policy.TIMEOUT, retry_policy.DNS):
+                    error_msg += "\n\nNetwork error detected. Please check your internet connection and try again."
+                self.show_error(error_msg)
+            return
         
         # Complete overall progress
-        if not self.download_cancelled:
-            self.root.after(0, lambda: self.overall_progress.set(100))
-            self.root.after(0, lambda: self.delete_btn.config(state="normal"))
+        self.overall_progress.set(100)
+        self.delete_btn.config(state="normal")
+        
+        downloaded_videos = summary['downloaded']
+        total_videos = summary['total']
+        if failed_videos:
+            self.overall_status.set(f"Downloaded {downloaded_videos}/{total_videos} videos. {len(failed_videos)} failed.")
             
-            # Show final status
-            if failed_videos:
-                status_msg = f"Downloaded {downloaded_videos}/{total_videos} videos. {len(failed_videos)} failed."
-                self.root.after(0, lambda: self.overall_status.set(status_msg))
-                
-                # Show detailed failure report
-                if len(failed_videos) > 0:
-                    failed_list = "\n".join([f"• {title}" for title in failed_videos[:5]])  # Show first 5
-                    if len(failed_videos) > 5:
-                        failed_list += f"\n• ... and {len(failed_videos) - 5} more"
-                    
-                    messagebox.showwarning(
-                        "Download Complete", 
-                        f"Download completed with some failures:\n\n"
-                        f"✅ Successfully downloaded: {downloaded_videos} videos\n"
-                        f"❌ Failed to download: {len(failed_videos)} videos\n\n"
-                        f"Failed videos:\n{failed_list}\n\n"
-                        f"Check the error log for details."
-                    )
-            else:
-                self.root.after(0, lambda: self.overall_status.set(f"All {downloaded_videos} videos downloaded successfully!"))
-                self.root.after(0, lambda: self.delete_btn.config(state="normal"))
+            # Show detailed failure report
+            failed_list = "\n".join([f"• {video['title']}" for video in failed_videos[:5]])  # Show first 5
+            if len(failed_videos) > 5:
+                failed_list += f"\n• ... and {len(failed_videos) - 5} more"
+            
+            messagebox.showwarning(
+                "Download Complete", 
+                f"Download completed with some failures:\n\n"
+                f"✅ Successfully downloaded: {downloaded_videos} videos\n"
+                f"❌ Failed to download: {len(failed_videos)} videos\n\n"
+                f"Failed videos:\n{failed_list}\n\n"
+                f"Check the error log for details."
+            )
+        elif summary['deferred']:
+            self.overall_status.set(f"Downloaded {downloaded_videos} videos. {len(summary['deferred'])} left queued "
+                                    f"for lack of disk space; resume them once there is space.")
+        elif summary['skipped']:
+            self.overall_status.set(f"Downloaded {downloaded_videos} videos, skipped {summary['skipped']} already downloaded.")
+        else:
+            self.overall_status.set(f"All {downloaded_videos} videos downloaded successfully!")
+    
+    def build_slot_rows(self, count):
+        """Create one progress row per worker slot"""
+        for widget in self.slots_frame.winfo_children():
+            widget.destroy()
+        self.slot_rows = []
+        for slot in range(count):
+            title_var = tk.StringVar(value=f"Slot {slot + 1}: idle")
+            status_var = tk.StringVar(value="")
+            progress_var = tk.DoubleVar(value=0)
+            ttk.Label(self.slots_frame, textvariable=title_var, width=40).grid(row=slot, column=0, sticky=tk.W, padx=(0, 8))
+            ttk.Progressbar(self.slots_frame, variable=progress_var, maximum=100, length=200).grid(row=slot, column=1, sticky=(tk.W, tk.E), padx=(0, 8))
+            ttk.Label(self.slots_frame, textvariable=status_var, width=28).grid(row=slot, column=2, sticky=tk.W)
+            self.slot_rows.append((title_var, progress_var, status_var))
+    
+    def update_slot_row(self, event, status, percent=None):
+        """Show the state of a job in its worker slot row"""
+        slot = event.get('slot')
+        if slot is None or slot >= len(self.slot_rows):
+            return
+        title_var, progress_var, status_var = self.slot_rows[slot]
+        title_var.set(f"Slot {slot + 1}: {event['title'][:40]}")
+        if percent is not None:
+            progress_var.set(percent)
+        status_var.set(status)
+    
+    def update_overall_status(self):
+        """Show how many playlist videos are done and how many are running"""
+        finished, active, total = self.engine.job_counts()
+        status = f"Completed {finished}/{total} videos ({active} active)"
+        rate = self.engine.items_per_minute()
+        if rate:
+            status += f" - {rate:.1f} videos/min"
+        self.overall_status.set(status)
     
     def download_finished(self):
         """Called when download is finished (success or failure)"""
         self.is_downloading = False
-        self.ydl_instance = None
         
         # Update UI
         self.download_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
+        self.pause_btn.config(state="disabled")
         self.resume_btn.config(state="disabled")
         
-        if not self.download_cancelled:
+        if self.download_cancelled:
+            self.status_text.set("Download was cancelled")
+            self.delete_btn.config(state="disabled")
+        elif self.last_summary is None or (self.last_summary['failed'] and not self.is_playlist):
+            self.status_text.set("Download failed")
+        else:
             self.download_progress.set(100)
             if not self.is_playlist:
                 self.delete_btn.config(state="normal")
 
             if self.is_playlist:
+                if self.last_summary['failed']:
+                    self.status_text.set("Finished with some failed videos")
+                    return
                 self.status_text.set("All selected videos downloaded successfully!")
             else:
                 self.status_text.set("Download completed successfully!")
             messagebox.showinfo("Success", "Download completed successfully!")
-        else:
-            self.status_text.set("Download was cancelled")
-            self.delete_btn.config(state="disabled")
-    
-    def get_ydl_options(self, download_path, quality):
-        """Get yt-dlp options based on quality selection with resume support"""
-        ydl_opts = {
-            'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-            'progress_hooks': [self.progress_hook],
-            'noplaylist': True,
-            'concurrent_fragment_downloads': 4,
-            'retries': 3,  # yt-dlp internal retries
-            'fragment_retries': 3,
-            'file_access_retries': 3,
-            'extractor_retries': 3,
-            'socket_timeout': 30,  # 30 seconds timeout
-            'http_chunk_size': 10485760,  # 10MB chunks for better resume support
-            'continue_dl': True,  # Continue partial downloads
-            'ignoreerrors': False,  # Don't ignore errors, handle them properly
-            'no_warnings': False,  # Show warnings for debugging
-        }
-        
-        if quality == "Audio Only (MP3)":
-            ydl_opts.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [
-                    {
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    },
-                    {
-                        'key': 'EmbedThumbnail',  # Embed thumbnail as album art
-                    },
-                    {
-                        'key': 'FFmpegMetadata',  # Ensure metadata is written
-                    }
-                ],
-                'writethumbnail': True,  # Download thumbnail
-                'embedthumbnail': True,  # Explicitly request embedding
-                'addmetadata': True,     # Add metadata
-            })
-        elif quality == "Best Quality":
-            ydl_opts['format'] = 'bestvideo+bestaudio/best'
-        elif quality == "1080p":
-            ydl_opts['format'] = 'bestvideo[height<=1080]+bestaudio/best[height<=1080]/best'
-        elif quality == "720p":
-            ydl_opts['format'] = 'bestvideo[height<=720]+bestaudio/best[height<=720]/best'
-        elif quality == "480p":
-            ydl_opts['format'] = 'bestvideo[height<=480]+bestaudio/best[height<=480]/best'
-        elif quality == "360p":
-            ydl_opts['format'] = 'bestvideo[height<=360]+bestaudio/best[height<=360]/best'
-        else:
-            ydl_opts['format'] = 'bestvideo+bestaudio/best'
-        
-        return ydl_opts
-            
-    def progress_hook(self, d):
-        """Progress hook for yt-dlp with enhanced error handling"""
-        if self.download_cancelled:
-            raise DownloadCancelled("Download cancelled by user.")
-            
-        if d['status'] == 'downloading':
-            # Update progress bar
-            percent = 0
-            mb_downloaded = 0
-            mb_total = 0
-            if 'total_bytes' in d and d['total_bytes']:
-                percent = (d['downloaded_bytes'] / d['total_bytes']) * 100
-                mb_downloaded = d['downloaded_bytes'] / (1024 * 1024)
-                mb_total = d['total_bytes'] / (1024 * 1024)
-                self.root.after(0, lambda: self.download_progress.set(percent))
-            else:
-                # Fallback for unknown total size
-                if 'downloaded_bytes' in d:
-                    mb_downloaded = d['downloaded_bytes'] / (1024 * 1024)
-            
-            # Update status with speed information
-            speed = d.get('speed', 0)
-            if speed:
-                speed_mb = speed / (1024 * 1024)
-                status = f"Downloading: {percent:.1f}% ({mb_downloaded:.2f} MB / {mb_total:.2f} MB) - {speed_mb:.2f} MB/s"
-            else:
-                status = f"Downloading: {percent:.1f}% ({mb_downloaded:.2f} MB / {mb_total:.2f} MB)"
-            
-            self.root.after(0, lambda: self.status_text.set(status))
-            
-        elif d['status'] == 'finished':
-            self.root.after(0, lambda: self.status_text.set("Processing video..."))
-            if 'filename' in d:
-                self.last_downloaded_file = d['filename']
-
-        elif d['status'] == 'error':
-            error_msg = d.get('error', 'Unknown error')
-            self.root.after(0, lambda: self.status_text.set(f"Error: {error_msg}"))
-            
-        elif d['status'] == 'resuming':
-            self.root.after(0, lambda: self.status_text.set("Resuming download..."))
 
     def load_single_thumbnail(self, idx):
-        """Load thumbnail for a single video by index"""
-        video = self.playlist_videos[idx]
+        """Queue the thumbnail of one video by index; it shows up once loaded"""
+        video = self.selection.items[idx]
         if video['thumbnail_loaded']:
             return  # Already loaded
-        thumb_url = video.get('thumbnail', '')
-        if not thumb_url:
+        self.thumbnail_loader.request(self.selection.keys[idx], video.get('thumbnail'), video.get('id'))
+    
+    def prefetch_thumbnails(self, first, end, margin=10):
+        """Load the thumbnails of the rows in view and just around them; drop requests for rows scrolled away"""
+        if not self.auto_thumbnails.get():
             return
-        try:
-            response = requests.get(thumb_url, timeout=5)
-            img = Image.open(BytesIO(response.content))
-            img = img.resize((80, 45), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
-            # Remove button and show image
-            video['thumb_btn'].destroy()
-            thumb_label = ttk.Label(video['video_frame'], image=photo)
-            thumb_label.image = photo
-            thumb_label.grid(row=0, column=1, padx=(0, 8))
-            video['thumbnail_label'] = thumb_label
-            video['thumbnail_loaded'] = True
-        except Exception as e:
-            print(f"Failed to load thumbnail for {video['title']}: {e}")
+        start = max(first - margin, 0)
+        keys = self.selection.keys[start:end + margin]
+        for key, video in zip(keys, self.selection.items[start:end + margin]):
+            if not video['thumbnail_loaded']:
+                self.thumbnail_loader.request(key, video.get('thumbnail'), video.get('id'))
+        self.thumbnail_loader.cancel_except(keys)
+    
+    def thumbnail_ready(self, key, image):
+        """Called on a loader thread with a decoded thumbnail"""
+        self.event_bus.post_call(self.show_thumbnail, key, image)
+    
+    def thumbnail_failed(self, key, error):
+        """Called on a loader thread when a thumbnail cannot be fetched or decoded"""
+        print(f"Failed to load thumbnail {key}: {error}")
+    
+    def thumbnail_cache_error(self, video_id, error):
+        """Called on a loader or download thread when a cached thumbnail is unreadable"""
+        print(f"Dropping unreadable cached thumbnail of {video_id}: {error}")
+    
+    def show_thumbnail(self, key, image):
+        position = self.selection.positions.get(key)
+        if position is None:
+            return  # The playlist was replaced meanwhile
+        video = self.selection.items[position]
+        # The list view shows the image in place of the button
+        video['photo'] = ImageTk.PhotoImage(image)
+        video['thumbnail_loaded'] = True
+        self.playlist_view.refresh_item(position)
+        # Only the most recently shown rows keep their PhotoImage; the others
+        # fall back to the placeholder and come back from the thumbnail cache
+        self.thumbnail_photos[key] = video['photo']
+        self.thumbnail_photos.move_to_end(key)
+        while len(self.thumbnail_photos) > MAX_THUMBNAIL_PHOTOS:
+            old_key, _ = self.thumbnail_photos.popitem(last=False)
+            old_position = self.selection.positions.get(old_key)
+            if old_position is not None:
+                old_video = self.selection.items[old_position]
+                old_video['photo'] = None
+                old_video['thumbnail_loaded'] = False
+                self.playlist_view.refresh_item(old_position)
 
     def show_error(self, message, log_only=False):
         """Show error message"""
@@ -977,18 +1312,10 @@ class YouTubeDownloaderGUI:
 
     def check_network_connectivity(self):
         """Check if internet connection is available"""
-        def check_connection():
-            try:
-                # Try to connect to Google's DNS server
-                socket.create_connection(("8.8.8.8", 53), timeout=3)
-                return True
-            except OSError:
-                return False
-        
         # Run in background thread to avoid blocking UI
         def check_async():
-            if not check_connection():
-                self.root.after(0, lambda: self.show_network_warning())
+            if not self.connectivity.check()['online']:
+                self.event_bus.post_call(self.show_network_warning)
         
         thread = threading.Thread(target=check_async)
         thread.daemon = True
@@ -1014,33 +1341,20 @@ class YouTubeDownloaderGUI:
     def test_network_connection(self):
         """Test network connection and show result"""
         def test_connection():
-            try:
-                # Test multiple endpoints
-                endpoints = [
-                    ("8.8.8.8", 53),  # Google DNS
-                    ("1.1.1.1", 53),  # Cloudflare DNS
-                    ("www.google.com", 80),  # Google
-                    ("www.youtube.com", 80)  # YouTube
-                ]
-                
-                for host, port in endpoints:
-                    try:
-                        socket.create_connection((host, port), timeout=5)
-                        return True, f"Connected to {host}"
-                    except:
-                        continue
-                
+            result = self.connectivity.check(force=True)
+            if not result['online']:
                 return False, "No internet connection"
-                
-            except Exception as e:
-                return False, f"Connection test failed: {str(e)}"
+            # Round trip of every endpoint that answered, fastest first
+            answered = sorted((rtt, endpoint) for endpoint, rtt in result['rtts'].items() if rtt is not None)
+            timings = "\n".join(f"{endpoint}: {rtt * 1000:.0f} ms" for rtt, endpoint in answered)
+            return True, f"Connected to {result['endpoint']}\n\n{timings}"
         
         # Show testing message
         self.status_text.set("Testing network connection...")
         
         def test_async():
             success, message = test_connection()
-            self.root.after(0, lambda: self.show_connection_result(success, message))
+            self.event_bus.post_call(self.show_connection_result, success, message)
         
         thread = threading.Thread(target=test_async)
         thread.daemon = True
@@ -1055,27 +1369,60 @@ class YouTubeDownloaderGUI:
             self.status_text.set("Network connection failed")
             messagebox.showerror("Network Test", f"❌ {message}\n\nPlease check your internet connection and try again.")
 
-    def save_last_location(self, show_message=True):
-        """Save the last download location to a config file"""
-        last_location = self.download_path.get()
-        config = {
-            "last_location": last_location
-        }
+    def read_config(self):
+        """Read config.json, or an empty config if there is none"""
+        try:
+            with open("config.json", "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def write_config(self, **updates):
+        """Update some keys of config.json, keeping the others"""
+        config = self.read_config()
+        config.update(updates)
         with open("config.json", "w") as f:
             json.dump(config, f)
+
+    def save_last_location(self, show_message=True):
+        """Save the last download location to a config file"""
+        self.write_config(last_location=self.download_path.get())
         if show_message:
             messagebox.showinfo("Success", "Last download location saved successfully.")
 
     def load_last_location(self):
-        """Load the last download location from a config file"""
+        """Load the last download location and bandwidth settings from a config file"""
+        config = self.read_config()
+        last_location = config.get("last_location", "")
+        if last_location:
+            self.download_path.set(last_location)
+        # Optional time-of-day caps, e.g. "09:00-18:00=1M,18:00-23:00=8M"
         try:
-            with open("config.json", "r") as f:
-                config = json.load(f)
-                last_location = config.get("last_location", "")
-                if last_location:
-                    self.download_path.set(last_location)
-        except FileNotFoundError:
-            pass
+            self.engine.bandwidth.set_schedule(parse_schedule(config.get("bandwidth_schedule", "")))
+        except ValueError:
+            self.show_error("Invalid bandwidth_schedule in config.json", log_only=True)
+        self.speed_limit.set(config.get("speed_limit_mbps", 0))
+        # Optional hosts for the network check, e.g. ["192.168.1.1:53", "www.youtube.com:443"]
+        try:
+            if config.get("connectivity_endpoints"):
+                self.connectivity.set_endpoints(parse_endpoints(config["connectivity_endpoints"]))
+        except ValueError:
+            self.show_error("Invalid connectivity_endpoints in config.json", log_only=True)
+        # What to do when a queue may not fit on the disk: "warn", "trim" or "off"
+        policy = config.get("disk_space_policy", disk_space.WARN)
+        if policy in disk_space.POLICIES:
+            self.engine.disk_policy = policy
+        else:
+            self.show_error("Invalid disk_space_policy in config.json", log_only=True)
+
+    def apply_speed_limit(self):
+        """Apply the speed limit box to running and future downloads"""
+        try:
+            limit_mbps = self.speed_limit.get()
+        except tk.TclError:
+            return  # Half-typed value
+        self.engine.bandwidth.set_limit(parse_rate(f"{max(limit_mbps, 0)}M"))
+        self.write_config(speed_limit_mbps=limit_mbps)
 
     def delete_file(self):
         if not self.last_downloaded_file or not os.path.exists(self.last_downloaded_file):
@@ -1084,6 +1431,8 @@ class YouTubeDownloaderGUI:
 
         try:
             os.remove(self.last_downloaded_file)
+            # Other folders may still link the same stored video; the store keeps it until none do
+            self.content_store.release(self.last_downloaded_file)
             messagebox.showinfo("Success", f"File '{os.path.basename(self.last_downloaded_file)}' deleted successfully.")
             self.status_text.set("File deleted.")
             self.delete_btn.config(state="disabled")
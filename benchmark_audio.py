@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark the audio-only modes
+Measures the ffmpeg CPU time of MP3 transcoding and of the M4A/Opus stream
+copy, per hour of audio, and how much faster MP3 transcoding gets when the
+post-processing pool runs one conversion per core.
+
+Usage: python benchmark_audio.py [audio files...] [--minutes 10]
+Without files, AAC and Opus test signals are generated with ffmpeg
+(ffprobe is only needed to read the length and codec of given files).
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows: fall back to wall time
+    resource = None
+
+
+def child_cpu_time():
+    """CPU seconds used by finished child processes so far"""
+    if resource is None:
+        return time.perf_counter()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args], check=True)
+
+
+def duration(path):
+    """Length of a media file in seconds, from ffprobe"""
+    result = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration",
+                             "-of", "default=noprint_wrappers=1:nokey=1", path],
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip())
+
+
+def audio_codec(path):
+    """Codec name of the first audio stream, from ffprobe"""
+    result = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries", "stream=codec_name",
+                             "-of", "default=noprint_wrappers=1:nokey=1", path],
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def make_sources(folder, minutes):
+    """AAC and Opus files like the ones YouTube serves, from a tone over pink noise.
+
+    Returns (path, seconds, codec) tuples.
+    """
+    signal = f"sine=frequency=440:duration={minutes * 60}"
+    noise = f"anoisesrc=color=pink:amplitude=0.2:duration={minutes * 60}"
+    sources = []
+    for name, codec, args in (("source.m4a", "aac", ["-c:a", "aac", "-b:a", "128k"]),
+                              ("source.webm", "opus", ["-c:a", "libopus", "-b:a", "128k"])):
+        path = os.path.join(folder, name)
+        print(f"Generating {minutes} minutes of test audio: {name}")
+        ffmpeg("-f", "lavfi", "-i", signal, "-f", "lavfi", "-i", noise,
+               "-filter_complex", "amix=inputs=2", "-ac", "2", *args, path)
+        sources.append((path, minutes * 60, codec))
+    return sources
+
+
+def measure(label, source, output, args, hours):
+    """Run one conversion and print its CPU seconds per hour of audio"""
+    started = child_cpu_time()
+    ffmpeg("-i", source, "-vn", *args, output)
+    cpu = child_cpu_time() - started
+    per_hour = cpu / hours
+    print(f"  {label:<28} {per_hour:8.1f} CPU s per hour of audio")
+    return per_hour
+
+
+def benchmark_file(source, folder, seconds=None, codec=None):
+    hours = (seconds or duration(source)) / 3600
+    base = os.path.join(folder, os.path.splitext(os.path.basename(source))[0])
+    print(f"\n{os.path.basename(source)} ({hours * 60:.1f} minutes)")
+    mp3 = measure("MP3 192k (transcode)", source, base + ".mp3", ["-acodec", "libmp3lame", "-b:a", "192k"], hours)
+    codec = codec or audio_codec(source)
+    if codec == "aac":
+        copy = measure("M4A (stream copy)", source, base + ".copy.m4a", ["-acodec", "copy"], hours)
+    elif codec == "opus":
+        copy = measure("Opus (stream copy)", source, base + ".opus", ["-acodec", "copy"], hours)
+    else:
+        print(f"  No stream copy mode for {codec} audio")
+        return
+    print(f"  Saved: {mp3 - copy:.1f} CPU s per hour of audio ({mp3 / max(copy, 1e-3):.0f}x less work)")
+
+
+def benchmark_parallel(source, folder):
+    """Wall time of one MP3 transcode per core, one after the other and all at once"""
+    workers = os.cpu_count() or 1
+    outputs = [os.path.join(folder, f"parallel{i}.mp3") for i in range(workers)]
+
+    def transcode(output):
+        ffmpeg("-i", source, "-vn", "-acodec", "libmp3lame", "-b:a", "192k", output)
+
+    print(f"\nMP3 transcoding of {workers} files ({workers} CPU cores)")
+    started = time.perf_counter()
+    for output in outputs:
+        transcode(output)
+    serial = time.perf_counter() - started
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(transcode, outputs))
+    parallel = time.perf_counter() - started
+    print(f"  One after the other: {serial:.1f} s")
+    print(f"  Post-processing pool: {parallel:.1f} s ({serial / max(parallel, 1e-3):.1f}x faster)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the audio-only download modes")
+    parser.add_argument("files", nargs="*", help="audio files to convert (default: generated test signals)")
+    parser.add_argument("--minutes", type=float, default=10, help="length of the generated test signals (default: 10)")
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg") or (args.files and not shutil.which("ffprobe")):
+        print("❌ ffmpeg (and ffprobe, for given files) is needed for the benchmark")
+        return 1
+    with tempfile.TemporaryDirectory() as folder:
+        sources = [(path, None, None) for path in args.files] or make_sources(folder, args.minutes)
+        for source, seconds, codec in sources:
+            benchmark_file(source, folder, seconds, codec)
+        benchmark_parallel(sources[0][0], folder)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
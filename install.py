@@ -206,6 +206,7 @@ The installer will now install the required Python packages:
 • yt-dlp (YouTube downloader)
 • Pillow (Image processing)
 • requests (HTTP requests)
+• mutagen (album art in M4A and Opus files)
 
 Click Next to install these dependencies."""
         
@@ -234,7 +235,7 @@ Click Next to install these dependencies."""
     def _install_deps(self):
         try:
             # Install dependencies
-            subprocess.run([sys.executable, '-m', 'pip', 'install', 'yt-dlp', 'Pillow', 'requests'], 
+            subprocess.run([sys.executable, '-m', 'pip', 'install', 'yt-dlp', 'Pillow', 'requests', 'mutagen'], 
                          check=True, capture_output=True)
             self.root.after(0, lambda: self.show_install_success("Python dependencies installed successfully!"))
         except subprocess.CalledProcessError as e:
@@ -10,6 +10,37 @@ import os
 # Add the YouDownload directory to the path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'YouDownload'))
 
+import contextlib
+import functools
+import threading
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Static file handler for local stand-in servers that does not log requests"""
+    def log_message(self, format, *args):
+        pass
+
+class CountingHandler(QuietHandler):
+    """QuietHandler that appends the path of every GET to its requests_seen list"""
+    def __init__(self, *args, requests_seen, **kwargs):
+        self.requests_seen = requests_seen
+        super().__init__(*args, **kwargs)
+    
+    def do_GET(self):
+        self.requests_seen.append(self.path)
+        super().do_GET()
+
+@contextlib.contextmanager
+def serve(directory, handler=QuietHandler, **handler_args):
+    """Serve the files of directory on a local stand-in server; yields its base URL"""
+    server = HTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=directory, **handler_args))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
 def test_network_connectivity():
     """Test the network connectivity checker"""
     print("Testing network connectivity...")
@@ -71,6 +102,1404 @@ def test_error_handling():
         except:
             pass
 
+def test_user_data_dir():
+    """Test that the app keeps its stores in a per-user folder instead of the working directory"""
+    print("Testing user data folder...")
+    
+    import sys
+    import tempfile
+    from unittest import mock
+    from youtube_downloader_gui import user_data_dir
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        if os.name == "nt":
+            with mock.patch.dict(os.environ, {'LOCALAPPDATA': tmp}):
+                assert user_data_dir() == os.path.join(tmp, "YouDownload")
+        elif sys.platform != "darwin":
+            with mock.patch.dict(os.environ, {'XDG_DATA_HOME': tmp}):
+                assert user_data_dir() == os.path.join(tmp, "YouDownload")
+        assert os.path.isabs(user_data_dir())
+    
+    print("✅ User data folder test passed")
+
+def test_overall_progress():
+    """Test that overall progress is weighted by the bytes of each job"""
+    print("Testing bytes-weighted overall progress...")
+    
+    import tempfile
+    from download_engine import DownloadEngine, DownloadJob
+    from job_store import JobStore
+    
+    MB = 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = DownloadEngine(store=JobStore(os.path.join(tmp, "downloads.db")), quiet=True)
+        assert engine.overall_fraction() == 0.0
+        
+        small = DownloadJob({'id': 'small'}, "https://youtu.be/small", 0)
+        large = DownloadJob({'id': 'large'}, "https://youtu.be/large", 1)
+        small.status = 'finished'
+        small.streams['18'] = [10 * MB, 10 * MB]
+        large.status = 'downloading'
+        large.streams['137'] = [0, 80 * MB]
+        large.streams['140'] = [10 * MB, 10 * MB]
+        engine.jobs = [small, large]
+        # 20 of 100 MB, not the 1 of 2 videos (50%) a per-video count would show
+        assert abs(engine.overall_fraction() - 0.2) < 1e-9
+        
+        # A job whose size is not known yet weighs as much as an average known one
+        engine.jobs.append(DownloadJob({'id': 'unknown'}, "https://youtu.be/unknown", 2))
+        assert abs(engine.overall_fraction() - 20 / 150) < 1e-9
+        engine.job_store.close()
+    
+    print("✅ Overall progress test passed")
+
+def test_session_reuse():
+    """Test that a worker's session keeps its YoutubeDL across jobs and rebuilds it only for new options"""
+    print("Testing download session reuse...")
+    
+    import tempfile
+    from download_engine import DownloadEngine
+    from job_store import JobStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = DownloadEngine(store=JobStore(os.path.join(tmp, "downloads.db")), quiet=True)
+        session = engine.create_session()
+        first = session.get_ydl(tmp, "720p")
+        # Every job of the same run gets the same instance, with its warm caches and connections
+        assert session.get_ydl(tmp, "720p") is first
+        assert session.get_ydl(tmp, "720p") is first
+        
+        # A new quality or folder needs new options, so the instance is rebuilt
+        second = session.get_ydl(tmp, "1080p")
+        assert second is not first and session.get_ydl(tmp, "1080p") is second
+        third = session.get_ydl(os.path.join(tmp, "other"), "1080p")
+        assert third is not second
+        
+        session.close()
+        assert session.ydl is None and session.get_ydl(tmp, "720p") is not first
+        session.close()
+        engine.job_store.close()
+    
+    print("✅ Session reuse test passed")
+
+def test_job_store():
+    """Test that an interrupted run resumes from its first unfinished item"""
+    print("Testing persistent job store...")
+    
+    import tempfile
+    import job_store
+    from job_store import JobStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(os.path.join(tmp, "downloads.db"))
+        items = [{'id': f"vid{i}", 'title': f"Video {i}", 'url': f"https://www.youtube.com/watch?v=vid{i}"} for i in range(3)]
+        run_id = store.create_run("https://www.youtube.com/playlist?list=PL", tmp, "720p", True, items)
+        store.set_state(run_id, 0, job_store.DONE, filename="Video 0.mp4")
+        store.update_progress(run_id, 1, 1024, 4096)
+        store.close()
+        
+        # Reopen as if the app had crashed and restarted
+        store = JobStore(os.path.join(tmp, "downloads.db"))
+        assert store.latest_unfinished_run()['id'] == run_id
+        pending = store.pending_items(run_id)
+        assert [item['position'] for item in pending] == [1, 2]
+        assert pending[0]['state'] == job_store.DOWNLOADING
+        assert pending[0]['downloaded_bytes'] == 1024
+        
+        store.finish_run(run_id)
+        assert store.latest_unfinished_run() is None
+        store.close()
+    
+    print("✅ Job store test passed")
+
+def test_engine_headless_download():
+    """Test that the engine downloads a run without any Tk window"""
+    print("Testing headless download engine...")
+    
+    import tempfile
+    from download_engine import DownloadEngine
+    from job_store import JobStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = os.path.join(tmp, "media")
+        out_dir = os.path.join(tmp, "out")
+        os.makedirs(media_dir)
+        for name in ("clip1.mp4", "clip2.mp4"):
+            with open(os.path.join(media_dir, name), "wb") as f:
+                f.write(os.urandom(256 * 1024))
+        
+        # Serve the clips from a local stand-in server
+        with serve(media_dir) as base:
+            events = []
+            engine = DownloadEngine(on_event=events.append, store=JobStore(os.path.join(tmp, "downloads.db")), quiet=True)
+            items = [{'id': name, 'title': name, 'url': f"{base}/{name}.mp4"} for name in ("clip1", "clip2")]
+            run_id = engine.create_run(base, out_dir, "Best Quality", True, items)
+            summary = engine.run(run_id, max_workers=2)
+        engine.job_store.close()
+        
+        assert summary['downloaded'] == 2 and not summary['failed']
+        assert sorted(os.listdir(out_dir)) == ["clip1.mp4", "clip2.mp4"]
+        kinds = [event['event'] for event in events]
+        assert kinds[0] == 'run_started' and kinds[-1] == 'run_finished'
+        assert kinds.count('job_finished') == 2
+    
+    print("✅ Headless engine test passed")
+
+def test_event_bus_coalescing():
+    """Test that the event bus keeps only the latest progress per job, in order"""
+    print("Testing event bus coalescing...")
+    
+    from event_bus import EventBus
+    
+    bus = EventBus()
+    bus.post({'event': 'job_started', 'position': 0})
+    for percent in range(100):
+        bus.post({'event': 'progress', 'position': 0, 'percent': percent})
+        bus.post({'event': 'progress', 'position': 1, 'percent': percent})
+    bus.post({'event': 'job_finished', 'position': 0})
+    bus.post({'event': 'progress', 'position': 0, 'percent': 100})
+    
+    events = bus.drain()
+    assert [(e['event'], e['position'], e.get('percent')) for e in events] == [
+        ('job_started', 0, None),
+        ('progress', 0, 99),
+        ('progress', 1, 99),
+        ('job_finished', 0, None),
+        ('progress', 0, 100),
+    ]
+    assert bus.drain() == []
+    assert bus.posted == 203 and bus.delivered == 5
+    
+    print("✅ Event bus test passed")
+
+def test_bandwidth_shares():
+    """Test that the global cap is split by weight and follows runtime changes"""
+    print("Testing bandwidth limiter...")
+    
+    from bandwidth import BandwidthLimiter, parse_rate
+    
+    class FakeYdl:
+        def __init__(self):
+            self.params = {}
+    
+    limiter = BandwidthLimiter(parse_rate("3M"))
+    first, second = FakeYdl(), FakeYdl()
+    limiter.register("a", first)
+    assert first.params['ratelimit'] == 3 * 1024 * 1024
+    limiter.register("b", second, weight=2)
+    assert first.params['ratelimit'] == 1024 * 1024
+    assert second.params['ratelimit'] == 2 * 1024 * 1024
+    
+    limiter.set_limit(parse_rate("6M"))
+    assert second.params['ratelimit'] == 4 * 1024 * 1024
+    limiter.unregister("b")
+    assert first.params['ratelimit'] == 6 * 1024 * 1024 and second.params['ratelimit'] is None
+    limiter.set_limit(None)
+    assert first.params['ratelimit'] is None
+    
+    # Fragment threads each throttle to the whole share, so a capped job fetches one fragment at a time
+    tuned = FakeYdl()
+    tuned.params['concurrent_fragment_downloads'] = 8
+    limiter.register("c", tuned)
+    assert tuned.params['concurrent_fragment_downloads'] == 8
+    limiter.set_limit(parse_rate("2M"))
+    assert tuned.params['concurrent_fragment_downloads'] == 1
+    limiter.set_fragments("c", 16)
+    assert tuned.params['concurrent_fragment_downloads'] == 1
+    limiter.unregister("c")
+    assert tuned.params['concurrent_fragment_downloads'] == 16 and tuned.params['ratelimit'] is None
+    
+    # The per-job floor never lifts the shares above a small cap
+    limiter = BandwidthLimiter(3000)
+    ydls = [FakeYdl() for _ in range(3)]
+    for key, (ydl, weight) in enumerate(zip(ydls, (0.01, 1, 1))):
+        limiter.register(key, ydl, weight)
+    assert [ydl.params['ratelimit'] for ydl in ydls] == [1000, 1000, 1000]
+    limiter.set_limit(100 * 1024)
+    rates = [ydl.params['ratelimit'] for ydl in ydls]
+    assert rates[0] == 1024 and rates[1] == rates[2] and sum(rates) <= 100 * 1024
+
+    print("✅ Bandwidth limiter test passed")
+
+def test_fragment_controller():
+    """Test that fragment parallelism grows on clean links and backs off on retries"""
+    print("Testing adaptive fragment controller...")
+    
+    from fragment_controller import FragmentController, MIB
+    
+    def stream(controller, throughput, errors=0, fragments=100):
+        controller.fragmented = True
+        controller.fragments_done = fragments
+        controller.stream_bytes = throughput * 10
+        controller.errors = errors
+        decision = controller.finish_stream(10)
+        controller.reset_stream()
+        return decision
+    
+    controller = FragmentController(fragments=4, chunk_size=10 * MIB)
+    assert stream(controller, 2 * MIB)['concurrent_fragment_downloads'] == 8
+    assert stream(controller, 4 * MIB)['concurrent_fragment_downloads'] == 16
+    # No gain from 16 fragments: fall back to 8 and stay there
+    decision = stream(controller, 4 * MIB)
+    assert decision['reason'] == "plateau" and controller.fragments == 8
+    stream(controller, 4 * MIB)
+    assert controller.fragments == 8
+    
+    # A flaky stream halves fragments and chunk size
+    chunk = controller.chunk_size
+    decision = stream(controller, MIB, errors=20)
+    assert decision['reason'] == "retries"
+    assert controller.fragments == 4 and controller.chunk_size == chunk // 2
+    
+    # yt-dlp's fragment threads report progress and retries at the same time
+    import threading
+    controller = FragmentController()
+    controller.observe({'status': 'downloading', 'tmpfilename': "video.part", 'downloaded_bytes': 0})
+    
+    def fragment_thread(index):
+        for step in range(1000):
+            controller.record_error()
+            controller.observe({'status': 'downloading', 'tmpfilename': "video.part", 'downloaded_bytes': step * 1024,
+                                'fragment_count': 8000, 'fragment_index': index * 1000 + step})
+    
+    threads = [threading.Thread(target=fragment_thread, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert controller.errors == 8000 and controller.fragments_done == 7999
+    
+    print("✅ Fragment controller test passed")
+
+def test_retry_policy():
+    """Test error classification, backoff and that Stop interrupts retry waits"""
+    print("Testing retry policy...")
+    
+    import tempfile
+    import threading
+    import time
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    import yt_dlp
+    import retry_policy
+    from retry_policy import RetryPolicy, classify_error
+    from download_engine import DownloadEngine, DownloadCancelled
+    from job_store import JobStore
+    
+    class RateLimitedHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(429)
+            self.send_header("Retry-After", "7")
+            self.end_headers()
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = HTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'retries': 0, 'extractor_retries': 0}) as ydl:
+            ydl.download([f"http://127.0.0.1:{server.server_address[1]}/clip.mp4"])
+        assert False, "download should have failed"
+    except yt_dlp.utils.DownloadError as e:
+        assert classify_error(e) == (retry_policy.RATE_LIMITED, 7.0)
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    policy = RetryPolicy(max_attempts=3, base_delay=2)
+    assert policy.should_retry(retry_policy.NETWORK, 2) and not policy.should_retry(retry_policy.NETWORK, 3)
+    assert not policy.should_retry(retry_policy.FATAL, 1)
+    assert 1 <= policy.delay(1) <= 2 and 4 <= policy.delay(3) <= 8
+    assert policy.delay(1, retry_after=7.0) >= 7.0
+    
+    # A connection refused error waits 60 s before retrying; cancel must end that wait at once
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = DownloadEngine(store=JobStore(os.path.join(tmp, "downloads.db")), retry_delay=120, quiet=True)
+        run_id = engine.create_run("x", tmp, "Best Quality", False, [{'url': "http://127.0.0.1:1/clip.mp4"}])
+        threading.Timer(1.0, engine.cancel).start()
+        started = time.time()
+        try:
+            engine.run(run_id)
+            assert False, "run should have been cancelled"
+        except DownloadCancelled:
+            pass
+        assert time.time() - started < 10
+        assert engine.retry_metrics[retry_policy.NETWORK]['retries'] == 1
+        engine.job_store.close()
+    
+    print("✅ Retry policy test passed")
+
+def test_pause_resume():
+    """Test that pause holds transfers open and resume continues them without reconnecting"""
+    print("Testing pause and resume...")
+    
+    import tempfile
+    import threading
+    import time
+    from download_engine import DownloadEngine
+    from job_store import JobStore
+    from bandwidth import BandwidthLimiter
+    
+    requests_seen = []
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = os.path.join(tmp, "media")
+        out_dir = os.path.join(tmp, "out")
+        os.makedirs(media_dir)
+        for name in ("held.mp4", "expiring.mp4"):
+            with open(os.path.join(media_dir, name), "wb") as f:
+                f.write(os.urandom(2 * 1024 * 1024))
+        
+        with serve(media_dir, CountingHandler, requests_seen=requests_seen) as base:
+            events = []
+            engine = DownloadEngine(on_event=events.append, store=JobStore(os.path.join(tmp, "downloads.db")), quiet=True,
+                                    bandwidth=BandwidthLimiter(1024 * 1024))
+            expire = int(time.time()) + 120
+            items = [{'url': f"{base}/held.mp4"}, {'url': f"{base}/expiring.mp4?expire={expire}"}]
+            run_id = engine.create_run(base, out_dir, "Best Quality", True, items)
+            held = {}
+            
+            def pause_and_resume():
+                time.sleep(1.0)
+                engine.pause()
+                time.sleep(0.5)
+                held['before'] = [job.downloaded_bytes for job in engine.jobs]
+                time.sleep(1.0)
+                held['after'] = [job.downloaded_bytes for job in engine.jobs]
+                engine.expiry_margin = 300  # treat the second URL as expired
+                engine.resume()
+            
+            threading.Thread(target=pause_and_resume, daemon=True).start()
+            summary = engine.run(run_id, max_workers=2)
+        engine.job_store.close()
+        
+        assert summary['downloaded'] == 2 and not summary['failed']
+        assert held['before'] == held['after'] and all(held['before'])
+        assert os.path.getsize(os.path.join(out_dir, "held.mp4")) == 2 * 1024 * 1024
+        # Each URL is requested once by extraction and once by the transfer; the held
+        # transfer continued on its connection, only the expired one was extracted again
+        assert requests_seen.count("/held.mp4") == 2
+        assert requests_seen.count(f"/expiring.mp4?expire={expire}") == 4
+        assert [event['url'] for event in events if event['event'] == 'resume_fallback'] == [items[1]['url']]
+    
+    print("✅ Pause and resume test passed")
+
+def test_download_archive():
+    """Test that archived videos are skipped without network access and yt-dlp archives import"""
+    print("Testing download archive...")
+    
+    import tempfile
+    import time
+    from download_engine import DownloadEngine
+    from download_archive import DownloadArchive
+    from job_store import JobStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = os.path.join(tmp, "media")
+        out_dir = os.path.join(tmp, "out")
+        os.makedirs(media_dir)
+        with open(os.path.join(media_dir, "clip1.mp4"), "wb") as f:
+            f.write(os.urandom(128 * 1024))
+        
+        with serve(media_dir) as base:
+            items = [{'id': "clip1", 'title': "clip1", 'url': f"{base}/clip1.mp4"}]
+            
+            archive = DownloadArchive(os.path.join(tmp, "archive.db"))
+            store = JobStore(os.path.join(tmp, "downloads.db"))
+            engine = DownloadEngine(store=store, quiet=True, archive=archive)
+            summary = engine.run(engine.create_run(base, out_dir, "Best Quality", True, items))
+        assert summary['downloaded'] == 1
+        entry = archive.lookup("clip1", "Best Quality")
+        assert entry['path'] == os.path.join(out_dir, "clip1.mp4") and entry['size'] == 128 * 1024
+        assert archive.lookup("clip1", "720p") is None
+        
+        # The server is gone: a second run must be settled from the archive alone
+        events = []
+        engine = DownloadEngine(on_event=events.append, store=store, quiet=True, archive=archive)
+        summary = engine.run(engine.create_run(base, out_dir, "Best Quality", True, items))
+        assert summary['skipped'] == 1 and summary['downloaded'] == 0 and not summary['failed']
+        assert [event['event'] for event in events].count('job_skipped') == 1
+        
+        # A deleted file no longer counts as downloaded
+        os.remove(entry['path'])
+        assert archive.lookup("clip1", "Best Quality") is None
+        
+        # Import a large yt-dlp archive file; imported ids match every quality
+        ytdlp_archive = os.path.join(tmp, "archive.txt")
+        with open(ytdlp_archive, "w") as f:
+            for i in range(200000):
+                f.write(f"youtube vid{i:08d}\n")
+            f.write("garbage\n")
+        assert archive.import_ytdlp_archive(ytdlp_archive) == 200000
+        assert archive.import_ytdlp_archive(ytdlp_archive) == 0
+        started = time.time()
+        for i in range(0, 200000, 200):
+            assert archive.lookup(f"vid{i:08d}", "720p") is not None
+        assert archive.lookup("missing", "720p") is None
+        assert time.time() - started < 2
+        store.close()
+        archive.close()
+    
+    print("✅ Download archive test passed")
+
+def test_content_store():
+    """Test that a stored video is linked into another folder and kept until its last link is released"""
+    print("Testing content store...")
+    
+    import tempfile
+    import content_store
+    from download_engine import DownloadEngine
+    from content_store import ContentStore
+    from job_store import JobStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = os.path.join(tmp, "media")
+        os.makedirs(media_dir)
+        with open(os.path.join(media_dir, "clip1.mp4"), "wb") as f:
+            f.write(os.urandom(128 * 1024))
+        
+        with serve(media_dir) as base:
+            items = [{'id': "clip1", 'title': "clip1", 'url': f"{base}/clip1.mp4"}]
+            
+            store = ContentStore(os.path.join(tmp, "store"))
+            jobs = JobStore(os.path.join(tmp, "downloads.db"))
+            first_dir = os.path.join(tmp, "playlist_a")
+            second_dir = os.path.join(tmp, "playlist_b")
+            engine = DownloadEngine(store=jobs, quiet=True, content_store=store)
+            engine.run(engine.create_run(base, first_dir, "Best Quality", True, items))
+        first = os.path.join(first_dir, "clip1.mp4")
+        assert store.refcount("clip1", "Best Quality") == 1
+        
+        # Another playlist with the same video is served from the store, without the server
+        events = []
+        engine = DownloadEngine(on_event=events.append, store=jobs, quiet=True, content_store=store)
+        summary = engine.run(engine.create_run(base, second_dir, "Best Quality", True, items))
+        second = os.path.join(second_dir, "clip1.mp4")
+        assert summary['skipped'] == 1 and not summary['failed']
+        assert [event['link_method'] for event in events if event['event'] == 'job_skipped'] == ["hardlink"]
+        assert os.path.samefile(first, second)
+        assert store.refcount("clip1", "Best Quality") == 2
+        
+        # Deleting one copy keeps the object for the other
+        os.remove(first)
+        assert store.release(first)
+        obj = store.get("clip1", "Best Quality")
+        assert obj is not None and os.path.exists(obj['path'])
+        os.remove(second)
+        assert store.prune() == 1
+        assert store.get("clip1", "Best Quality") is None and not os.path.exists(obj['path'])
+        
+        # A file that cannot be linked (another drive) is not copied into the store
+        other = os.path.join(tmp, "other.mp4")
+        with open(other, "wb") as f:
+            f.write(b"x" * 1024)
+        link_file = content_store.link_file
+        content_store.link_file = lambda src, dst: None
+        try:
+            assert store.put("clip2", "Best Quality", other) is None
+        finally:
+            content_store.link_file = link_file
+        assert store.get("clip2", "Best Quality") is None and store.refcount("clip2", "Best Quality") == 0
+        assert all(not files for _, _, files in os.walk(os.path.join(tmp, "store", "objects")))
+        jobs.close()
+        store.close()
+    
+    print("✅ Content store test passed")
+
+def test_metadata_cache():
+    """Test that preview-then-download extracts once and that the cache expires and evicts entries"""
+    print("Testing metadata cache...")
+    
+    import tempfile
+    import time
+    from download_engine import DownloadEngine
+    from job_store import JobStore
+    from metadata_cache import MetadataCache
+    
+    requests_seen = []
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = os.path.join(tmp, "media")
+        out_dir = os.path.join(tmp, "out")
+        os.makedirs(media_dir)
+        with open(os.path.join(media_dir, "clip1.mp4"), "wb") as f:
+            f.write(os.urandom(128 * 1024))
+        
+        with serve(media_dir, CountingHandler, requests_seen=requests_seen) as base:
+            url = f"{base}/clip1.mp4"
+            
+            cache = MetadataCache(os.path.join(tmp, "metadata_cache.db"))
+            engine = DownloadEngine(store=JobStore(os.path.join(tmp, "downloads.db")), quiet=True, metadata_cache=cache)
+            info = engine.fetch_video_info(url)
+            assert info['id'] == "clip1" and len(requests_seen) == 1
+            run_id = engine.create_run(url, out_dir, "Best Quality", False, [{'id': info['id'], 'url': url}])
+            summary = engine.run(run_id)
+        engine.job_store.close()
+        
+        # One extraction for the preview, one transfer for the download
+        assert summary['downloaded'] == 1 and cache.hits == 1
+        assert len(requests_seen) == 2
+        
+        # Entries end before their stream URLs expire, and the least recently used go first
+        small = MetadataCache(os.path.join(tmp, "small.db"), max_entries=2, expiry_margin=60)
+        expire = int(time.time()) + 30
+        assert not small.put("expiring", {'id': "expiring", 'formats': [{'url': f"https://example.com/v?expire={expire}"}]})
+        for video_id in ("a", "b"):
+            assert small.put(video_id, {'id': video_id, 'formats': [{'url': "https://example.com/v"}]})
+        assert small.get("a") is not None
+        small.put("c", {'id': "c", 'formats': []})
+        assert small.get("b") is None and small.get("a") is not None and small.get("c") is not None
+        small.invalidate("a")
+        assert small.get("a") is None
+        small.close()
+        cache.close()
+    
+    print("✅ Metadata cache test passed")
+
+def test_playlist_streaming():
+    """Test that playlist entries are handed out page by page while listing continues, and can be cancelled"""
+    print("Testing streamed playlist listing...")
+    
+    import tempfile
+    import threading
+    import time
+    from download_engine import DownloadEngine
+    from job_store import JobStore
+    
+    def slow_entries(count, page=100, delay=0.2):
+        # Stand-in for yt-dlp's lazy entries: one page fetch every `delay` seconds
+        for index in range(count):
+            if index % page == 0:
+                time.sleep(delay)
+            yield {'id': f"video{index}", 'title': f"Video {index}"}
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = DownloadEngine(store=JobStore(os.path.join(tmp, "downloads.db")), quiet=True)
+        pages = []
+        started = time.time()
+        listed = engine.stream_entries({}, slow_entries(1000), lambda playlist, entries: pages.append((time.time() - started, len(entries))),
+                                       page_size=100, flush_interval=0.5, cancel_event=None)
+        assert len(listed) == 1000 and [entry['id'] for entry in listed[:2]] == ["video0", "video1"]
+        assert sum(count for _, count in pages) == 1000
+        assert pages[0][0] < 1.0 and len(pages) > 1
+        
+        cancel = threading.Event()
+        threading.Timer(0.5, cancel.set).start()
+        playlist = {}
+        started = time.time()
+        listed = engine.stream_entries(playlist, slow_entries(2000), None, 100, 0.5, cancel)
+        assert playlist['cancelled'] and 0 < len(listed) < 2000
+        assert time.time() - started < 1.0
+        engine.job_store.close()
+    
+    print("✅ Streamed playlist listing test passed")
+
+def test_playlist_view():
+    """Test that the playlist view keeps a fixed pool of row widgets however many entries it shows"""
+    print("Testing virtualized playlist view...")
+    
+    import tkinter as tk
+    from playlist_view import PlaylistView
+    from selection_model import SelectionModel
+    
+    try:
+        root = tk.Tk()
+        root.withdraw()
+    except tk.TclError as e:
+        print(f"⚠️ Playlist view test skipped, no display: {e}")
+        return
+    
+    try:
+        toggled = []
+        selection = SelectionModel()
+        view = PlaylistView(root, selection, on_toggle=lambda: toggled.append(selection.selected_count), height=220)
+        view.pack()
+        view.resize_pool(220)
+        pool = len(view.rows)
+        
+        view.append([{'id': f"v{i}", 'title': f"Video {i}"} for i in range(20000)])
+        items = selection.items
+        assert len(view.rows) == pool and len(root.winfo_children()[0].body.winfo_children()) == pool
+        
+        view.yview('moveto', 0.5)
+        assert view.top == 10000
+        assert view.rows[0][3].cget('text') == "Video 10000"
+        view.rows[0][1].set(False)
+        view.toggle_slot(0)
+        assert not selection.is_selected("v10000") and toggled == [19999]
+        
+        view.yview('scroll', 1, 'pages')
+        assert view.top == 10000 + view.visible_count()
+        view.scroll_to(10 ** 9)
+        assert view.top == len(items) - view.visible_count()
+        view.append([{'id': "late", 'title': "Late entry"}])
+        assert len(view.rows) == pool
+    finally:
+        root.destroy()
+    
+    print("✅ Playlist view test passed")
+
+def test_selection_model():
+    """Test keyed toggles, range selects and indexed filters on a large playlist"""
+    print("Testing selection model...")
+    
+    import tempfile
+    import time
+    from selection_model import SelectionModel
+    from download_archive import DownloadArchive
+    
+    selection = SelectionModel()
+    selection.add([{'id': f"v{i}", 'title': f"Episode {i}" + (" (live)" if i % 10 == 0 else ""),
+                    'duration': (i % 30) * 60 or None, 'upload_date': f"2024{1 + i % 12:02d}01"}
+                   for i in range(10000)])
+    assert selection.selected_count == 10000
+    
+    assert selection.toggle("v5") is False and selection.toggle("v5") is True
+    selection.deselect_all()
+    selection.select_range(20, 10)
+    assert [item['id'] for item in selection.selected_items()] == [f"v{i}" for i in range(10, 21)]
+    
+    started = time.time()
+    short = selection.select_matching(max_duration=9 * 60)  # durations of 1..9 minutes
+    assert short == sum(1 for d in selection.durations if d is not None and d <= 9 * 60)
+    assert selection.select_matching(title=r"\(LIVE\)$") == 1000
+    assert selection.select_matching(mode="remove", uploaded_after="20241101") == sum(1 for d in selection.upload_dates if d >= "20241101")
+    combined = selection.match(title="episode", min_duration=600, max_duration=600, uploaded_before="20240601")
+    assert combined and all(selection.durations[p] == 600 and selection.upload_dates[p] <= "20240601" for p in combined)
+    assert time.time() - started < 1.0
+    
+    # "Not downloaded yet" filter from the archive
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = DownloadArchive(os.path.join(tmp, "archive.db"))
+        for i in range(0, 10000, 2):
+            archive.add(f"v{i}", "720p")
+        done = archive.downloaded_ids([item['id'] for item in selection.items], "720p")
+        assert len(done) == 5000 and archive.downloaded_ids(["v0"], "1080p") == set()
+        assert selection.select_matching(exclude_ids=done) == 5000
+        archive.close()
+    
+    print("✅ Selection model test passed")
+
+def test_thumbnail_loader():
+    """Test that thumbnails are fetched and shrunk off the calling thread, and cancelled when scrolled away"""
+    print("Testing thumbnail loader...")
+    
+    import tempfile
+    import threading
+    import time
+    from PIL import Image
+    from thumbnail_loader import ThumbnailLoader, decode_thumbnail
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(20):
+            Image.new("RGB", (1280, 720), (i * 10, 80, 160)).save(os.path.join(tmp, f"thumb{i}.jpg"), quality=90)
+        with open(os.path.join(tmp, "thumb0.jpg"), "rb") as f:
+            data = f.read()
+        assert decode_thumbnail(data).size == (80, 45)
+        
+        with serve(tmp) as base:
+            delivered = {}
+            done = threading.Event()
+            
+            def deliver(key, image):
+                delivered[key] = (image.size, threading.current_thread() is threading.main_thread())
+                if len(delivered) == 3:
+                    done.set()
+            
+            loader = ThumbnailLoader(deliver, workers=1)
+            try:
+                # A single worker is busy with the first request while the rest queue up
+                for i in range(20):
+                    loader.request(f"v{i}", f"{base}/thumb{i}.jpg")
+                loader.request("v0", f"{base}/thumb0.jpg")  # duplicates are ignored
+                loader.cancel_except(["v0", "v1", "v2"])
+                assert done.wait(10)
+                time.sleep(0.3)
+                assert set(delivered) == {"v0", "v1", "v2"}
+                assert all(size == (80, 45) and not on_main for size, on_main in delivered.values())
+                assert not loader.pending
+                
+                # A thumbnail that cannot be fetched is reported, not delivered
+                failed = []
+                reported = threading.Event()
+                
+                def on_error(key, error):
+                    failed.append(key)
+                    reported.set()
+                
+                missing = ThumbnailLoader(deliver, workers=1, on_error=on_error)
+                missing.request("gone", f"{base}/missing.jpg")
+                assert reported.wait(10) and failed == ["gone"] and "gone" not in delivered
+                missing.shutdown()
+            finally:
+                loader.shutdown()
+    
+    print("✅ Thumbnail loader test passed")
+
+def test_thumbnail_cache():
+    """Test that a second playlist load and album art embedding take thumbnails from the cache"""
+    print("Testing thumbnail cache...")
+    
+    import tempfile
+    import threading
+    from PIL import Image
+    import yt_dlp
+    from thumbnail_cache import ThumbnailCache
+    from thumbnail_loader import ThumbnailLoader
+    from download_engine import ThumbnailCachePP
+    
+    requests_seen = []
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = os.path.join(tmp, "media")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(media_dir)
+        for i in range(10):
+            Image.new("RGB", (480, 360), (i * 20, 40, 90)).save(os.path.join(media_dir, f"v{i}.jpg"))
+        
+        with serve(media_dir, CountingHandler, requests_seen=requests_seen) as base:
+            def load_playlist(cache):
+                delivered = {}
+                done = threading.Event()
+                
+                def deliver(key, image):
+                    delivered[key] = image
+                    if len(delivered) == 10:
+                        done.set()
+                
+                loader = ThumbnailLoader(deliver, cache=cache)
+                for i in range(10):
+                    loader.request(f"v{i}", f"{base}/v{i}.jpg", f"v{i}")
+                assert done.wait(10)
+                loader.shutdown()
+                assert all(image.size == (80, 45) for image in delivered.values())
+                return loader.fetched
+            
+            # Memory holds about four decoded thumbnails, the disk all of them
+            cache = ThumbnailCache(cache_dir, memory_bytes=4 * 80 * 45 * 3)
+            assert load_playlist(cache) == 10 and len(requests_seen) == 10
+            assert len(cache.memory) == 4 and cache.memory_used <= cache.memory_bytes
+            
+            # A new session finds everything on disk
+            assert load_playlist(ThumbnailCache(cache_dir)) == 0 and len(requests_seen) == 10
+            
+            # Album art comes from the cached original instead of another request
+            ydl = yt_dlp.YoutubeDL({'quiet': True, 'writethumbnail': True})
+            info = {'id': 'v3', 'ext': 'mp3', 'thumbnails': [{'id': '0', 'url': f"{base}/v3.jpg"}]}
+            _, info = ThumbnailCachePP(cache, 'video', ydl).run(info)
+            written = ydl._write_thumbnails('video', info, os.path.join(tmp, "song.mp3"))
+            with open(written[0][0], "rb") as f, open(os.path.join(media_dir, "v3.jpg"), "rb") as original:
+                assert f.read() == original.read()
+            assert len(requests_seen) == 10
+            
+            # A thumbnail yt-dlp had to download is kept for next time
+            info = {'id': 'new', 'thumbnails': [{'id': '0', 'filepath': os.path.join(media_dir, "v5.jpg")}]}
+            ThumbnailCachePP(cache, 'before_dl', ydl).run(info)
+            assert cache.get_original('new')[1] == "jpg" and cache.get('new').size == (80, 45)
+            
+            # The loader and a download may store the same video at once
+            with open(os.path.join(media_dir, "v7.jpg"), "rb") as f:
+                data = f.read()
+            writers = [threading.Thread(target=cache.put, args=('same', data)) for _ in range(8)]
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+            assert cache.get_original('same')[0] == data and cache.get('same').size == (80, 45)
+            assert not [name for name in os.listdir(os.path.join(cache_dir, "original")) if name.endswith(".part")]
+            
+            # The disk cap holds while the cache is in use, not just at startup
+            capped_dir = os.path.join(tmp, "capped")
+            capped = ThumbnailCache(capped_dir, disk_bytes=4 * len(data))
+            for i in range(10):
+                capped.put(f"c{i}", data)
+            on_disk = sum(entry.stat().st_size for folder in ("original", "small")
+                          for entry in os.scandir(os.path.join(capped_dir, folder)))
+            assert on_disk == capped.disk_used <= capped.disk_bytes
+            assert capped.get_original('c9')[0] == data and capped.get_original('c0')[0] is None
+            
+            # An unreadable cached thumbnail is dropped and reported
+            errors = []
+            reporting = ThumbnailCache(os.path.join(tmp, "reporting"), on_error=lambda video_id, e: errors.append(video_id))
+            with open(reporting.original_path('broken'), "wb") as f:
+                f.write(b"not an image")
+            assert reporting.get('broken') is None and errors == ['broken']
+            assert not os.path.exists(reporting.original_path('broken'))
+            ydl.close()
+    
+    print("✅ Thumbnail cache test passed")
+
+def test_http_client():
+    """Test that auxiliary requests share a few keep-alive connections"""
+    print("Testing shared HTTP client...")
+    
+    import tempfile
+    import threading
+    import functools
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import ThreadingHTTPServer
+    import http_client
+    
+    connections = set()
+    
+    class KeepAliveHandler(QuietHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def do_GET(self):
+            connections.add(self.client_address)
+            super().do_GET()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "thumb.jpg"), "wb") as f:
+            f.write(os.urandom(16 * 1024))
+        
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(KeepAliveHandler, directory=tmp))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+        
+        try:
+            session = http_client.shared_session()
+            assert http_client.shared_session() is session
+            
+            def fetch(_):
+                response = session.get(f"http://{host}:{port}/thumb.jpg")
+                response.raise_for_status()
+                return len(response.content)
+            
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                assert list(pool.map(fetch, range(40))) == [16 * 1024] * 40
+            # Eight threads, but never more connections than the per-host pool allows
+            assert 1 <= len(connections) <= 4
+            
+            http_client.close_shared_session()
+            assert http_client.shared_session() is not session
+        finally:
+            http_client.close_shared_session()
+            server.shutdown()
+            server.server_close()
+    
+    print("✅ Shared HTTP client test passed")
+
+def test_connectivity_checker():
+    """Test parallel connectivity probes against local stand-ins, with RTTs and a cached result"""
+    print("Testing connectivity checker...")
+    
+    import socket
+    import time
+    from connectivity import ConnectivityChecker, parse_endpoints, probe
+    
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(64)
+    live = listener.getsockname()
+    
+    # A port nobody listens on refuses at once
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    dead = closed.getsockname()
+    closed.close()
+    
+    # A listener whose accept queue is full drops new connections, so they hang like a dead route
+    stalled = []
+    
+    def blackhole():
+        full = socket.socket()
+        full.bind(("127.0.0.1", 0))
+        full.listen(0)
+        stalled.extend([full, socket.create_connection(full.getsockname(), timeout=1)])
+        return full.getsockname()
+    
+    try:
+        assert parse_endpoints("a.example:53, [::1]:80") == [("a.example", 53), ("::1", 80)]
+        
+        open_fds = len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+        for _ in range(20):
+            assert probe(*live, timeout=2) is not None
+        if open_fds is not None:
+            assert len(os.listdir("/proc/self/fd")) <= open_fds + 1  # probes close their sockets
+        
+        # The live endpoint wins without waiting for the one that hangs
+        checker = ConnectivityChecker([blackhole(), dead, live], timeout=3, ttl=30)
+        started = time.monotonic()
+        result = checker.check()
+        assert result['online'] and result['endpoint'] == f"{live[0]}:{live[1]}" and not result['cached']
+        assert result['rtt'] is not None and result['rtt'] < 1
+        assert time.monotonic() - started < 1
+        
+        # Repeated checks come from the cache until forced
+        assert checker.check()['cached'] and not checker.check(force=True)['cached']
+        time.sleep(0.2)
+        assert checker.rtts[dead] is None
+        
+        # Offline takes one timeout, not one per endpoint
+        offline = ConnectivityChecker([blackhole(), dead, blackhole()], timeout=1)
+        started = time.monotonic()
+        assert not offline.check()['online']
+        assert time.monotonic() - started < 2.5
+    finally:
+        listener.close()
+        for sock in stalled:
+            sock.close()
+    
+    print("✅ Connectivity checker test passed")
+
+def test_network_health():
+    """Test that live transfer samples reveal degradation, stalls and recovery"""
+    print("Testing network health monitor...")
+    
+    import tempfile
+    import threading
+    import time
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    import network_health
+    from network_health import NetworkHealthMonitor
+    from download_engine import DownloadEngine
+    from job_store import JobStore
+    
+    MB = 1024 * 1024
+    changes = []
+    monitor = NetworkHealthMonitor(on_change=lambda state, snapshot: changes.append(state))
+    
+    # Two jobs at 1 MB/s each, sampled ten times a second
+    def feed(start, seconds, rate, sizes):
+        for tick in range(int(seconds * 10)):
+            now = start + tick / 10
+            for key in sizes:
+                sizes[key] += rate / 10
+                monitor.record(key, sizes[key], now=now)
+        return start + seconds
+    
+    sizes = {1: 0, 2: 0}
+    now = feed(0, 10, MB, sizes)
+    assert monitor.state == network_health.HEALTHY and abs(monitor.baseline - 2 * MB) < 0.2 * MB
+    
+    # A drop to a tenth is reported within a few seconds
+    now = feed(now, 4, MB / 10, sizes)
+    assert monitor.state == network_health.DEGRADED and changes == [network_health.DEGRADED]
+    
+    # No bytes at all: stalled after stall_after seconds, long before a 30 s socket timeout
+    assert monitor.evaluate(now=now + 3) == network_health.DEGRADED
+    assert monitor.evaluate(now=now + 6.5) == network_health.STALLED
+    assert monitor.snapshot(now=now + 6.5)['stalled_for'] >= 6
+    
+    # Bytes flow again: recovering at once, healthy once it holds
+    now = feed(now + 7, 0.5, MB, sizes)
+    assert monitor.state == network_health.RECOVERING
+    now = feed(now, 8, MB, sizes)
+    assert changes == [network_health.DEGRADED, network_health.STALLED, network_health.RECOVERING, network_health.HEALTHY]
+    
+    # A bandwidth cap is not mistaken for a degraded network
+    now = feed(now, 6, MB / 4, sizes)
+    assert monitor.state == network_health.DEGRADED
+    capped = NetworkHealthMonitor()
+    capped.baseline, capped.baseline_at = 2 * MB, 0
+    for tick in range(60):
+        capped.record(1, tick * MB / 20, now=tick / 10, limit=MB / 2)
+    assert capped.state == network_health.HEALTHY
+    
+    # A transfer that freezes mid-download is reported by the engine while it waits
+    class FreezingHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(2 * MB))
+            self.end_headers()
+            if self.command == "GET":
+                self.wfile.write(b"\0" * MB)
+                self.wfile.flush()
+                time.sleep(2.5)
+                self.wfile.write(b"\0" * MB)
+        
+        do_HEAD = do_GET
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FreezingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            events = []
+            engine = DownloadEngine(on_event=events.append, store=JobStore(os.path.join(tmp, "downloads.db")), quiet=True)
+            engine.health = NetworkHealthMonitor(window=1, stall_after=1, warmup=0.5, on_change=engine.report_health)
+            run_id = engine.create_run("x", tmp, "Best Quality", False,
+                                       [{'url': f"http://127.0.0.1:{server.server_address[1]}/frozen.mp4"}])
+            summary = engine.run(run_id)
+            assert summary['downloaded'] == 1
+            states = [event['state'] for event in events if event['event'] == 'network_health']
+            assert network_health.STALLED in states and states[-1] != network_health.STALLED
+            engine.job_store.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    print("✅ Network health monitor test passed")
+
+def test_batch_pipeline():
+    """Test batch URL parsing and that upcoming items are extracted while earlier ones download"""
+    print("Testing batch URL pipeline...")
+    
+    import io
+    import tempfile
+    from url_batch import parse_urls, read_url_file
+    from youdownload import expand_urls
+    from download_engine import DownloadEngine
+    from job_store import JobStore
+    from metadata_cache import MetadataCache
+    
+    pasted = """# my list
+    https://youtu.be/aaa, https://www.youtube.com/watch?v=bbb
+    see (https://www.youtube.com/watch?v=ccc) and https://youtu.be/aaa again"""
+    assert parse_urls(pasted) == ["https://youtu.be/aaa", "https://www.youtube.com/watch?v=bbb",
+                                  "https://www.youtube.com/watch?v=ccc"]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "list.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("title,url,thumbnail\nOne,https://youtu.be/one,https://i.ytimg.com/one.jpg\n"
+                    "\"Two, live\",https://youtu.be/two,\n")
+        assert read_url_file(csv_path) == ["https://youtu.be/one", "https://youtu.be/two"]
+        
+        # Video URLs become items without any extraction
+        engine = DownloadEngine(store=JobStore(os.path.join(tmp, "expand.db")), quiet=True)
+        items = expand_urls(engine, ["https://youtu.be/one", "https://www.youtube.com/watch?v=two&list=PL1", "ftp://x"],
+                            lambda event: None)
+        assert [item['id'] for item in items] == ["one", "two"]
+        engine.job_store.close()
+        
+        media_dir = os.path.join(tmp, "media")
+        os.makedirs(media_dir)
+        names = [f"clip{i}" for i in range(5)]
+        for name in names:
+            with open(os.path.join(media_dir, f"{name}.mp4"), "wb") as f:
+                f.write(os.urandom(256 * 1024))
+        with serve(media_dir) as base:
+            events = []
+            cache = MetadataCache(os.path.join(tmp, "metadata.db"))
+            engine = DownloadEngine(on_event=events.append, store=JobStore(os.path.join(tmp, "downloads.db")),
+                                    quiet=True, metadata_cache=cache)
+            # A video that is gone fails its prefetch too; the CLI's stdout must stay pure event JSON
+            items = [{'id': name, 'title': name, 'url': f"{base}/{name}.mp4"} for name in names]
+            items.insert(2, {'id': "gone", 'title': "gone", 'url': f"{base}/gone.mp4"})
+            run_id = engine.create_run(base, os.path.join(tmp, "out"), "Best Quality", True, items)
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                summary = engine.run(run_id, max_workers=1)
+            assert stdout.getvalue() == ""
+            assert summary['downloaded'] == 5 and len(summary['failed']) == 1 and summary['items_per_minute'] > 0
+            assert [event['title'] for event in events if event['event'] == 'prefetch_failed'] == ["gone"]
+            prefetched = [event['position'] for event in events if event['event'] == 'job_prefetched']
+            # The single worker found the later items already extracted
+            assert len(prefetched) >= 3 and cache.hits >= 3
+            finished = [event for event in events if event['event'] == 'job_finished']
+            assert all(event['items_per_minute'] > 0 for event in finished)
+            engine.job_store.close()
+            cache.close()
+    
+    print("✅ Batch URL pipeline test passed")
+
+def test_postprocess_pool():
+    """Test that postprocessing runs on the low-priority pool while the next video downloads"""
+    print("Testing post-processing pool...")
+    
+    import tempfile
+    from yt_dlp.postprocessor import PostProcessor
+    from download_engine import DownloadEngine, SessionYoutubeDL
+    from job_store import JobStore
+    from postprocess_pool import lower_priority
+    
+    class SlowPostEngine(DownloadEngine):
+        def get_ydl_options(self, download_path, quality, progress_hook=None):
+            ydl_opts = super().get_ydl_options(download_path, quality, progress_hook)
+            # Stands in for an ffmpeg pass; records the niceness it ran with
+            ydl_opts['postprocessors'] = [{'key': 'Exec', 'exec_cmd': 'sleep 0.5; nice > {}.nice'}]
+            return ydl_opts
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = os.path.join(tmp, "media")
+        out_dir = os.path.join(tmp, "out")
+        os.makedirs(media_dir)
+        names = ["clip1", "clip2", "clip3"]
+        for name in names:
+            with open(os.path.join(media_dir, f"{name}.mp4"), "wb") as f:
+                f.write(os.urandom(128 * 1024))
+        with serve(media_dir) as base:
+            events = []
+            engine = SlowPostEngine(on_event=events.append, store=JobStore(os.path.join(tmp, "downloads.db")),
+                                    quiet=True, post_workers=1, post_nice=5)
+            run_id = engine.create_run(base, out_dir, "Best Quality", True,
+                                       [{'id': name, 'title': name, 'url': f"{base}/{name}.mp4"} for name in names])
+            summary = engine.run(run_id, max_workers=1)
+        engine.job_store.close()
+        
+        assert summary['downloaded'] == 3 and not summary['failed']
+        kinds = [(event['event'], event.get('position')) for event in events]
+        # The single download worker started the next video before the first one was post-processed
+        assert kinds.index(('job_started', 1)) < kinds.index(('job_finished', 0))
+        assert kinds.index(('job_started', 2)) < kinds.index(('job_finished', 1))
+        finished = [event for event in events if event['event'] == 'job_finished']
+        assert sorted(os.path.basename(event['filename']) for event in finished) == [f"{name}.mp4" for name in names]
+        if sys.platform.startswith('linux'):
+            with open(os.path.join(out_dir, "clip1.mp4.nice")) as f:
+                assert int(f.read()) == min(os.getpriority(os.PRIO_PROCESS, 0) + 5, 19)
+            
+            # A refused priority change is handed to the caller instead of printed over the CLI's event stream
+            def refuse(*args):
+                raise PermissionError(1, "Operation not permitted")
+            
+            errors = []
+            setpriority, os.setpriority = os.setpriority, refuse
+            try:
+                lower_priority(5, errors.append)
+            finally:
+                os.setpriority = setpriority
+            assert [type(error) for error in errors] == [PermissionError]
+    
+    # A deferred task does not share the session's YoutubeDL, which goes on with the next video
+    class RecordingPP(PostProcessor):
+        def run(self, info):
+            self.ran_on = self._downloader
+            return [], info
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tasks = []
+        path = os.path.join(tmp, "clip.mp4")
+        with open(path, "wb") as f:
+            f.write(b"clip")
+        ydl = SessionYoutubeDL({'quiet': True, 'postprocessors': [{'key': 'Exec', 'exec_cmd': 'touch {}.done'}]},
+                               lambda message: None, tasks.append)
+        merger = RecordingPP(ydl)
+        ydl.post_process(path, {'id': 'clip', 'ext': 'mp4', '__postprocessors': [merger]})
+        assert len(tasks) == 1 and not os.path.exists(path + ".done")
+        assert tasks[0]()['filepath'] == path and os.path.exists(path + ".done")
+        assert merger.ran_on is not ydl
+        ydl.close()
+    
+    print("✅ Post-processing pool test passed")
+
+def test_audio_modes():
+    """Test that the M4A and Opus modes pick a stream they can copy, and MP3 still transcodes"""
+    print("Testing audio-only modes...")
+    
+    import shutil
+    import tempfile
+    import yt_dlp
+    from download_engine import DownloadEngine, AUDIO_MODES, QUALITIES
+    from job_store import JobStore
+    
+    formats = [
+        {'format_id': '140', 'ext': 'm4a', 'acodec': 'mp4a.40.2', 'vcodec': 'none', 'abr': 129, 'url': 'http://x/140'},
+        {'format_id': '251', 'ext': 'webm', 'acodec': 'opus', 'vcodec': 'none', 'abr': 135, 'url': 'http://x/251'},
+        {'format_id': '18', 'ext': 'mp4', 'acodec': 'mp4a.40.2', 'vcodec': 'avc1', 'height': 360, 'url': 'http://x/18'},
+    ]
+    ctx = {'formats': formats, 'has_merged_format': True, 'incomplete_formats': False}
+    tmp = tempfile.mkdtemp()
+    engine = DownloadEngine(store=JobStore(os.path.join(tmp, "downloads.db")), quiet=True)
+    expected = {"Audio Only (MP3)": '251', "Audio Only (M4A)": '140', "Audio Only (Opus)": '251'}
+    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        for quality, format_id in expected.items():
+            assert quality in QUALITIES
+            ydl_opts = engine.get_ydl_options("out", quality)
+            chosen = list(ydl.build_format_selector(ydl_opts['format'])(ctx))
+            assert [f['format_id'] for f in chosen] == [format_id], quality
+            extract = ydl_opts['postprocessors'][0]
+            assert extract['key'] == 'FFmpegExtractAudio' and extract['preferredcodec'] == AUDIO_MODES[quality][1]
+            assert ydl_opts['addmetadata']
+        
+        # Only MP3 asks for a bitrate; the others keep the stream as it is
+        assert engine.get_ydl_options("out", "Audio Only (MP3)")['postprocessors'][0]['preferredquality'] == '192'
+        assert engine.get_ydl_options("out", "Audio Only (M4A)")['postprocessors'][0]['preferredquality'] is None
+        assert 'EmbedThumbnail' in [pp['key'] for pp in engine.get_ydl_options("out", "Audio Only (M4A)")['postprocessors']]
+        
+        # Without an Opus stream, the Opus mode still downloads something
+        fallback = list(ydl.build_format_selector(AUDIO_MODES["Audio Only (Opus)"][0])(dict(ctx, formats=formats[:1])))
+        assert [f['format_id'] for f in fallback] == ['140']
+    engine.job_store.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+    
+    print("✅ Audio-only modes test passed")
+
+def test_format_planner():
+    """Test that the planner prefers stream-copy pairs and reports the planned size"""
+    print("Testing format planner...")
+    
+    from format_planner import plan_formats, describe_plan, max_height
+    from download_engine import SessionYoutubeDL
+    
+    MB = 1024 * 1024
+    
+    def fmt(format_id, ext, vcodec, acodec, height=None, size=None, **extra):
+        return dict({'format_id': format_id, 'ext': ext, 'vcodec': vcodec, 'acodec': acodec, 'height': height,
+                     'filesize': size, 'url': f"http://x/{format_id}", 'protocol': 'https'}, **extra)
+    
+    formats = [
+        fmt('18', 'mp4', 'avc1.42001E', 'mp4a.40.2', 360, 9 * MB),
+        fmt('140', 'm4a', 'none', 'mp4a.40.2', size=5 * MB, abr=129),
+        fmt('251', 'webm', 'none', 'opus', size=6 * MB, abr=135),
+        fmt('136', 'mp4', 'avc1.4d401f', 'none', 720, 40 * MB, fps=30),
+        fmt('247', 'webm', 'vp9', 'none', 720, 30 * MB, fps=30),
+        fmt('137', 'mp4', 'avc1.640028', 'none', 1080, 100 * MB, fps=30),
+        fmt('248', 'webm', 'vp9', 'none', 1080, 80 * MB, fps=30),
+        fmt('399', 'mp4', 'av01.0.08M.08', 'none', 1080, 70 * MB, fps=30),
+    ]
+    
+    best = plan_formats(formats)
+    assert best['format'] == '137+140' and best['container'] == 'mp4'
+    assert best['expected_bytes'] == 105 * MB and best['exact_size']
+    assert plan_formats(formats, height=max_height("720p"))['format'] == '136+140'
+    assert plan_formats(formats, height=max_height("360p"))['format'] == '18'
+    assert max_height("Best Quality") is None
+    
+    # With VP9 video only, the Opus track wins even over a higher bitrate AAC one: webm needs no mkv
+    vp9_only = [f for f in formats if f['format_id'] in ('248', '251')] + [fmt('141', 'm4a', 'none', 'mp4a.40.2', abr=256)]
+    plan = plan_formats(vp9_only)
+    assert plan['format'] == '248+251' and plan['container'] == 'webm'
+    
+    # Audio modes keep a stream already in their codec; MP3 always transcodes
+    assert plan_formats(formats, audio_codec='m4a')['format'] == '140'
+    assert plan_formats(formats, audio_codec='opus')['format'] == '251'
+    assert not plan_formats(formats, audio_codec='mp3')['remux_only']
+    assert describe_plan(best) == "137+140: 1080p avc1 + mp4a, mp4, 105.0 MB"
+    
+    # A known size beats an unknown one, and a plain HTTPS pair beats a fragmented HLS file of the same quality
+    hls = fmt('96', 'mp4', 'avc1.640028', 'mp4a.40.2', 1080, fps=30, protocol='m3u8_native')
+    assert plan_formats(formats + [hls])['format'] == '137+140'
+    assert plan_formats([hls, fmt('95', 'mp4', 'avc1.4d401f', 'mp4a.40.2', 720, fps=30, protocol='m3u8_native')],
+                        height=720)['format'] == '95'
+    # DRM-protected formats cannot be downloaded at all
+    drm = fmt('drm', 'mp4', 'avc1.640028', 'none', 1080, fps=30, has_drm=True)
+    assert plan_formats(formats + [drm])['format'] == '137+140'
+    # The extractor's preference comes first, and yt-dlp's order (worst to best) breaks exact ties
+    assert plan_formats(formats + [fmt('137b', 'mp4', 'avc1.640028', 'none', 1080, 100 * MB, fps=30, preference=-10)]
+                        )['format'] == '137+140'
+    assert plan_formats(formats + [fmt('137b', 'mp4', 'avc1.640028', 'none', 1080, 100 * MB, fps=30)]
+                        )['format'] == '137b+140'
+    # Without sizes in the list, the duration estimates them from the bitrate
+    no_size = [fmt('137', 'mp4', 'avc1.640028', 'none', 1080, tbr=4000), fmt('140', 'm4a', 'none', 'mp4a.40.2', tbr=128)]
+    assert plan_formats(no_size)['expected_bytes'] is None
+    assert plan_formats(no_size, duration=60)['expected_bytes'] == (4000 + 128) * 60 * 125
+    
+    # Formats without codec information (direct file links) are left to the format string
+    assert plan_formats([{'format_id': '0', 'url': 'http://x/clip.mp4', 'ext': 'mp4'}]) is None
+    
+    # The session's YoutubeDL selects through the planner and falls back to the format string
+    planned = []
+    
+    def planner(available, duration):
+        plan = plan_formats(available, height=720, duration=duration)
+        planned.append(plan)
+        return plan
+    
+    ydl = SessionYoutubeDL({'quiet': True, 'format': 'best'}, lambda message: None, planner=planner)
+    chosen = ydl._select_formats(formats, ydl.format_selector)
+    assert [f['format_id'] for f in chosen] == ['136+140'] and planned[0]['format'] == '136+140'
+    chosen = ydl._select_formats([{'format_id': '0', 'url': 'http://x/clip.mp4', 'ext': 'mp4'}], ydl.format_selector)
+    assert [f['format_id'] for f in chosen] == ['0'] and planned[1] is None
+    # A real extraction result also hands the planner the video's duration
+    info = {'id': 'x', 'title': 'x', 'duration': 60, 'extractor': 'test', 'extractor_key': 'Test',
+            'webpage_url': 'http://x/', 'formats': [fmt('136', 'mp4', 'avc1.4d401f', 'none', 720, tbr=2000),
+                                                   fmt('140', 'm4a', 'none', 'mp4a.40.2', tbr=128)]}
+    ydl.process_ie_result(info, download=False)
+    assert planned[2]['format'] == '136+140' and planned[2]['expected_bytes'] == (2000 + 128) * 60 * 125
+    ydl.close()
+    
+    print("✅ Format planner test passed")
+
+def test_disk_space_preflight():
+    """Test that a queue too big for the disk is trimmed or failed before any .part file is written"""
+    print("Testing disk space preflight...")
+    
+    import tempfile
+    import yt_dlp
+    import disk_space
+    from download_engine import DownloadEngine
+    from job_store import JobStore
+    from metadata_cache import MetadataCache
+    
+    # Unknown sizes count as the average of the known ones
+    report = disk_space.preflight([100, None, 300], free=1000, reserve=500)
+    assert report['needed'] == 600 and report['short'] == 100 and report['fits'] == 2 and report['estimated'] == 1
+    assert disk_space.preflight([100, 200], free=1000)['status'] == disk_space.FITS
+    # With no size known at all, nothing can be checked
+    report = disk_space.preflight([None, None], free=1000)
+    assert report['status'] == disk_space.UNKNOWN and report['needed'] is None and report['short'] == 0
+    
+    size = 256 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        # Blocks are reserved without changing the length a resume starts from
+        part = os.path.join(tmp, "video.mp4.part")
+        with open(part, "wb") as f:
+            f.write(b"x" * 10)
+        if disk_space.preallocate(part, 4 * 1024 * 1024):
+            assert os.path.getsize(part) == 10 and os.stat(part).st_blocks * 512 >= 4 * 1024 * 1024
+        
+        media_dir = os.path.join(tmp, "media")
+        os.makedirs(media_dir)
+        names = ["clip1", "clip2", "clip3"]
+        for name in names:
+            with open(os.path.join(media_dir, f"{name}.mp4"), "wb") as f:
+                f.write(os.urandom(size))
+        with serve(media_dir) as base:
+            class YouTubeLikeDL(yt_dlp.YoutubeDL):
+                def extract_info(self, *args, **kwargs):
+                    info = super().extract_info(*args, **kwargs)
+                    # Known codecs and sizes, as YouTube's format lists have them
+                    info['formats'][0].update({'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'filesize': size})
+                    return info
+            
+            class YouTubeLikeEngine(DownloadEngine):
+                def create_prefetch_ydl(self, download_path, quality):
+                    ydl_opts = self.get_ydl_options(download_path, quality)
+                    ydl_opts.update({'quiet': True, 'no_warnings': True})
+                    return YouTubeLikeDL(ydl_opts)
+            
+            def run(policy, reserve_files, name, cached=True, sample=5):
+                cache = MetadataCache(os.path.join(tmp, f"{name}.cache.db"))
+                if cached:
+                    with YouTubeLikeDL({'quiet': True}) as ydl:
+                        for clip in names:
+                            assert cache.put(clip, ydl.extract_info(f"{base}/{clip}.mp4", download=False, process=False))
+                events = []
+                engine = YouTubeLikeEngine(on_event=events.append, store=JobStore(os.path.join(tmp, f"{name}.db")),
+                                           quiet=True, metadata_cache=cache, disk_policy=policy, post_workers=0)
+                engine.preflight_sample = sample
+                out_dir = os.path.join(tmp, name)
+                # Leave room for reserve_files videos only
+                engine.disk_reserve = disk_space.free_bytes(tmp) - int(reserve_files * size)
+                run_id = engine.create_run(base, out_dir, "Best Quality", True,
+                                           [{'id': clip, 'title': clip, 'url': f"{base}/{clip}.mp4"} for clip in names])
+                summary = engine.run(run_id, max_workers=1)
+                pending = engine.job_store.pending_items(run_id)
+                unfinished = engine.job_store.latest_unfinished_run()
+                engine.job_store.close()
+                cache.close()
+                files = sorted(os.listdir(out_dir)) if os.path.isdir(out_dir) else []
+                return summary, events, pending, unfinished, files
+            
+            # Trim: the first video fits, the rest stay queued and the run stays open for resume
+            summary, events, pending, unfinished, files = run(disk_space.TRIM, 1.5, "trim")
+            preflight = next(event for event in events if event['event'] == 'disk_preflight')
+            assert preflight['fits'] == 1 and preflight['short'] > 0
+            assert summary['downloaded'] == 1 and summary['deferred'] == ["clip2", "clip3"]
+            assert [item['position'] for item in pending] == [1, 2] and unfinished is not None
+            assert files == ["clip1.mp4"]
+            
+            # A fresh playlist has nothing cached: a sample is extracted first and the rest estimated from it
+            summary, events, pending, unfinished, files = run(disk_space.TRIM, 1.5, "sampled", cached=False, sample=1)
+            kinds = [event['event'] for event in events]
+            assert kinds.index('job_prefetched') < kinds.index('disk_preflight') < kinds.index('job_started')
+            preflight = events[kinds.index('disk_preflight')]
+            assert preflight['status'] == disk_space.SHORT and preflight['estimated'] == 2 and preflight['fits'] == 1
+            assert summary['downloaded'] == 1 and summary['deferred'] == ["clip2", "clip3"]
+            
+            # Warn: the run goes ahead, and a video that cannot fit fails before it writes anything
+            summary, events, pending, unfinished, files = run(disk_space.WARN, 0.5, "warn")
+            assert summary['downloaded'] == 0 and len(summary['failed']) == 3
+            assert all("Not enough disk space" in failure['error'] for failure in summary['failed'])
+            assert files == []
+    
+    print("✅ Disk space preflight test passed")
+
 def main():
     """Run all tests"""
     print("🧪 Testing Enhanced YouTube Downloader")
@@ -78,6 +1507,32 @@ def main():
     
     test_network_connectivity()
     test_error_handling()
+    test_user_data_dir()
+    test_overall_progress()
+    test_session_reuse()
+    test_job_store()
+    test_engine_headless_download()
+    test_event_bus_coalescing()
+    test_bandwidth_shares()
+    test_fragment_controller()
+    test_retry_policy()
+    test_pause_resume()
+    test_download_archive()
+    test_content_store()
+    test_metadata_cache()
+    test_playlist_streaming()
+    test_playlist_view()
+    test_selection_model()
+    test_thumbnail_loader()
+    test_thumbnail_cache()
+    test_http_client()
+    test_connectivity_checker()
+    test_network_health()
+    test_batch_pipeline()
+    test_postprocess_pool()
+    test_audio_modes()
+    test_format_planner()
+    test_disk_space_preflight()
     
     print("\n" + "=" * 50)
     print("✅ All tests completed!")